@@ -5,6 +5,7 @@ import yaml
 from matplotlib import pyplot as plt
 
 import analysis
+from analysis.wordclouds import PREVIEW_FACTOR
 
 
 def get_hparams():
@@ -23,6 +24,40 @@ def get_hparams():
     parser.add_argument("-t", "--type", type=str, default="anime", help="分析的数据类别")
 
     parser.add_argument("-cfg", "--config", type=str, help="配置文件路径")
+    parser.add_argument(
+        "--no-cache",
+        dest="cache",
+        action="store_false",
+        help="不使用数据路径下的.analysis_cache缓存",
+    )
+    parser.add_argument(
+        "-q",
+        "--query",
+        type=str,
+        help="执行SQL查询并输出结果，不绘图，可用的表见analysis.database.TABLES和relations",
+    )
+    parser.add_argument(
+        "--render-processes",
+        type=int,
+        default=None,
+        help="并行绘图的进程数，默认使用所有核心，为0时在主进程中依次绘制",
+    )
+    parser.add_argument(
+        "--preview", action="store_true", help="以低分辨率绘图，用于快速预览"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="不绘图，以本地HTTP/JSON服务提供预先计算的统计结果",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="查询服务的监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="查询服务的监听端口")
+    parser.add_argument(
+        "--reload-interval",
+        type=float,
+        default=5.0,
+        help="查询服务检查数据文件更新的间隔(秒)，为0时不重新加载",
+    )
     return parser
 
 
@@ -58,6 +93,9 @@ def parse_args(parser):
         args.path = config["data"]["path"]
         args.figure = config["figure"]["path"]
         args.rcParams = config["figure"]["rcParams"]
+        args.render_processes = config["figure"].get(
+            "render-processes", args.render_processes
+        )
     else:
         args.rcParams = {
             "font.family": "Microsoft YaHei",
@@ -72,55 +110,191 @@ def parse_args(parser):
     return args
 
 
+def get_infos_path(path, type):
+    """
+    获取条目信息文件路径，优先使用crawler写出的Parquet文件
+
+    Args:
+        path (str): 数据路径
+        type (str): 条目类型
+
+    Returns:
+        str: 条目信息文件路径
+    """
+    parquet_path = os.path.join(path, f"{type}_infos.parquet")
+    if os.path.exists(parquet_path):
+        return parquet_path
+    return os.path.join(path, f"{type}_infos.csv")
+
+
 def main():
     """
     主函数，用于数据分析
     """
     parser = get_hparams()
     args = parse_args(parser)
+    if args.preview:
+        args.rcParams = {**args.rcParams, "savefig.dpi": 300 // PREVIEW_FACTOR}
+        # previews never overwrite the full resolution figures
+        args.figure = os.path.join(args.figure, "preview")
+        os.makedirs(args.figure, exist_ok=True)
     plt.rcParams.update(args.rcParams)
 
-    tag_analysis = analysis.TagAnalysis(
-        args.type, os.path.join(args.path, f"{args.type}_infos.csv")
-    )
+    infos_path = get_infos_path(args.path, args.type)
+    if args.serve:
+        analysis.serve(
+            infos_path,
+            args.type,
+            args.host,
+            args.port,
+            cache=args.cache,
+            reload_interval=args.reload_interval,
+        )
+        return
+    # parsed once and shared by every analysis, derived columns are cached on disk
+    dataset = analysis.Dataset(infos_path, cache=args.cache)
+    if args.query:
+        print(dataset.database.query(args.query).to_string(index=False))
+        return
+    renderer = analysis.Renderer(args.render_processes, args.rcParams)
+    # only figures whose inputs changed are rendered again, see AnalysisGraph
+    graph = analysis.AnalysisGraph(dataset, renderer, args.rcParams)
+
+    def figure_path(name):
+        return os.path.join(args.figure, name)
 
-    tag_counts = tag_analysis.count_tag_frequency(min_count=10)
-    tag_analysis.plot_tag_counts(tag_counts, top_n=32)
+    tag_analysis = analysis.TagAnalysis(args.type, dataset, args.figure, args.preview)
+
+    tag_counts = graph.aggregate("tag_frequency", tag_analysis.count_tag_frequency, 10)
+    graph.figure(
+        "tag_counts",
+        tag_analysis.plot_tag_counts,
+        tag_counts,
+        32,
+        outputs=[figure_path(f"tag_{args.type}_counts.png")],
+    )
 
-    tag_analysis.generate_wordcloud(tag_counts)
+    graph.figure(
+        "tag_wordcloud",
+        tag_analysis.generate_wordcloud,
+        tag_counts,
+        outputs=[figure_path(f"tag_{args.type}_wordcloud.png")],
+    )
 
-    tag_year_counts_df = tag_analysis.count_tag_year_frequency(min_count=10)
-    tag_analysis.plot_tag_year_counts_heatmap(tag_year_counts_df, top_n=32)
+    tag_year_counts_df = graph.aggregate(
+        "tag_year_frequency", tag_analysis.count_tag_year_frequency, 10
+    )
+    graph.figure(
+        "tag_year_heatmap",
+        tag_analysis.plot_tag_year_counts_heatmap,
+        tag_year_counts_df,
+        32,
+        outputs=[figure_path(f"tag_year_counts_{args.type}_heatmap.png")],
+    )
 
-    tag_analysis.wordcloud_subplots(tag_year_counts_df, (3, 3))
+    graph.figure(
+        "tag_year_wordcloud",
+        tag_analysis.wordcloud_subplots,
+        tag_year_counts_df,
+        (3, 3),
+        clouds=tag_analysis.year_clouds,
+        outputs=[figure_path(f"tag_year_counts_{args.type}_wordcloud.png")],
+    )
 
     if args.type == "music":
-        music_analysis = analysis.MusicAnalysis(
-            os.path.join(args.path, f"music_infos.csv")
+        music_analysis = analysis.MusicAnalysis(dataset, args.figure, args.preview)
+        year_counts = graph.aggregate("year_music", music_analysis.count_year_music)
+        graph.figure(
+            "year_music_trend",
+            music_analysis.plot_year_music_trend,
+            year_counts,
+            outputs=[figure_path("year_music_trend.png")],
         )
-        year_counts = music_analysis.count_year_music()
-        music_analysis.plot_year_music_trend(year_counts)
 
-        company_counts = music_analysis.count_company_music()
-        music_analysis.pie_company_music(company_counts)
+        company_counts = graph.aggregate(
+            "company_music", music_analysis.count_company_music
+        )
+        graph.figure(
+            "company_music_pie",
+            music_analysis.pie_company_music,
+            company_counts,
+            outputs=[figure_path("company_music_pie.png")],
+        )
 
-        composer_counts = music_analysis.count_composer_frequency()
-        music_analysis.plot_composer_counts(composer_counts, top_n=30)
+        composer_counts = graph.aggregate(
+            "composer_frequency", music_analysis.count_composer_frequency
+        )
+        graph.figure(
+            "composer_counts",
+            music_analysis.plot_composer_counts,
+            composer_counts,
+            30,
+            outputs=[figure_path("composer_music_counts.png")],
+        )
 
-        music_analysis.facet_composer_counts(layout=(4, 4))
+        composer_year_counts = graph.aggregate(
+            "composer_year", music_analysis.count_composer_year
+        )
+        graph.figure(
+            "composer_year_counts",
+            music_analysis.facet_composer_counts,
+            composer_year_counts,
+            (4, 4),
+            outputs=[figure_path("composer_year_counts.png")],
+        )
 
-        tag_composers_counts_df = music_analysis.count_tag_composer_frequency(
-            min_count=10
+        tag_composers_counts_df = graph.aggregate(
+            "tag_composer_frequency", music_analysis.count_tag_composer_frequency, 10
         )
-        music_analysis.wordcloud_composer_counts(tag_composers_counts_df, layout=(3, 3))
+        graph.figure(
+            "tag_composer_wordcloud",
+            music_analysis.wordcloud_composer_counts,
+            tag_composers_counts_df,
+            (3, 3),
+            clouds=music_analysis.composer_clouds,
+            outputs=[figure_path("tag_composer_counts_wordcloud.png")],
+        )
+
+        relations_path = os.path.join(args.path, "relations.parquet")
+        if os.path.exists(relations_path):
+            related_anime = graph.aggregate(
+                "related_anime",
+                music_analysis.join_related_anime,
+                relations_path,
+                files=[relations_path],
+            )
+            anime_counts = graph.aggregate(
+                "anime_music", music_analysis.count_anime_music, related_anime
+            )
+            graph.figure(
+                "anime_music_counts",
+                music_analysis.plot_anime_music_counts,
+                anime_counts,
+                30,
+                outputs=[figure_path("anime_music_counts.png")],
+            )
     elif args.type == "anime":
-        anime_analysis = analysis.AnimeAnalysis(
-            os.path.join(args.path, f"anime_infos.csv")
+        anime_analysis = analysis.AnimeAnalysis(dataset, args.figure)
+        year_counts = graph.aggregate("year_anime", anime_analysis.count_year_anime)
+        graph.figure(
+            "year_anime_trend",
+            anime_analysis.plot_year_anime_trend,
+            year_counts,
+            outputs=[figure_path("year_anime_trend.png")],
+        )
+
+        company_year_counts = graph.aggregate(
+            "company_year_anime", anime_analysis.count_company_year_anime
+        )
+        graph.figure(
+            "company_year_anime",
+            anime_analysis.facet_company_anime,
+            company_year_counts,
+            (4, 4),
+            outputs=[figure_path("company_year_anime.png")],
         )
-        year_counts = anime_analysis.count_year_anime()
-        anime_analysis.plot_year_anime_trend(year_counts)
 
-        anime_analysis.facet_company_anime(layout=(4, 4))
+    graph.run()
 
 
 if __name__ == "__main__":
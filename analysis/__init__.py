@@ -1,3 +1,9 @@
+from .database import Database
+from .dataset import Dataset
+from .graph import AnalysisGraph
+from .renderer import Renderer
+from .server import QueryServer, serve
+from .tag_table import TagTable
 from .tag_analysis import TagAnalysis
 from .music_analysis import MusicAnalysis
 from .anime_analysis import AnimeAnalysis
\ No newline at end of file
@@ -1,33 +1,31 @@
 import os
 
 import matplotlib.pyplot as plt
-import pandas as pd
 import seaborn as sns
 
+from .dataset import Dataset
+
 
 class AnimeAnalysis:
-    def __init__(self, file_path, save_path="figures"):
+    def __init__(self, dataset, save_path="figures"):
         """
         初始化函数
 
         Args:
-            file_path (str): 数据文件路径
+            dataset (Dataset): 动画条目数据
             save_path (str, optional): 图片保存路径. Defaults to "figures".
         """
-        self.data = (
-            pd.read_csv(file_path, parse_dates=["date"], low_memory=False)
-            .dropna(subset=["date"])
-            .assign(
-                year=lambda x: x["date"].dt.year.astype(str),
-                month=lambda x: x["date"].dt.month.astype(str),
-                day=lambda x: x["date"].dt.day.astype(str),
-                anime_product=lambda x: x["动画制作"]
-                .str.translate(str.maketrans("、&（", "|||"))
-                .str.split("|"),
-            )
-        )
+        self.db = dataset.database
         self.save_path = save_path
 
+    def __getstate__(self):
+        """
+        绘图任务在Renderer的子进程中运行，只传递绘图需要的属性，不传递数据库连接
+        """
+        state = self.__dict__.copy()
+        state.pop("db")
+        return state
+
     def count_year_anime(self):
         """
         计算每年优秀动画数量
@@ -35,7 +33,9 @@ class AnimeAnalysis:
         Returns:
             pandas.Series: 包含每年优秀动画数量的Series
         """
-        year_counts = self.data["year"].value_counts(sort=False).sort_index()
+        year_counts = self.db.query(
+            "SELECT year, COUNT(*) AS count FROM subjects GROUP BY year ORDER BY year"
+        ).set_index("year")["count"]
         return year_counts
 
     def plot_year_anime_trend(self, year_counts):
@@ -45,13 +45,14 @@ class AnimeAnalysis:
         Args:
             year_counts (pandas.Series): 包含每年优秀动画数量的Series
         """
-        sns.barplot(x=year_counts.index, y=year_counts.values)
-        plt.xticks(rotation=45)
-        plt.xlabel("年份")
-        plt.ylabel("优秀动画数量")
-        plt.title("每年优秀动画数量趋势")
-        plt.savefig(os.path.join(self.save_path, "year_anime_trend.png"))
-        plt.clf()
+        fig, ax = plt.subplots()
+        sns.barplot(x=year_counts.index, y=year_counts.values, ax=ax)
+        ax.tick_params(axis="x", labelrotation=45)
+        ax.set_xlabel("年份")
+        ax.set_ylabel("优秀动画数量")
+        ax.set_title("每年优秀动画数量趋势")
+        fig.savefig(os.path.join(self.save_path, "year_anime_trend.png"))
+        plt.close(fig)
 
     def count_company_anime(self):
         """
@@ -60,34 +61,53 @@ class AnimeAnalysis:
         Returns:
             pandas.Series: 包含每个公司优秀动画数量的Series
         """
-        company_counts = self.data["anime_product"].value_counts()
+        company_counts = self.db.query("""
+            SELECT studio, COUNT(*) AS count
+            FROM studios
+            GROUP BY studio
+            ORDER BY count DESC, MIN(row)
+            """).set_index("studio")["count"]
         return company_counts
 
-    def facet_company_anime(self, layout):
+    def count_company_year_anime(self):
         """
-        绘制每个公司优秀动画数量的分面图
+        计算每个公司每年的优秀动画数量
 
-        Args:
-            company_counts (pandas.Series): 包含每个公司优秀动画数量的Series
+        Returns:
+            DataFrame: 以年份为索引、公司为列的动画数量
         """
-        company_year_data = (
-            self.data[["anime_product", "year"]]
-            .explode("anime_product")
-            .dropna(subset=["anime_product"])
-        )
         company_year_counts = (
-            company_year_data.groupby(["anime_product", "year"])
-            .size()
-            .unstack(level=0, fill_value=0)
+            self.db.query("""
+                SELECT subjects.year, studios.studio, COUNT(*) AS count
+                FROM studios JOIN subjects ON subjects.id = studios.subject_id
+                GROUP BY ALL
+                """)
+            .pivot(index="year", columns="studio", values="count")
+            .fillna(0)
+            .astype(int)
         )
+        return company_year_counts
+
+    def facet_company_anime(self, company_year_counts, layout):
+        """
+        绘制每个公司优秀动画数量的分面图
+
+        Args:
+            company_year_counts (DataFrame): count_company_year_anime返回的动画数量
+            layout (tuple): 分面布局
+        """
         top_company = (
             company_year_counts.sum().nlargest(layout[0] * layout[1]).index.tolist()
         )
         company_year_counts = company_year_counts[top_company]
-        company_year_counts.plot(subplots=True, layout=layout, sharex=True, sharey=True)
+        axes = company_year_counts.plot(
+            subplots=True, layout=layout, sharex=True, sharey=True
+        )
 
-        plt.suptitle(f"Top {layout[0] * layout[1]} Company Anime Counts")
-        plt.savefig(os.path.join(self.save_path, "company_year_anime.png"))
+        fig = axes.flat[0].figure
+        fig.suptitle(f"Top {layout[0] * layout[1]} Company Anime Counts")
+        fig.savefig(os.path.join(self.save_path, "company_year_anime.png"))
+        plt.close(fig)
 
 
 if __name__ == "__main__":
@@ -99,10 +119,11 @@ if __name__ == "__main__":
             "figure.autolayout": True,
         }
     )
-    anime_analysis = AnimeAnalysis("data/anime_infos.csv")
+    anime_analysis = AnimeAnalysis(Dataset("data/anime_infos.csv"))
 
     year_counts = anime_analysis.count_year_anime()
     anime_analysis.plot_year_anime_trend(year_counts)
 
     company_counts = anime_analysis.count_company_anime()
-    anime_analysis.facet_company_anime((4, 4))
+    company_year_counts = anime_analysis.count_company_year_anime()
+    anime_analysis.facet_company_anime(company_year_counts, (4, 4))
@@ -0,0 +1,199 @@
+import os
+import re
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+# groups x tags totals, the groups subquery selects (subject_id, name) pairs
+TAG_TOTALS_QUERY = """
+WITH groups AS ({groups}),
+first_seen AS (
+    SELECT tag, MIN(row) AS row FROM tags GROUP BY tag
+),
+totals AS (
+    SELECT groups.name, tags.tag, SUM(tags.count)::BIGINT AS count
+    FROM tags JOIN groups USING (subject_id)
+    GROUP BY ALL
+)
+SELECT
+    totals.name,
+    totals.tag::VARCHAR AS tag,
+    totals.count,
+    SUM(totals.count) OVER (PARTITION BY totals.tag) AS total,
+    first_seen.row
+FROM totals JOIN first_seen USING (tag)
+QUALIFY total > $min_total
+"""
+
+
+def subjects_table(dataset):
+    """
+    条目表：每个有日期的条目一行
+
+    Args:
+        dataset (Dataset): 条目数据
+
+    Returns:
+        DataFrame: 包含id、row(在源文件中的位置)、date、year、month和day列
+    """
+    data = dataset.columns(["date", "year", "month", "day"])
+    data.insert(1, "row", dataset.rows["row"])
+    return data
+
+
+def tags_table(dataset):
+    """
+    tag表：每个(条目, tag)一行，tag名称以字典编码保存
+
+    Args:
+        dataset (Dataset): 条目数据
+
+    Returns:
+        DataFrame: 包含subject_id、tag、count和row(首次出现的顺序)列
+    """
+    tags = dataset.tags
+    return pd.DataFrame(
+        {
+            "subject_id": tags.tags["subject_id"],
+            "tag": pd.Categorical.from_codes(tags.tags["tag_id"], tags.vocabulary),
+            "count": tags.tags["count"],
+            "row": np.arange(len(tags.tags)),
+        }
+    )
+
+
+def exploded_table(column, name):
+    """
+    生成把列表列展开为每个(条目, 值)一行的表的函数
+
+    Args:
+        column (str): Dataset的派生列
+        name (str): 表中值的列名
+
+    Returns:
+        callable: 接收Dataset、返回包含subject_id、name和row列的DataFrame的函数
+    """
+
+    def build(dataset):
+        data = dataset.columns([column]).explode(column).dropna(subset=[column])
+        return pd.DataFrame(
+            {
+                "subject_id": data["id"].to_numpy(),
+                name: data[column].to_numpy(),
+                "row": np.arange(len(data)),
+            }
+        )
+
+    return build
+
+
+# tables exposed to SQL, each is built from the Dataset the first time a query uses it
+TABLES = {
+    "subjects": subjects_table,
+    "tags": tags_table,
+    "composers": exploded_table("composers", "composer"),
+    "companies": exploded_table("company", "company"),
+    "studios": exploded_table("anime_product", "studio"),
+}
+
+
+class Database:
+    def __init__(self, dataset, relations_path=None, threads=None):
+        """
+        初始化Database对象
+
+        将条目数据以表的形式交给嵌入式的DuckDB，统计使用SQL在多个核心上向量化执行，
+        超出内存时溢出到缓存目录。可用的表见TABLES，每张表在第一次被查询时才从Dataset生成；
+        存在relations.parquet时还可以查询relations表，直接从Parquet文件中读取。
+
+        Args:
+            dataset (Dataset): 条目数据
+            relations_path (str, optional): relations.parquet文件路径，为None时使用数据文件所在目录下的relations.parquet. Defaults to None.
+            threads (int, optional): 查询使用的线程数，为None时使用所有核心. Defaults to None.
+        """
+        self.dataset = dataset
+        self.relations_path = relations_path or os.path.join(
+            os.path.dirname(dataset.file_path), "relations.parquet"
+        )
+        self.conn = duckdb.connect()
+        self.conn.execute(
+            "SET temp_directory = $path",
+            {"path": os.path.join(dataset.cache_dir, "duckdb")},
+        )
+        if threads is not None:
+            self.conn.execute(f"SET threads = {int(threads)}")
+        self.registered = set()
+
+    def register(self, name):
+        """
+        注册一张表，已注册的表直接跳过，不存在的relations.parquet由DuckDB报告
+
+        Args:
+            name (str): 表名
+        """
+        if name in self.registered:
+            return
+        if name in TABLES:
+            self.conn.register(name, TABLES[name](self.dataset))
+        elif name == "relations" and os.path.exists(self.relations_path):
+            path = self.relations_path.replace("'", "''")
+            self.conn.execute(
+                f"CREATE VIEW relations AS SELECT * FROM read_parquet('{path}')"
+            )
+        else:
+            return
+        self.registered.add(name)
+
+    def query(self, sql, params=None, **frames):
+        """
+        执行SQL查询
+
+        Args:
+            sql (str): SQL语句，使用$name引用params中的参数
+            params (dict, optional): 查询参数. Defaults to None.
+            **frames (DataFrame): 本次查询中以参数名作为表名使用的DataFrame
+
+        Returns:
+            DataFrame: 查询结果
+        """
+        # duckdb.get_table_names cannot parse prepared parameters, matching the names is enough
+        for name in [*TABLES, "relations"]:
+            if name not in frames and re.search(rf"\b{name}\b", sql):
+                self.register(name)
+        for name, frame in frames.items():
+            self.conn.register(name, frame)
+        try:
+            return self.conn.execute(sql, params).df()
+        finally:
+            for name in frames:
+                self.conn.unregister(name)
+
+    def sum_tags_by(self, groups, name, min_total):
+        """
+        按条目所属的分组汇总tag的选择量，一个条目可以属于多个分组
+
+        Args:
+            groups (str): 返回(subject_id, name)的SQL子查询，一个条目可以有多行
+            name (str): 结果索引的名称
+            min_total (int): 只保留所有分组合计选择量>min_total的tag
+
+        Returns:
+            DataFrame: 以分组为索引(升序)、tag名称为列的选择量，
+                列按合计选择量降序排列，相同时按tag首次出现的顺序
+        """
+        data = self.query(
+            TAG_TOTALS_QUERY.format(groups=groups), {"min_total": min_total}
+        )
+        order = data.drop_duplicates("tag").sort_values(
+            ["total", "row"], ascending=[False, True]
+        )["tag"]
+        table = (
+            data.pivot(index="name", columns="tag", values="count")
+            .reindex(columns=order)
+            .fillna(0)
+            .astype(np.int64)
+        )
+        table.index.name = name
+        table.columns.name = None
+        return table
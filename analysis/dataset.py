@@ -0,0 +1,305 @@
+import collections
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from . import loader, tag_table
+from .database import Database
+from .loader import load_infos
+from .tag_table import TagTable
+
+# derived columns: name -> (source columns, function computing the column from them)
+DERIVED_COLUMNS = {
+    "year": (["date"], lambda x: x["date"].dt.year.astype(str)),
+    "month": (["date"], lambda x: x["date"].dt.month.astype(str)),
+    "day": (["date"], lambda x: x["date"].dt.day.astype(str)),
+    "company": (["厂牌"], lambda x: x["厂牌"]),
+    "composers": (
+        ["作曲"],
+        lambda x: x["作曲"].str.translate(str.maketrans("、(", "||")).str.split("|"),
+    ),
+    "anime_product": (
+        ["动画制作"],
+        lambda x: x["动画制作"]
+        .str.translate(str.maketrans("、&（", "|||"))
+        .str.split("|"),
+    ),
+}
+
+
+class Dataset:
+    def __init__(self, file_path, cache=True, cache_dir=None):
+        """
+        初始化Dataset对象
+
+        所有分析类共用的条目数据：只保留有日期的条目，源文件只读取一次，
+        year、composers、tags等派生列在第一次使用时才计算并保存在内存中，
+        同时以Arrow格式缓存到磁盘，源文件内容不变时再次运行直接读取缓存。
+
+        Args:
+            file_path (str): 数据文件路径，.parquet或.csv
+            cache (bool, optional): 是否使用磁盘缓存. Defaults to True.
+            cache_dir (str, optional): 缓存目录，为None时使用数据文件所在目录下的.analysis_cache. Defaults to None.
+        """
+        self.file_path = file_path
+        self.cache = cache
+        self.cache_dir = cache_dir or os.path.join(
+            os.path.dirname(file_path), ".analysis_cache"
+        )
+        self._columns = {}
+        self._rows = None
+        self._tags = None
+        self._cache_path = None
+        self._digest = None
+        self._database = None
+        # cached tables read from disk and tables computed, reported by AnalysisGraph
+        self.stats = collections.Counter()
+
+    @property
+    def digest(self):
+        """
+        获取源文件内容的SHA-256，源文件的修改时间或大小变化时才重新计算
+
+        Returns:
+            str: 十六进制摘要
+        """
+        if self._digest is not None:
+            return self._digest
+        os.makedirs(self.cache_dir, exist_ok=True)
+        stem = os.path.basename(self.file_path)
+        meta_path = os.path.join(self.cache_dir, f"{stem}.json")
+        stat = os.stat(self.file_path)
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        if meta.get("mtime") != stat.st_mtime_ns or meta.get("size") != stat.st_size:
+            # a touched but unchanged file keeps its cache
+            meta = {
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "digest": file_digest(self.file_path),
+            }
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+        self._digest = meta["digest"]
+        return self._digest
+
+    @property
+    def cache_path(self):
+        """
+        获取源文件当前内容和派生列代码对应的缓存目录，任意一个变化后删除旧的缓存
+
+        Returns:
+            str: 缓存目录
+        """
+        if self._cache_path is not None:
+            return self._cache_path
+        stem = os.path.basename(self.file_path)
+        # DERIVED_COLUMNS and the loading code live in these modules
+        code = code_digest(sys.modules[__name__], loader, tag_table)
+        key = hashlib.sha256(f"{self.digest}\0{code}".encode()).hexdigest()
+        self._cache_path = os.path.join(self.cache_dir, f"{stem}-{key[:16]}")
+        for stale in glob.glob(os.path.join(self.cache_dir, f"{stem}-*")):
+            if stale != self._cache_path:
+                shutil.rmtree(stale)
+        os.makedirs(self._cache_path, exist_ok=True)
+        return self._cache_path
+
+    def _cached(self, name, compute):
+        """
+        从磁盘缓存读取一个表，没有缓存时计算并写入缓存
+
+        Args:
+            name (str): 缓存文件名
+            compute (callable): 计算该表的函数，返回使用默认索引的DataFrame
+
+        Returns:
+            DataFrame: 表
+        """
+        if not self.cache:
+            self.stats["misses"] += 1
+            return compute()
+        path = os.path.join(self.cache_path, f"{name}.feather")
+        if os.path.exists(path):
+            self.stats["hits"] += 1
+            return read_cached(path)
+        self.stats["misses"] += 1
+        data = compute()
+        # write then rename so a concurrent run never reads a half written file
+        data.to_feather(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return data
+
+    @property
+    def rows(self):
+        """
+        获取有日期的条目在源文件中的位置、条目代码和日期
+
+        Returns:
+            DataFrame: 包含row、id和date列
+        """
+        if self._rows is None:
+
+            def compute():
+                data = load_infos(self.file_path, columns=["id", "date"])
+                return (
+                    data.rename_axis("row")
+                    .dropna(subset=["date"])
+                    .reset_index()[["row", "id", "date"]]
+                )
+
+            self._rows = self._cached("rows", compute)
+        return self._rows
+
+    def columns(self, names):
+        """
+        获取条目代码和给定的列，尚未计算的派生列一次读取所需的源列后计算
+
+        Args:
+            names (list): DERIVED_COLUMNS中的列名，或id、date
+
+        Returns:
+            DataFrame: 每个有日期的条目一行，包含id和names中的列
+        """
+        missing = [
+            name
+            for name in names
+            if name not in self._columns and name not in ["id", "date"]
+        ]
+        if missing:
+            sources = set()
+            for name in missing:
+                sources.update(DERIVED_COLUMNS[name][0])
+
+            def load_sources():
+                rows = self.rows
+                if sources <= {"date"}:
+                    return rows
+                data = load_infos(self.file_path, columns=sorted(sources - {"date"}))
+                data = data.iloc[rows["row"]].reset_index(drop=True)
+                return data.assign(date=rows["date"])
+
+            loaded = None
+            for name in missing:
+
+                def compute():
+                    nonlocal loaded
+                    if loaded is None:
+                        loaded = load_sources()
+                    return DERIVED_COLUMNS[name][1](loaded).to_frame(name)
+
+                self._columns[name] = self._cached(name, compute)[name]
+        data = self.rows[["id"]].copy()
+        for name in names:
+            if name == "date":
+                data[name] = self.rows["date"]
+            elif name != "id":
+                data[name] = self._columns[name]
+        return data
+
+    @property
+    def tags(self):
+        """
+        获取有日期的条目的tag
+
+        Returns:
+            TagTable: 条目的tag
+        """
+        if self._tags is None:
+
+            def compute():
+                tag_table = TagTable.load(self.file_path).select(self.rows["id"])
+                # the vocabulary is stored once as the dictionary of a categorical column
+                tags = tag_table.tags.drop(columns="tag_id")
+                tags["tag"] = pd.Categorical.from_codes(
+                    tag_table.tags["tag_id"], tag_table.vocabulary
+                )
+                return tags
+
+            tags = self._cached("tags", compute)
+            self._tags = TagTable(
+                pd.DataFrame(
+                    {
+                        "subject_id": tags["subject_id"],
+                        "tag_id": tags["tag"].cat.codes.astype("int32"),
+                        "count": tags["count"],
+                    }
+                ),
+                tags["tag"].cat.categories,
+            )
+        return self._tags
+
+    @property
+    def database(self):
+        """
+        获取查询这份数据的Database，所有分析共用同一个连接
+
+        Returns:
+            Database: 嵌入式SQL查询层
+        """
+        if self._database is None:
+            self._database = Database(self)
+        return self._database
+
+
+def read_cached(path):
+    """
+    读取缓存的表，列表列还原为Python列表，缺失值还原为NaN，与直接计算的结果一致
+
+    Args:
+        path (str): .feather文件路径
+
+    Returns:
+        DataFrame: 表
+    """
+    table = feather.read_table(path)
+    data = table.to_pandas()
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_list(column.type):
+            # pyarrow would hand back numpy arrays, which value_counts cannot compare
+            values = pd.Series(column.to_pylist(), dtype=object)
+            data[name] = values.where(values.notna(), np.nan)
+    return data
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """
+    计算文件内容的SHA-256
+
+    Args:
+        file_path (str): 文件路径
+        chunk_size (int, optional): 每次读取的字节数. Defaults to 1 << 20.
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_digest(*modules):
+    """
+    计算模块源文件的SHA-256，模块修改后依赖它们计算的缓存失效
+
+    Args:
+        *modules (module): 模块
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(file_digest(module.__file__).encode())
+    return digest.hexdigest()
@@ -0,0 +1,303 @@
+import glob
+import hashlib
+import inspect
+import json
+import os
+import pickle
+
+from . import database, dataset, loader, tag_table, wordclouds
+from .dataset import code_digest, file_digest
+from .wordclouds import cloud_image
+
+# code the count_* methods call into, editing it invalidates every aggregate
+AGGREGATE_MODULES = [dataset, loader, tag_table, database]
+# code the plot_* methods call into, editing it invalidates every figure
+FIGURE_MODULES = [wordclouds]
+
+
+def fingerprint(*parts):
+    """
+    计算节点的指纹
+
+    Args:
+        *parts: 字节串或可以用repr稳定表示的值
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def function_digest(func, state=False):
+    """
+    计算函数的指纹，包含函数的源代码
+
+    Args:
+        func (callable): 函数或分析类的方法
+        state (bool, optional): 是否包含分析类对象中save_path、preview等绘图参数，
+            统计结果只取决于数据，不应包含. Defaults to False.
+
+    Returns:
+        str: 十六进制摘要
+    """
+    parts = [func.__qualname__, inspect.getsource(func)]
+    if state and inspect.ismethod(func):
+        # analysis classes drop their database connection when pickled
+        parts.append(pickle.dumps(func.__self__))
+    return fingerprint(*parts)
+
+
+class Node:
+    def __init__(self, graph, name, func, args, files=()):
+        """
+        初始化Node对象，表示一个统计结果
+
+        指纹由数据文件内容、函数的源代码、AGGREGATE_MODULES的源代码、参数、依赖节点的指纹和额外文件的内容共同决定，
+        不需要计算结果就能判断结果是否过期；绘图参数不影响统计结果，不包含在指纹中。
+
+        Args:
+            graph (AnalysisGraph): 所属的图
+            name (str): 节点名称，在统计节点和绘图节点中唯一
+            func (callable): 计算函数
+            args (tuple): 计算函数的参数，可以包含其他Node
+            files (tuple, optional): 计算函数读取的其他文件. Defaults to ().
+        """
+        self.graph = graph
+        self.name = name
+        self.func = func
+        self.args = args
+        self.fingerprint = fingerprint(
+            graph.dataset.digest,
+            graph.aggregate_code,
+            name,
+            function_digest(func),
+            [arg.fingerprint if isinstance(arg, Node) else arg for arg in args],
+            [file_digest(file) for file in files],
+        )
+        self.resolved = False
+        self.value = None
+
+    def resolve(self):
+        """
+        获取节点的结果，依次尝试内存、磁盘缓存，都没有时先获取依赖节点的结果再计算
+
+        Returns:
+            object: 计算函数的返回值
+        """
+        if self.resolved:
+            return self.value
+        path = self.graph.node_path(self.name, self.fingerprint)
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                self.value = pickle.load(f)
+            self.graph.report["hits"].append(self.name)
+        else:
+            args = [
+                arg.resolve() if isinstance(arg, Node) else arg for arg in self.args
+            ]
+            self.value = self.func(*args)
+            self.graph.report["misses"].append(self.name)
+            if path is not None:
+                self.graph.persist(self.name, path, self.value)
+        self.resolved = True
+        return self.value
+
+
+class AnalysisGraph:
+    def __init__(self, dataset, renderer, rc_params=None):
+        """
+        初始化AnalysisGraph对象
+
+        将分析声明为 读取 → 派生列 → 统计 → 绘图 的依赖图。读取和派生列由Dataset缓存，
+        统计节点的结果按指纹保存到磁盘，每个图片文件记录生成时的指纹；再次运行时只计算过期的节点，
+        只有过期图片依赖的统计结果才会被读取或计算。
+
+        Args:
+            dataset (Dataset): 条目数据，不使用缓存时每次都重新计算和绘制
+            renderer (Renderer): 绘制过期图片的Renderer
+            rc_params (dict, optional): 绘图使用的rcParams，变化后所有图片过期. Defaults to None.
+        """
+        self.dataset = dataset
+        self.renderer = renderer
+        self.rc_params = rc_params or {}
+        self.cache_path = None
+        if dataset.cache:
+            self.cache_path = os.path.join(
+                dataset.cache_dir, "graph", os.path.basename(dataset.file_path)
+            )
+            os.makedirs(self.cache_path, exist_ok=True)
+        self.aggregate_code = code_digest(*AGGREGATE_MODULES)
+        self.figure_code = code_digest(*FIGURE_MODULES)
+        self.nodes = {}
+        self.figures = {}
+        self.report = {"hits": [], "misses": []}
+
+    def node_path(self, name, node_fingerprint):
+        """
+        获取统计结果的缓存文件路径
+
+        Args:
+            name (str): 节点名称
+            node_fingerprint (str): 节点指纹
+
+        Returns:
+            str: 缓存文件路径，不使用缓存时为None
+        """
+        if self.cache_path is None:
+            return None
+        return os.path.join(self.cache_path, f"{name}-{node_fingerprint[:16]}.pkl")
+
+    def persist(self, name, path, value):
+        """
+        保存统计结果，并删除该节点过期的结果
+
+        Args:
+            name (str): 节点名称
+            path (str): 缓存文件路径
+            value (object): 统计结果
+        """
+        for stale in glob.glob(os.path.join(self.cache_path, f"{name}-*.pkl")):
+            os.remove(stale)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(value, f)
+        os.replace(path + ".tmp", path)
+
+    def aggregate(self, name, func, *args, files=()):
+        """
+        声明一个统计节点
+
+        Args:
+            name (str): 节点名称
+            func (callable): 计算函数，如分析类的count_*方法
+            *args: 计算函数的参数，可以包含其他统计节点
+            files (tuple, optional): 计算函数读取的其他文件，如relations.parquet. Defaults to ().
+
+        Returns:
+            Node: 统计节点
+        """
+        assert name not in self.nodes and name not in self.figures
+        node = Node(self, name, func, args, files)
+        self.nodes[name] = node
+        return node
+
+    def figure(self, name, func, *args, outputs=(), clouds=None):
+        """
+        声明一个绘图节点
+
+        Args:
+            name (str): 图的名称
+            func (callable): 绘图函数，如分析类的plot_*方法
+            *args: 绘图函数的参数，可以包含统计节点
+            clouds (callable, optional): 接收与绘图函数相同的参数、返回CloudSpec的函数，每个词云的布局
+                作为单独的任务在Renderer的进程池中并行生成，生成的图片作为最后一个参数传给绘图函数. Defaults to None.
+            outputs (tuple, optional): 绘图函数生成的文件，缺少或由其他指纹生成时重新绘制. Defaults to ().
+        """
+        assert name not in self.nodes and name not in self.figures
+        figure_fingerprint = fingerprint(
+            name,
+            self.figure_code,
+            function_digest(func, state=True),
+            clouds and function_digest(clouds, state=True),
+            [arg.fingerprint if isinstance(arg, Node) else arg for arg in args],
+            sorted(self.rc_params.items()),
+        )
+        self.figures[name] = (figure_fingerprint, func, args, outputs, clouds)
+
+    def manifest_keys(self, name, outputs):
+        """
+        获取图片在清单中的键，每个输出文件一个键，没有输出文件时使用图的名称
+
+        Args:
+            name (str): 图的名称
+            outputs (tuple): 绘图函数生成的文件
+
+        Returns:
+            list[str]: 清单中的键
+        """
+        return [os.path.abspath(output) for output in outputs] or [name]
+
+    def run(self):
+        """
+        计算过期图片依赖的统计节点并绘制过期的图片，然后输出命中和重新计算的节点
+
+        Returns:
+            dict: 命中(hits)和重新计算(misses)的节点名称
+        """
+        manifest_path = None
+        manifest = {}
+        if self.cache_path is not None:
+            manifest_path = os.path.join(self.cache_path, "figures.json")
+            if os.path.exists(manifest_path):
+                with open(manifest_path, "r") as f:
+                    manifest = json.load(f)
+        stale = {}
+        errors = []
+        try:
+            for name, (
+                figure_fingerprint,
+                func,
+                args,
+                outputs,
+                clouds,
+            ) in self.figures.items():
+                # keyed by file, so full and preview renders of one figure are tracked apart
+                if all(
+                    manifest.get(key) == figure_fingerprint
+                    for key in self.manifest_keys(name, outputs)
+                ) and all(os.path.exists(output) for output in outputs):
+                    self.report["hits"].append(name)
+                    continue
+                try:
+                    values = [
+                        arg.resolve() if isinstance(arg, Node) else arg for arg in args
+                    ]
+                    inputs = None
+                    if clouds is not None:
+                        spec = clouds(*values)
+                        inputs = [
+                            self.renderer.prepare(
+                                cloud_image, frequencies, spec.options, spec.cache_dir
+                            )
+                            for frequencies in spec.frequencies
+                        ]
+                    self.renderer.submit(name, func, *values, inputs=inputs)
+                except Exception as e:
+                    print(f"{name}绘制失败: {e!r}")
+                    errors.append(e)
+                    continue
+                stale[name] = figure_fingerprint
+            self.renderer.wait()
+        finally:
+            # figures that failed stay stale and are rendered again next time
+            for name in self.renderer.timings:
+                for key in self.manifest_keys(name, self.figures[name][3]):
+                    manifest[key] = stale[name]
+                self.report["misses"].append(name)
+            if manifest_path is not None:
+                with open(manifest_path + ".tmp", "w") as f:
+                    json.dump(manifest, f, indent=2)
+                os.replace(manifest_path + ".tmp", manifest_path)
+            self.print_report()
+        if errors:
+            raise errors[0]
+        return self.report
+
+    def print_report(self):
+        """
+        输出各层命中和重新计算的节点
+        """
+        stats = self.dataset.stats
+        print(f"派生列: 命中{stats['hits']}个，重新计算{stats['misses']}个")
+        for layer, names in [("统计", self.nodes), ("绘图", self.figures)]:
+            hits = [name for name in self.report["hits"] if name in names]
+            misses = [name for name in self.report["misses"] if name in names]
+            skipped = len(names) - len(hits) - len(misses)
+            print(
+                f"{layer}: 命中{len(hits)}个，重新计算{len(misses)}个"
+                + (f"({', '.join(misses)})" if misses else "")
+                + (f"，未使用{skipped}个" if skipped else "")
+            )
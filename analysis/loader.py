@@ -0,0 +1,36 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+
+def load_infos(file_path, columns):
+    """
+    读取条目信息，只读取需要的列
+
+    支持crawler写出的Parquet文件和旧版的CSV文件。Parquet文件中没有单独成列的infobox字段
+    会从infobox列中提取，date转换为日期类型。tags由TagTable读取为长表。
+
+    Args:
+        file_path (str): 数据文件路径，.parquet或.csv
+        columns (list): 需要读取的列名
+
+    Returns:
+        DataFrame: 只包含columns的条目信息
+    """
+    if file_path.endswith(".parquet"):
+        names = pq.read_schema(file_path).names
+        stored = [column for column in columns if column in names]
+        from_infobox = [column for column in columns if column not in names]
+        if from_infobox:
+            stored.append("infobox")
+        data = pd.read_parquet(file_path, columns=stored)
+        if from_infobox:
+            infobox = data.pop("infobox").map(dict)
+            for key in from_infobox:
+                data[key] = infobox.map(lambda items: items.get(key))
+    else:
+        data = pd.read_csv(
+            file_path, usecols=lambda column: column in columns, low_memory=False
+        )
+    if "date" in data:
+        data["date"] = pd.to_datetime(data["date"], errors="coerce")
+    return data
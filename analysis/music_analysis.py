@@ -1,35 +1,36 @@
 import os
 
 import matplotlib.pyplot as plt
-import pandas as pd
 import seaborn as sns
-from wordcloud import WordCloud
+
+from .dataset import Dataset
+from .wordclouds import PREVIEW_FACTOR, CloudSpec, cloud_images, preview_options
 
 
 class MusicAnalysis:
-    def __init__(self, file_path, save_path="figures"):
+    def __init__(self, dataset, save_path="figures", preview=False):
         """
         初始化函数
 
         Args:
-            file_path (str): 数据文件路径
+            dataset (Dataset): 音乐条目数据
             save_path (str, optional): 图片保存路径. Defaults to "figures".
+            preview (bool, optional): 以低分辨率生成词云，用于快速预览. Defaults to False.
         """
-        self.data = (
-            pd.read_csv(file_path, parse_dates=["date"], low_memory=False)
-            .dropna(subset=["date"])
-            .assign(
-                year=lambda x: x["date"].dt.year.astype(str),
-                month=lambda x: x["date"].dt.month.astype(str),
-                day=lambda x: x["date"].dt.day.astype(str),
-                company=lambda x: x["厂牌"],
-                composers=lambda x: x["作曲"]
-                .str.translate(str.maketrans("、(", "||"))
-                .str.split("|"),
-                tags=lambda x: x["tags"].apply(eval),
-            )
-        )
+        self.db = dataset.database
         self.save_path = save_path
+        self.preview = preview
+        self.cloud_cache = (
+            os.path.join(dataset.cache_dir, "wordclouds") if dataset.cache else None
+        )
+
+    def __getstate__(self):
+        """
+        绘图任务在Renderer的子进程中运行，只传递绘图需要的属性，不传递数据库连接
+        """
+        state = self.__dict__.copy()
+        state.pop("db")
+        return state
 
     def count_year_music(self):
         """
@@ -38,7 +39,9 @@ class MusicAnalysis:
         Returns:
             pandas.Series: 包含每年优秀音乐数量的Series
         """
-        year_counts = self.data["year"].value_counts(sort=False).sort_index()
+        year_counts = self.db.query(
+            "SELECT year, COUNT(*) AS count FROM subjects GROUP BY year ORDER BY year"
+        ).set_index("year")["count"]
         return year_counts
 
     def plot_year_music_trend(self, year_counts):
@@ -48,13 +51,14 @@ class MusicAnalysis:
         Args:
             year_counts (pandas.Series): 包含每年优秀音乐数量的Series
         """
-        sns.barplot(x=year_counts.index, y=year_counts.values)
-        plt.xticks(rotation=45)
-        plt.xlabel("年份")
-        plt.ylabel("优秀音乐数量")
-        plt.title("每年优秀音乐数量趋势")
-        plt.savefig(os.path.join(self.save_path, "year_music_trend.png"))
-        plt.clf()
+        fig, ax = plt.subplots()
+        sns.barplot(x=year_counts.index, y=year_counts.values, ax=ax)
+        ax.tick_params(axis="x", labelrotation=45)
+        ax.set_xlabel("年份")
+        ax.set_ylabel("优秀音乐数量")
+        ax.set_title("每年优秀音乐数量趋势")
+        fig.savefig(os.path.join(self.save_path, "year_music_trend.png"))
+        plt.close(fig)
 
     def count_company_music(self):
         """
@@ -63,7 +67,12 @@ class MusicAnalysis:
         Returns:
             pandas.Series: 包含每个公司优秀音乐数量的Series
         """
-        company_counts = self.data["company"].value_counts()
+        company_counts = self.db.query("""
+            SELECT company, COUNT(*) AS count
+            FROM companies
+            GROUP BY company
+            ORDER BY count DESC, MIN(row)
+            """).set_index("company")["count"]
         return company_counts
 
     def pie_company_music(self, company_counts):
@@ -81,18 +90,19 @@ class MusicAnalysis:
         company_counts = company_counts[company_counts >= threshold]
         company_counts["其他"] = other_count
 
-        plt.pie(
+        fig, ax = plt.subplots()
+        ax.pie(
             company_counts.values,
             labels=company_counts.index,
             autopct="%1.1f%%",
             colors=sns.color_palette("pastel", len(company_counts)),
         )
-        plt.title("每公司优秀音乐数量", pad=20)
-        plt.xlabel("")
-        plt.ylabel("")
-        plt.axis("equal")
-        plt.savefig(os.path.join(self.save_path, "company_music_pie.png"))
-        plt.clf()
+        ax.set_title("每公司优秀音乐数量", pad=20)
+        ax.set_xlabel("")
+        ax.set_ylabel("")
+        ax.axis("equal")
+        fig.savefig(os.path.join(self.save_path, "company_music_pie.png"))
+        plt.close(fig)
 
     def count_composer_frequency(self):
         """
@@ -101,7 +111,12 @@ class MusicAnalysis:
         Returns:
             pandas.Series: 包含每个作曲家出现次数的Series
         """
-        composer_counts = self.data["composers"].explode().value_counts()
+        composer_counts = self.db.query("""
+            SELECT composer, COUNT(*) AS count
+            FROM composers
+            GROUP BY composer
+            ORDER BY count DESC, MIN(row)
+            """).set_index("composer")["count"]
         return composer_counts
 
     def plot_composer_counts(self, composer_counts, top_n):
@@ -113,38 +128,51 @@ class MusicAnalysis:
             top_n (int): 统计出现次数最多的前n个作曲家
         """
         most_common = composer_counts.nlargest(top_n)
-        sns.barplot(x=most_common.values, y=most_common.index)
-        plt.title("作曲家数量统计")
-        plt.xlabel("数量")
-        plt.ylabel("作曲家")
-        plt.savefig(os.path.join(self.save_path, "composer_music_counts.png"))
-        plt.clf()
+        fig, ax = plt.subplots()
+        sns.barplot(x=most_common.values, y=most_common.index, ax=ax)
+        ax.set_title("作曲家数量统计")
+        ax.set_xlabel("数量")
+        ax.set_ylabel("作曲家")
+        fig.savefig(os.path.join(self.save_path, "composer_music_counts.png"))
+        plt.close(fig)
+
+    def count_composer_year(self):
+        """
+        计算每个作曲家每年的优秀音乐数量
 
-    def facet_composer_counts(self, layout):
+        Returns:
+            DataFrame: 以年份为索引、作曲家为列的音乐数量
+        """
+        composer_year_counts = (
+            self.db.query("""
+                SELECT subjects.year, composers.composer, COUNT(*) AS count
+                FROM composers JOIN subjects ON subjects.id = composers.subject_id
+                GROUP BY ALL
+                """)
+            .pivot(index="year", columns="composer", values="count")
+            .fillna(0)
+            .astype(int)
+        )
+        return composer_year_counts
+
+    def facet_composer_counts(self, composer_year_counts, layout):
         """
         绘制作曲家数量统计图
 
         Args:
+            composer_year_counts (DataFrame): count_composer_year返回的音乐数量
             layout tuple(int, int): 分面布局
         """
-        composer_year_data = (
-            self.data[["composers", "year"]]
-            .explode("composers")
-            .dropna(subset=["composers"])
-        )
-        composer_year_counts = (
-            composer_year_data.groupby(["composers", "year"])
-            .size()
-            .unstack(level=0, fill_value=0)
-        )
         top_composers = (
             composer_year_counts.sum().nlargest(layout[0] * layout[1]).index.tolist()
         )
         composer_year_counts = composer_year_counts[top_composers]
-        composer_year_counts.plot(
+        axes = composer_year_counts.plot(
             subplots=True, layout=layout, sharex=True, sharey=True
         )
-        plt.savefig(os.path.join(self.save_path, "composer_year_counts.png"))
+        fig = axes.flat[0].figure
+        fig.savefig(os.path.join(self.save_path, "composer_year_counts.png"))
+        plt.close(fig)
 
     def count_tag_composer_frequency(self, min_count=10):
         """
@@ -156,30 +184,21 @@ class MusicAnalysis:
         Returns:
             DataFrame: 不同年份和不同tag之间的关系
         """
-        tag_df = pd.json_normalize(self.data["tags"]).fillna(0).astype(int)
-        composer_df = (
-            self.data[["composers"]].explode("composers").dropna(subset=["composers"])
-        )
-        tag_composers_df = (
-            pd.merge(composer_df, tag_df, left_index=True, right_index=True)
-            .groupby(["composers"])
-            .sum()
-        )
-        tag_counts = (
-            tag_composers_df.sum(axis=0)
-            .loc[lambda s: s > min_count]
-            .sort_values(ascending=False)
+        tag_composers_counts_df = self.db.sum_tags_by(
+            "SELECT subject_id, composer AS name FROM composers", "composers", min_count
         )
-        tag_composers_counts_df = tag_composers_df[tag_counts.index]
         return tag_composers_counts_df
 
-    def wordcloud_composer_counts(self, tag_composers_counts_df, layout):
+    def composer_clouds(self, tag_composers_counts_df, layout):
         """
-        使用词云展示不同作曲家和不同tag之间的关系
+        选出tag最多的作曲家，生成每个作曲家词云的词频和参数
 
         Args:
-            tag_composers_counts_df (DataFrame): 不同年份和不同tag之间的关系
+            tag_composers_counts_df (DataFrame): 不同作曲家和不同tag之间的关系
             layout (tuple): 子图布局
+
+        Returns:
+            CloudSpec: 子图标题、词频、词云参数和布局缓存目录
         """
         top_composers = (
             tag_composers_counts_df.astype(bool)
@@ -187,30 +206,122 @@ class MusicAnalysis:
             .nlargest(layout[0] * layout[1])
             .index.tolist()
         )
+        options = {
+            "background_color": "white",
+            "max_words": 1000,
+            # "font_path": r"c:\windows\fonts\xiaolaisc-regular.ttf",
+            "font_path": "msyh.ttc",
+            "width": 1000,
+            "height": 1000,
+            "max_font_size": 400,
+            "min_font_size": 12,
+        }
+        if self.preview:
+            options = preview_options(options)
+        return CloudSpec(
+            top_composers,
+            [tag_composers_counts_df.loc[composer] for composer in top_composers],
+            options,
+            self.cloud_cache,
+        )
+
+    def wordcloud_composer_counts(self, tag_composers_counts_df, layout, images=None):
+        """
+        使用词云展示不同作曲家和不同tag之间的关系
+
+        Args:
+            tag_composers_counts_df (DataFrame): 不同年份和不同tag之间的关系
+            layout (tuple): 子图布局
+            images (list, optional): 按composer_clouds的顺序生成的词云图片，为None时在这里生成. Defaults to None.
+        """
+        top_composers, frequencies, options, cache_dir = self.composer_clouds(
+            tag_composers_counts_df, layout
+        )
+        if images is None:
+            images = cloud_images(frequencies, options, cache_dir)
+        dpi = 300 // PREVIEW_FACTOR if self.preview else 300
         fig, axes = plt.subplots(
-            nrows=layout[0], ncols=layout[1], figsize=(12, 12), dpi=300
+            nrows=layout[0], ncols=layout[1], figsize=(12, 12), dpi=dpi
         )
         for i, ax in enumerate(axes.flat):
             if i < len(top_composers):
                 composer = top_composers[i]
-                tag_counts = tag_composers_counts_df.loc[composer]
-                wordcloud = WordCloud(
-                    background_color="white",
-                    max_words=1000,
-                    # font_path=r"c:\windows\fonts\xiaolaisc-regular.ttf",
-                    font_path="msyh.ttc",
-                    width=1000,
-                    height=1000,
-                    max_font_size=400,
-                    min_font_size=12,
-                ).generate_from_frequencies(tag_counts)
-                ax.imshow(wordcloud, interpolation="bilinear")
+                ax.imshow(images[i], interpolation="bilinear")
                 ax.set_title(composer, fontdict={"fontsize": 20})
                 ax.axis("off")
 
         fig.suptitle("Top 9 Composers with Most Tags", fontsize=30)
 
-        plt.savefig(os.path.join(self.save_path, f"tag_composer_counts_wordcloud.png"))
+        fig.savefig(os.path.join(self.save_path, f"tag_composer_counts_wordcloud.png"))
+        plt.close(fig)
+
+    def join_related_anime(self, relations_path):
+        """
+        通过crawler.py --relations导出的关联关系将音乐连接到相关的动画，不需要逐个请求条目
+
+        Args:
+            relations_path (str): relations.parquet文件路径
+
+        Returns:
+            DataFrame: 每对(音乐, 动画)一行，包含音乐的id、year、company和动画的anime_id、anime_name、relation
+        """
+        # type code 2 is anime, see crawler.SUBJECT_TYPES
+        return self.db.query(
+            """
+            SELECT
+                subjects.id,
+                subjects.year,
+                companies.company,
+                relations.target_id AS anime_id,
+                COALESCE(NULLIF(relations.name_cn, ''), relations.name) AS anime_name,
+                relations.relation
+            FROM subjects
+            JOIN read_parquet($relations_path, file_row_number = true) AS relations
+                ON relations.source_id = subjects.id
+            LEFT JOIN companies ON companies.subject_id = subjects.id
+            WHERE relations.kind = 'subjects' AND relations.target_type = 2
+            ORDER BY subjects.row, relations.file_row_number
+            """,
+            {"relations_path": relations_path},
+        )
+
+    def count_anime_music(self, related_anime):
+        """
+        计算每部动画关联的优秀音乐数量
+
+        Args:
+            related_anime (DataFrame): join_related_anime返回的音乐和动画
+
+        Returns:
+            pandas.Series: 以动画名称为索引的音乐数量
+        """
+        anime_counts = self.db.query(
+            """
+            SELECT anime_name, COUNT(DISTINCT id) AS count
+            FROM related_anime
+            GROUP BY anime_id, anime_name
+            ORDER BY count DESC, anime_id
+            """,
+            related_anime=related_anime,
+        ).set_index("anime_name")["count"]
+        return anime_counts
+
+    def plot_anime_music_counts(self, anime_counts, top_n):
+        """
+        绘制关联优秀音乐最多的动画
+
+        Args:
+            anime_counts (pandas.Series): 以动画名称为索引的音乐数量
+            top_n (int): 统计关联音乐最多的前n部动画
+        """
+        most_common = anime_counts.nlargest(top_n)
+        fig, ax = plt.subplots()
+        sns.barplot(x=most_common.values, y=most_common.index, ax=ax)
+        ax.set_title("关联优秀音乐最多的动画")
+        ax.set_xlabel("音乐数量")
+        ax.set_ylabel("动画")
+        fig.savefig(os.path.join(self.save_path, "anime_music_counts.png"))
+        plt.close(fig)
 
 
 if __name__ == "__main__":
@@ -222,7 +333,7 @@ if __name__ == "__main__":
             "figure.autolayout": True,
         }
     )
-    music_analysis = MusicAnalysis("data/music_infos.csv")
+    music_analysis = MusicAnalysis(Dataset("data/music_infos.csv"))
 
     year_counts = music_analysis.count_year_music()
     music_analysis.plot_year_music_trend(year_counts)
@@ -233,7 +344,8 @@ if __name__ == "__main__":
     composer_counts = music_analysis.count_composer_frequency()
     music_analysis.plot_composer_counts(composer_counts, top_n=32)
 
-    music_analysis.facet_composer_counts((4, 4))
+    composer_year_counts = music_analysis.count_composer_year()
+    music_analysis.facet_composer_counts(composer_year_counts, (4, 4))
 
     tag_composers_counts_df = music_analysis.count_tag_composer_frequency(min_count=10)
     music_analysis.wordcloud_composer_counts(tag_composers_counts_df, (3, 3))
@@ -0,0 +1,210 @@
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+import matplotlib
+
+# set in the render workers, which already take one core each
+IN_WORKER = False
+
+
+def init_worker(rc_params):
+    """
+    初始化绘图进程，使用不需要显示器的Agg后端
+
+    Args:
+        rc_params (dict): matplotlib的rcParams
+    """
+    global IN_WORKER
+    IN_WORKER = True
+    matplotlib.use("Agg")
+    matplotlib.rcParams.update(rc_params)
+
+
+def in_worker():
+    """
+    判断当前进程是否为Renderer的绘图进程，绘图进程中的任务不应再创建进程池
+
+    Returns:
+        bool: 是否为绘图进程
+    """
+    return IN_WORKER
+
+
+def render(plot, args):
+    """
+    运行一个绘图任务并计时
+
+    Args:
+        plot (callable): 绘图函数，自己创建、保存并关闭Figure
+        args (tuple): 绘图函数的参数
+
+    Returns:
+        float: 用时(秒)
+    """
+    start = time.perf_counter()
+    plot(*args)
+    return time.perf_counter() - start
+
+
+def run_task(func, args):
+    """
+    运行一个绘图前的准备任务(如词云布局)并计时
+
+    Args:
+        func (callable): 可以pickle的函数
+        args (tuple): 函数的参数
+
+    Returns:
+        tuple: (用时(秒), 返回值)
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def completed(func, *args):
+    """
+    在当前进程中运行函数，将返回值或异常保存到已完成的Future中
+
+    Args:
+        func (callable): 函数
+        *args: 函数的参数
+
+    Returns:
+        Future: 已完成的Future
+    """
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class Renderer:
+    def __init__(self, processes=None, rc_params=None):
+        """
+        初始化Renderer对象
+
+        在进程池中并行绘制互相独立的图，每个任务使用自己的Figure，
+        主进程提交任务后可以继续计算下一张图的数据，全部图的用时接近最慢的一张。
+        一张图中耗时的部分(如多个子图的词云布局)可以用prepare拆成单独的任务，在同一个进程池中并行运行。
+
+        Args:
+            processes (int, optional): 绘图进程数，为None时使用所有核心，为0时在当前进程中依次绘制. Defaults to None.
+            rc_params (dict, optional): 绘图进程使用的matplotlib rcParams，为0个进程时应用到当前进程. Defaults to None.
+        """
+        self.processes = os.cpu_count() if processes is None else processes
+        self.executor = None
+        if self.processes == 0:
+            # charts are drawn right here, so the main process needs the same settings
+            matplotlib.rcParams.update(rc_params or {})
+        else:
+            # spawn everywhere, forking a process with live DuckDB threads is unsafe
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(rc_params or {},),
+            )
+        # threads that wait for prepared inputs before submitting the chart itself
+        self.chains = None
+        if self.executor is not None:
+            self.chains = concurrent.futures.ThreadPoolExecutor(
+                thread_name_prefix="renderer"
+            )
+        self.jobs = {}
+        # charts rendered successfully, filled in by wait even when some of them fail
+        self.timings = {}
+        self.start = time.perf_counter()
+
+    def prepare(self, func, *args):
+        """
+        提交一个绘图前的准备任务，结果作为submit的inputs
+
+        Args:
+            func (callable): 可以pickle的函数，如wordclouds.cloud_image
+            *args: 函数的参数
+
+        Returns:
+            Future: 返回(用时, 返回值)的Future，为0个进程时直接运行并返回已完成的Future
+        """
+        if self.executor is None:
+            return completed(run_task, func, args)
+        return self.executor.submit(run_task, func, args)
+
+    def submit(self, name, plot, *args, inputs=None):
+        """
+        提交一个绘图任务
+
+        Args:
+            name (str): 图的名称，用于报告用时
+            plot (callable): 可以pickle的绘图函数，如分析类的plot_*方法
+            *args: 绘图函数的参数
+            inputs (list, optional): prepare返回的任务，全部完成后将返回值的列表作为最后一个参数传给绘图函数，
+                图的用时包含这些任务的用时. Defaults to None.
+        """
+        # failures are kept in the job and reported by wait, so later charts still render
+        if inputs is not None:
+            if self.executor is None:
+                self.jobs[name] = completed(self.compose, plot, args, inputs)
+            else:
+                self.jobs[name] = self.chains.submit(self.compose, plot, args, inputs)
+        elif self.executor is None:
+            self.jobs[name] = completed(render, plot, args)
+        else:
+            self.jobs[name] = self.executor.submit(render, plot, args)
+
+    def compose(self, plot, args, inputs):
+        """
+        等待准备任务完成后绘图
+
+        Args:
+            plot (callable): 绘图函数
+            args (tuple): 绘图函数的参数
+            inputs (list): prepare返回的任务
+
+        Returns:
+            float: 准备任务和绘图的总用时(秒)
+        """
+        results = [task.result() for task in inputs]
+        args = (*args, [result for _, result in results])
+        if self.executor is None:
+            seconds = render(plot, args)
+        else:
+            seconds = self.executor.submit(render, plot, args).result()
+        return seconds + sum(seconds for seconds, _ in results)
+
+    def wait(self):
+        """
+        等待所有绘图任务完成并输出每张图的用时
+
+        Returns:
+            dict: 图的名称到用时(秒)
+
+        Raises:
+            Exception: 任意绘图任务失败，其他任务完成后抛出第一个异常
+        """
+        timings = self.timings
+        errors = []
+        for name, job in self.jobs.items():
+            try:
+                timings[name] = job.result()
+            except Exception as e:
+                print(f"{name}绘制失败: {e!r}")
+                errors.append(e)
+        if self.executor is not None:
+            self.chains.shutdown()
+            self.executor.shutdown()
+        elapsed = time.perf_counter() - self.start
+        for name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+            print(f"{name}: {seconds:.2f}s")
+        print(
+            f"共绘制{len(timings)}张图，总用时{elapsed:.2f}s，"
+            f"逐张绘制需要{sum(timings.values()):.2f}s"
+        )
+        if errors:
+            raise errors[0]
+        return timings
@@ -0,0 +1,355 @@
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+
+from aiohttp import web
+
+from .anime_analysis import AnimeAnalysis
+from .dataset import Dataset
+from .music_analysis import MusicAnalysis
+from .tag_analysis import TagAnalysis
+
+logger = logging.getLogger(__name__)
+
+# same thresholds as the figures drawn by analysis.py
+DEFAULT_MIN_COUNT = 10
+DEFAULT_LIMIT = 32
+# statistics kept per snapshot, min_count comes from clients so it must be bounded
+RESULT_CACHE_SIZE = 64
+
+
+def query_int(query, name, default):
+    """
+    读取整数查询参数
+
+    Args:
+        query (MultiDictProxy): 请求的查询参数
+        name (str): 参数名
+        default (int): 默认值
+
+    Returns:
+        int: 参数值
+
+    Raises:
+        web.HTTPBadRequest: 参数不是非负整数
+    """
+    value = query.get(name)
+    if value is None:
+        return default
+    # str.isdigit also accepts digits such as "²" that int() rejects
+    if not (value.isascii() and value.isdigit()):
+        raise web.HTTPBadRequest(text=f"{name}必须是非负整数")
+    return int(value)
+
+
+def query_list(query, name):
+    """
+    读取以逗号分隔的查询参数
+
+    Args:
+        query (MultiDictProxy): 请求的查询参数
+        name (str): 参数名
+
+    Returns:
+        list[str]: 参数值，没有该参数时为None
+    """
+    value = query.get(name)
+    if value is None:
+        return None
+    return [item for item in value.split(",") if item]
+
+
+def ranking(counts, limit):
+    """
+    将计数转换为按数量降序排列的列表
+
+    Args:
+        counts (Counter or pandas.Series): 计数，Series已按数量降序排列
+        limit (int): 最多返回的数量，为0时返回全部
+
+    Returns:
+        list[dict]: 包含name和count的记录
+    """
+    if isinstance(counts, collections.Counter):
+        items = counts.most_common(limit or None)
+    else:
+        items = (counts.head(limit) if limit else counts).items()
+    return [{"name": str(name), "count": int(count)} for name, count in items]
+
+
+class Snapshot:
+    def __init__(self, file_path, type, cache=True):
+        """
+        初始化Snapshot对象
+
+        加载一份数据文件，并用TagAnalysis、MusicAnalysis和AnimeAnalysis预先计算默认参数下的
+        各项统计；其他参数的统计在第一次请求时计算，最近使用的RESULT_CACHE_SIZE项保存在内存中。
+        数据文件更新后创建新的Snapshot替换。
+
+        Args:
+            file_path (str): 数据文件路径，.parquet或.csv
+            type (str): 条目类型
+            cache (bool, optional): 是否使用Dataset的磁盘缓存. Defaults to True.
+        """
+        dataset = Dataset(file_path, cache=cache)
+        self.type = type
+        self.file_path = file_path
+        self.digest = dataset.digest
+        self.subjects = len(dataset.rows)
+        tag_analysis = TagAnalysis(type, dataset)
+        # index name -> (count method, whether it takes min_count)
+        self.indexes = {
+            "tags": (tag_analysis.count_tag_frequency, True),
+            "tag-years": (tag_analysis.count_tag_year_frequency, True),
+        }
+        if type == "music":
+            music_analysis = MusicAnalysis(dataset)
+            self.indexes["years"] = (music_analysis.count_year_music, False)
+            self.indexes["composers"] = (music_analysis.count_composer_frequency, False)
+            self.indexes["companies"] = (music_analysis.count_company_music, False)
+        elif type == "anime":
+            anime_analysis = AnimeAnalysis(dataset)
+            self.indexes["years"] = (anime_analysis.count_year_anime, False)
+            self.indexes["companies"] = (anime_analysis.count_company_anime, False)
+        self.results = collections.OrderedDict()
+        for name in self.indexes:
+            self.index(name, DEFAULT_MIN_COUNT)
+        self.loaded_at = time.time()
+
+    def index(self, name, min_count):
+        """
+        获取一项统计结果，不在内存中时使用分析类的count_*方法计算，超过RESULT_CACHE_SIZE项时丢弃最久未使用的
+
+        Args:
+            name (str): 统计名称，见self.indexes
+            min_count (int): 最小选择量，不使用该参数的统计忽略
+
+        Returns:
+            object: count_*方法的返回值
+        """
+        count, takes_min_count = self.indexes[name]
+        key = (name, min_count if takes_min_count else None)
+        if key in self.results:
+            self.results.move_to_end(key)
+            return self.results[key]
+        result = count(min_count) if takes_min_count else count()
+        self.results[key] = result
+        if len(self.results) > RESULT_CACHE_SIZE:
+            self.results.popitem(last=False)
+        return result
+
+    def answer(self, name, query):
+        """
+        回答一次查询
+
+        Args:
+            name (str): 统计名称，见self.indexes
+            query (MultiDictProxy): 请求的查询参数
+
+        Returns:
+            dict: 可以序列化为JSON的结果
+        """
+        min_count = query_int(query, "min_count", DEFAULT_MIN_COUNT)
+        limit = query_int(query, "limit", DEFAULT_LIMIT)
+        result = self.index(name, min_count)
+        if name == "years":
+            return {
+                "years": [
+                    {"year": str(year), "count": int(count)}
+                    for year, count in result.items()
+                ]
+            }
+        if name == "tag-years":
+            tags = query_list(query, "tags")
+            years = query_list(query, "years")
+            # columns are ordered by total count, so the first columns are the top tags
+            table = (
+                result[[tag for tag in tags if tag in result.columns]]
+                if tags
+                else (result.iloc[:, :limit] if limit else result)
+            )
+            if years:
+                table = table.loc[[year for year in years if year in table.index]]
+            return {
+                "min_count": min_count,
+                "years": [str(year) for year in table.index],
+                "tags": [str(tag) for tag in table.columns],
+                "counts": table.to_numpy().tolist(),
+            }
+        response = {name: ranking(result, limit)}
+        if name == "tags":
+            response["min_count"] = min_count
+        return response
+
+
+class QueryServer:
+    def __init__(
+        self, file_path, type, cache=True, reload_interval=5.0, cache_size=1024
+    ):
+        """
+        初始化QueryServer对象
+
+        以HTTP/JSON提供预先计算的统计结果。相同的查询直接返回缓存的响应，并支持ETag；
+        后台定期检查数据文件，新的爬取结果写入后在后台加载新的Snapshot，加载完成前继续使用旧数据。
+
+        Args:
+            file_path (str): 数据文件路径，.parquet或.csv
+            type (str): 条目类型
+            cache (bool, optional): 是否使用Dataset的磁盘缓存. Defaults to True.
+            reload_interval (float, optional): 检查数据文件的间隔(秒)，为0时不重新加载. Defaults to 5.0.
+            cache_size (int, optional): 缓存的响应数量，为0时不缓存. Defaults to 1024.
+        """
+        self.file_path = file_path
+        self.type = type
+        self.cache = cache
+        self.reload_interval = reload_interval
+        self.cache_size = cache_size
+        self.stat = self.file_stat()
+        self.snapshot = Snapshot(file_path, type, cache)
+        self.responses = collections.OrderedDict()
+        self.stats = collections.Counter()
+        # count methods of one snapshot share a DuckDB connection
+        self.lock = asyncio.Lock()
+        self.watcher = None
+
+    def file_stat(self):
+        """
+        获取数据文件的修改时间和大小
+
+        Returns:
+            tuple: (修改时间, 大小)
+        """
+        stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def make_app(self):
+        """
+        创建aiohttp应用
+
+        Returns:
+            web.Application: 查询服务应用
+        """
+        app = web.Application()
+        app.router.add_get("/api/status", self.get_status)
+        app.router.add_get("/api/{name}", self.get_index)
+        app.on_startup.append(self.start_watcher)
+        app.on_cleanup.append(self.stop_watcher)
+        return app
+
+    async def start_watcher(self, app):
+        """
+        应用启动时在后台开始检查数据文件
+
+        Args:
+            app (web.Application): 查询服务应用
+        """
+        if self.reload_interval > 0:
+            self.watcher = asyncio.create_task(self.watch())
+
+    async def stop_watcher(self, app):
+        """
+        应用关闭时停止检查数据文件
+
+        Args:
+            app (web.Application): 查询服务应用
+        """
+        if self.watcher is not None:
+            self.watcher.cancel()
+
+    async def watch(self):
+        """
+        定期检查数据文件，内容变化时加载新的Snapshot并清空响应缓存
+        """
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                stat = self.file_stat()
+                if stat == self.stat:
+                    continue
+                snapshot = await asyncio.to_thread(
+                    Snapshot, self.file_path, self.type, self.cache
+                )
+            except Exception as e:
+                # the crawler may still be writing, try again on the next tick
+                logger.warning("重新加载%s失败: %r", self.file_path, e)
+                continue
+            self.stat = stat
+            if snapshot.digest == self.snapshot.digest:
+                continue
+            self.snapshot = snapshot
+            self.responses.clear()
+            self.stats["reloads"] += 1
+            print(f"已重新加载{self.file_path}，共{snapshot.subjects}个条目")
+
+    async def get_status(self, request):
+        """
+        返回当前数据文件、条目数、加载时间和响应缓存的命中情况，不缓存
+        """
+        snapshot = self.snapshot
+        return web.json_response(
+            {
+                "type": snapshot.type,
+                "file": snapshot.file_path,
+                "digest": snapshot.digest,
+                "subjects": snapshot.subjects,
+                "loaded_at": snapshot.loaded_at,
+                "indexes": list(snapshot.indexes),
+                "cached_responses": len(self.responses),
+                **self.stats,
+            }
+        )
+
+    async def get_index(self, request):
+        """
+        回答一次统计查询，响应按数据内容、统计名称和查询参数缓存
+        """
+        name = request.match_info["name"]
+        snapshot = self.snapshot
+        if name not in snapshot.indexes:
+            raise web.HTTPNotFound(text=f"没有统计{name}")
+        key = (snapshot.digest, name, tuple(sorted(request.query.items())))
+        if key in self.responses:
+            self.responses.move_to_end(key)
+            body, etag = self.responses[key]
+            self.stats["hits"] += 1
+            cache_status = "hit"
+        else:
+            async with self.lock:
+                answer = await asyncio.to_thread(snapshot.answer, name, request.query)
+            body = json.dumps(answer, ensure_ascii=False).encode()
+            etag = '"' + hashlib.sha256(repr(key).encode()).hexdigest()[:32] + '"'
+            if self.cache_size > 0:
+                self.responses[key] = (body, etag)
+                if len(self.responses) > self.cache_size:
+                    self.responses.popitem(last=False)
+            self.stats["misses"] += 1
+            cache_status = "miss"
+        headers = {"ETag": etag, "X-Cache": cache_status}
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(
+            body=body, content_type="application/json", charset="utf-8", headers=headers
+        )
+
+
+def serve(file_path, type, host="127.0.0.1", port=8000, **kwargs):
+    """
+    运行查询服务，直到进程被终止
+
+    Args:
+        file_path (str): 数据文件路径，.parquet或.csv
+        type (str): 条目类型
+        host (str, optional): 监听地址. Defaults to "127.0.0.1".
+        port (int, optional): 监听端口. Defaults to 8000.
+        **kwargs: QueryServer的其他参数
+    """
+    server = QueryServer(file_path, type, **kwargs)
+    print(
+        f"已加载{server.snapshot.subjects}个条目，查询服务运行在http://{host}:{port}/api/，"
+        f"可用的统计: status, {', '.join(server.snapshot.indexes)}"
+    )
+    web.run_app(server.make_app(), host=host, port=port, print=None)
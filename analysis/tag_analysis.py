@@ -4,30 +4,43 @@ import os
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
-from wordcloud import WordCloud
+
+from .dataset import Dataset
+from .wordclouds import (
+    PREVIEW_FACTOR,
+    CloudSpec,
+    cloud_images,
+    preview_options,
+    save_cloud,
+)
 
 
 class TagAnalysis:
-    def __init__(self, type, file_path, save_path="figures"):
+    def __init__(self, type, dataset, save_path="figures", preview=False):
         """
         初始化TagAnalysis对象
 
         Args:
-            file_path (str): 数据文件路径
+            type (str): 条目类型
+            dataset (Dataset): 条目数据
             save_path (str, optional): 图片保存路径. Defaults to "figures".
+            preview (bool, optional): 以低分辨率生成词云，用于快速预览. Defaults to False.
         """
         self.type = type
-        self.data = (
-            pd.read_csv(file_path, parse_dates=["date"], low_memory=False)
-            .dropna(subset=["date"])
-            .assign(
-                tags=lambda x: x["tags"].apply(eval),
-                year=lambda x: x["date"].dt.year.astype(str),
-                month=lambda x: x["date"].dt.month.astype(str),
-                day=lambda x: x["date"].dt.day.astype(str),
-            )
-        )
+        self.db = dataset.database
         self.save_path = save_path
+        self.preview = preview
+        self.cloud_cache = (
+            os.path.join(dataset.cache_dir, "wordclouds") if dataset.cache else None
+        )
+
+    def __getstate__(self):
+        """
+        绘图任务在Renderer的子进程中运行，只传递绘图需要的属性，不传递数据库连接
+        """
+        state = self.__dict__.copy()
+        state.pop("db")
+        return state
 
     def count_tag_frequency(self, min_count):
         """
@@ -39,12 +52,17 @@ class TagAnalysis:
         Returns:
             Counter: tag数量统计结果
         """
-        tag_counts = collections.Counter(
-            tag
-            for tags in self.data["tags"]
-            for tag, count in tags.items()
-            if count >= min_count
+        data = self.db.query(
+            """
+            SELECT tag::VARCHAR AS tag, COUNT(*) AS count
+            FROM tags
+            WHERE count >= $min_count
+            GROUP BY tag
+            ORDER BY MIN(row)
+            """,
+            {"min_count": min_count},
         )
+        tag_counts = collections.Counter(dict(zip(data["tag"], data["count"].tolist())))
         return tag_counts
 
     def plot_tag_counts(self, tag_counts, top_n):
@@ -60,12 +78,13 @@ class TagAnalysis:
             .loc[lambda df: ~df["tag"].str.match(r"\d{4}")]
             .head(top_n)
         )
-        sns.barplot(x="count", y="tag", data=tag_counts_df)
-        plt.title("tag数量统计")
-        plt.xlabel("数量")
-        plt.ylabel("tag")
-        plt.savefig(os.path.join(self.save_path, f"tag_{self.type}_counts.png"))
-        plt.clf()
+        fig, ax = plt.subplots()
+        sns.barplot(x="count", y="tag", data=tag_counts_df, ax=ax)
+        ax.set_title("tag数量统计")
+        ax.set_xlabel("数量")
+        ax.set_ylabel("tag")
+        fig.savefig(os.path.join(self.save_path, f"tag_{self.type}_counts.png"))
+        plt.close(fig)
 
     def generate_wordcloud(self, tag_counts):
         """
@@ -74,17 +93,22 @@ class TagAnalysis:
         Args:
             tag_counts (Counter): tag数量统计结果
         """
-        wordcloud = WordCloud(
-            background_color="white",
-            max_words=1000,
-            # font_path="xiaolaisc-regular.ttf",
-            font_path="msyh.ttc",
-            width=3840,
-            height=2160,
-            max_font_size=500,
-        ).generate_from_frequencies(tag_counts)
-        wordcloud.to_file(
-            os.path.join(self.save_path, f"tag_{self.type}_wordcloud.png")
+        options = {
+            "background_color": "white",
+            "max_words": 1000,
+            # "font_path": "xiaolaisc-regular.ttf",
+            "font_path": "msyh.ttc",
+            "width": 3840,
+            "height": 2160,
+            "max_font_size": 500,
+        }
+        if self.preview:
+            options = preview_options(options)
+        save_cloud(
+            tag_counts,
+            options,
+            os.path.join(self.save_path, f"tag_{self.type}_wordcloud.png"),
+            self.cloud_cache,
         )
 
     def count_tag_year_frequency(self, min_count=100):
@@ -97,14 +121,9 @@ class TagAnalysis:
         Returns:
             DataFrame: 不同年份和不同tag之间的关系
         """
-        tag_df = pd.json_normalize(self.data["tags"]).fillna(0).astype(int)
-        tag_year_df = tag_df.groupby(self.data["year"]).sum()
-        tag_counts = (
-            tag_year_df.sum(axis=0)
-            .loc[lambda s: s > min_count]
-            .sort_values(ascending=False)
+        tag_year_counts_df = self.db.sum_tags_by(
+            "SELECT id AS subject_id, year AS name FROM subjects", "year", min_count
         )
-        tag_year_counts_df = tag_year_df[tag_counts.index]
         return tag_year_counts_df
 
     def plot_tag_year_counts_heatmap(self, tag_year_counts_df, top_n=32):
@@ -115,23 +134,26 @@ class TagAnalysis:
             tag_year_counts_df (DataFrame): 不同年份和不同tag之间的关系
             top_n (int, optional): 展示的tag数量. Defaults to 32.
         """
-        plt.figure(figsize=(16, 8))
-        sns.heatmap(tag_year_counts_df.T.head(top_n), cmap="Blues", vmax=10000)
-        plt.xlabel("年份")
-        plt.ylabel("tag")
-        plt.xticks(rotation=45)
-        plt.savefig(
+        fig, ax = plt.subplots(figsize=(16, 8))
+        sns.heatmap(tag_year_counts_df.T.head(top_n), cmap="Blues", vmax=10000, ax=ax)
+        ax.set_xlabel("年份")
+        ax.set_ylabel("tag")
+        ax.tick_params(axis="x", labelrotation=45)
+        fig.savefig(
             os.path.join(self.save_path, f"tag_year_counts_{self.type}_heatmap.png")
         )
-        plt.clf()
+        plt.close(fig)
 
-    def wordcloud_subplots(self, tag_year_counts_df, layout):
+    def year_clouds(self, tag_year_counts_df, layout):
         """
-        使用词云展示不同年份和不同tag之间的关系
+        选出tag最多的年份，生成每个年份词云的词频和参数
 
         Args:
             tag_year_counts_df (DataFrame): 不同年份和不同tag之间的关系
             layout (tuple): 子图布局
+
+        Returns:
+            CloudSpec: 子图标题、词频、词云参数和布局缓存目录
         """
         top_years = (
             tag_year_counts_df.sum(axis=1)
@@ -140,35 +162,60 @@ class TagAnalysis:
             .index.tolist()
         )
 
+        options = {
+            "background_color": "white",
+            # "max_words": 1000,
+            # "font_path": "xiaolaisc-regular.ttf",
+            "font_path": "msyh.ttc",
+            "width": 1600,
+            "height": 1600,
+            "max_font_size": 400,
+        }
+        if self.preview:
+            options = preview_options(options)
+        return CloudSpec(
+            top_years,
+            [tag_year_counts_df.loc[year].nlargest(200) for year in top_years],
+            options,
+            self.cloud_cache,
+        )
+
+    def wordcloud_subplots(self, tag_year_counts_df, layout, images=None):
+        """
+        使用词云展示不同年份和不同tag之间的关系
+
+        Args:
+            tag_year_counts_df (DataFrame): 不同年份和不同tag之间的关系
+            layout (tuple): 子图布局
+            images (list, optional): 按year_clouds的顺序生成的词云图片，为None时在这里生成. Defaults to None.
+        """
+        top_years, frequencies, options, cache_dir = self.year_clouds(
+            tag_year_counts_df, layout
+        )
+        if images is None:
+            images = cloud_images(frequencies, options, cache_dir)
+        dpi = 300 // PREVIEW_FACTOR if self.preview else 300
+
         fig, axes = plt.subplots(
             nrows=layout[0],
             ncols=layout[1],
             figsize=(20, 20),
-            dpi=300,
+            dpi=dpi,
         )
 
         for i, ax in enumerate(axes.flat):
             if i < len(top_years):
                 year = top_years[i]
-                tag_counts = tag_year_counts_df.loc[year].nlargest(200)
-                wordcloud = WordCloud(
-                    background_color="white",
-                    # max_words=1000,
-                    # font_path="xiaolaisc-regular.ttf",
-                    font_path="msyh.ttc",
-                    width=1600,
-                    height=1600,
-                    max_font_size=400,
-                ).generate_from_frequencies(tag_counts)
-                ax.imshow(wordcloud, interpolation="bilinear")
+                ax.imshow(images[i], interpolation="bilinear")
                 ax.set_title(year, fontdict={"fontsize": 20})
                 ax.axis("off")
 
         fig.suptitle(f"Top 9 Years with Most Tags", fontsize=30, y=0.99)
 
-        plt.savefig(
+        fig.savefig(
             os.path.join(self.save_path, f"tag_year_counts_{self.type}_wordcloud.png")
         )
+        plt.close(fig)
 
 
 if __name__ == "__main__":
@@ -180,7 +227,7 @@ if __name__ == "__main__":
             "figure.autolayout": True,
         }
     )
-    tag_analysis = TagAnalysis("anime", "data/anime_infos.csv")
+    tag_analysis = TagAnalysis("anime", Dataset("data/anime_infos.csv"))
 
     tag_counts = tag_analysis.count_tag_frequency(10)
     tag_analysis.plot_tag_counts(tag_counts, 32)
@@ -0,0 +1,102 @@
+import ast
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# one "'tag': count" pair of the dict repr stored in the tags column of the old CSV files
+TAG_PATTERN = re.compile(
+    r"""('[^'\\]*(?:\\.[^'\\]*)*'|"[^"\\]*(?:\\.[^"\\]*)*"):\s*(-?\d+)"""
+)
+
+
+def parse_token(token):
+    """
+    解析tag的字符串字面量，只有包含转义字符时才使用ast.literal_eval
+
+    Args:
+        token (str): 带引号的字符串字面量
+
+    Returns:
+        str: tag名称
+    """
+    if "\\" in token:
+        return ast.literal_eval(token)
+    return token[1:-1]
+
+
+class TagTable:
+    def __init__(self, tags, vocabulary):
+        """
+        初始化TagTable对象
+
+        以长表保存条目的tag，每个(条目, tag)一行，tag名称只在词典中保存一次，
+        长表中使用整数编号，行的顺序与条目及其tag的原始顺序一致。
+
+        Args:
+            tags (DataFrame): 包含subject_id、tag_id和count列的长表
+            vocabulary (pandas.Index): tag词典，tag_id为词典中的位置
+        """
+        self.tags = tags
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        读取条目的tag，Parquet文件在Arrow中展开，旧版CSV文件按正则表达式解析，不执行任何代码
+
+        Args:
+            file_path (str): 数据文件路径，.parquet或.csv
+
+        Returns:
+            TagTable: 条目的tag
+        """
+        if file_path.endswith(".parquet"):
+            table = pq.read_table(file_path, columns=["id", "tags"])
+            tags = table["tags"].combine_chunks()
+            flat = pc.list_flatten(tags)
+            names = pc.dictionary_encode(flat.field("name"))
+            subject_ids = pc.take(table["id"], pc.list_parent_indices(tags))
+            return cls(
+                pd.DataFrame(
+                    {
+                        "subject_id": subject_ids.to_numpy(),
+                        "tag_id": names.indices.to_numpy(),
+                        "count": flat.field("count").to_numpy(zero_copy_only=False),
+                    }
+                ),
+                pd.Index(names.dictionary.to_pylist()),
+            )
+        data = pd.read_csv(file_path, usecols=["id", "tags"])
+        matches = data["tags"].fillna("").str.findall(TAG_PATTERN)
+        pairs = [pair for row in matches for pair in row]
+        tag_ids, vocabulary = pd.factorize(
+            np.array([parse_token(token) for token, _ in pairs], dtype=object)
+        )
+        return cls(
+            pd.DataFrame(
+                {
+                    "subject_id": np.repeat(
+                        data["id"].to_numpy(), matches.str.len().to_numpy()
+                    ),
+                    "tag_id": tag_ids.astype(np.int32),
+                    "count": np.array([int(count) for _, count in pairs], np.int32),
+                }
+            ),
+            pd.Index(vocabulary),
+        )
+
+    def select(self, subject_ids):
+        """
+        只保留给定条目的tag
+
+        Args:
+            subject_ids (iterable): 条目代码
+
+        Returns:
+            TagTable: 共用同一个词典的TagTable
+        """
+        mask = self.tags["subject_id"].isin(subject_ids)
+        return TagTable(self.tags[mask].reset_index(drop=True), self.vocabulary)
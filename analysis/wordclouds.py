@@ -0,0 +1,153 @@
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+
+import wordcloud.wordcloud
+from PIL import Image, ImageFont
+
+from .renderer import in_worker
+
+# preview clouds are laid out at 1/PREVIEW_FACTOR of the width, height and font sizes
+PREVIEW_FACTOR = 4
+
+# the clouds of a word-cloud figure, laid out as separate jobs before the figure is drawn
+CloudSpec = collections.namedtuple(
+    "CloudSpec", ["titles", "frequencies", "options", "cache_dir"]
+)
+
+
+class CachedImageFont:
+    """
+    替换wordcloud中的ImageFont模块，同一字体文件的每个字号在每个进程中只加载一次
+    """
+
+    # wordcloud reloads the font file for every font size it tries while placing each word
+    truetype = staticmethod(functools.lru_cache(maxsize=None)(ImageFont.truetype))
+
+    def __getattr__(self, name):
+        return getattr(ImageFont, name)
+
+
+wordcloud.wordcloud.ImageFont = CachedImageFont()
+
+
+def preview_options(options):
+    """
+    将词云参数缩小为预览用的低分辨率参数
+
+    Args:
+        options (dict): WordCloud的参数
+
+    Returns:
+        dict: 宽高和字号缩小PREVIEW_FACTOR倍的参数
+    """
+    options = dict(options)
+    for name in ["width", "height", "max_font_size"]:
+        if options.get(name):
+            options[name] = max(1, options[name] // PREVIEW_FACTOR)
+    options["min_font_size"] = max(1, options.get("min_font_size", 4) // PREVIEW_FACTOR)
+    return options
+
+
+def layout_key(frequencies, options):
+    """
+    计算词频和词云参数对应的布局缓存键
+
+    Args:
+        frequencies (dict or pandas.Series): 词频
+        options (dict): WordCloud的参数
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256(json.dumps(options, sort_keys=True).encode())
+    font_path = options.get("font_path")
+    if font_path and os.path.exists(font_path):
+        digest.update(str(os.path.getsize(font_path)).encode())
+    for word, count in frequencies.items():
+        digest.update(f"{word}\t{float(count)!r}\n".encode())
+    return digest.hexdigest()
+
+
+def cloud_image(frequencies, options, cache_dir=None):
+    """
+    生成词云图片，相同的词频和参数直接使用缓存的布局，只重新绘制文字
+
+    Args:
+        frequencies (dict or pandas.Series): 词频
+        options (dict): WordCloud的参数
+        cache_dir (str, optional): 布局缓存目录，为None时不使用缓存. Defaults to None.
+
+    Returns:
+        numpy.ndarray: RGB图片
+    """
+    cloud = wordcloud.WordCloud(**options)
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, f"{layout_key(frequencies, options)}.pkl")
+    if path is not None and os.path.exists(path):
+        with open(path, "rb") as f:
+            cloud.layout_ = pickle.load(f)
+    else:
+        cloud.generate_from_frequencies(frequencies)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # write then rename so parallel workers never read a half written layout
+            with open(path + f".{os.getpid()}.tmp", "wb") as f:
+                pickle.dump(cloud.layout_, f)
+            os.replace(path + f".{os.getpid()}.tmp", path)
+    return cloud.to_array()
+
+
+def cloud_images(frequencies_list, options, cache_dir=None, processes=None):
+    """
+    并行生成多张词云图片
+
+    Args:
+        frequencies_list (list): 每张词云的词频
+        options (dict): WordCloud的参数
+        cache_dir (str, optional): 布局缓存目录，为None时不使用缓存. Defaults to None.
+        processes (int, optional): 进程数，为None时使用所有核心(在Renderer的绘图进程中为0)，
+            为0时在当前进程中依次生成. Defaults to None.
+
+    Returns:
+        list[numpy.ndarray]: RGB图片，与frequencies_list的顺序一致
+    """
+    if processes is None:
+        # the render pool already uses every core, a nested pool would only oversubscribe
+        processes = 0 if in_worker() else os.cpu_count()
+    processes = min(processes, len(frequencies_list))
+    if processes <= 1:
+        return [
+            cloud_image(frequencies, options, cache_dir)
+            for frequencies in frequencies_list
+        ]
+    with concurrent.futures.ProcessPoolExecutor(
+        processes, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return list(
+            executor.map(
+                cloud_image,
+                frequencies_list,
+                [options] * len(frequencies_list),
+                [cache_dir] * len(frequencies_list),
+            )
+        )
+
+
+def save_cloud(frequencies, options, file_path, cache_dir=None):
+    """
+    生成词云并保存为图片
+
+    Args:
+        frequencies (dict or pandas.Series): 词频
+        options (dict): WordCloud的参数
+        file_path (str): 图片路径
+        cache_dir (str, optional): 布局缓存目录，为None时不使用缓存. Defaults to None.
+    """
+    Image.fromarray(cloud_image(frequencies, options, cache_dir)).save(file_path)
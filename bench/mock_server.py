@@ -0,0 +1,434 @@
+import asyncio
+import collections
+import functools
+import io
+import json
+import multiprocessing
+import random
+import socket
+import time
+import urllib.request
+
+from aiohttp import web
+from PIL import Image, ImageOps
+
+PAGE_SIZE = 24
+SUBJECT_TYPES = {"book": 1, "anime": 2, "music": 3, "game": 4, "real": 6}
+# cover widths of lain.bgm.tv, covers are 7:10 portraits
+COVER_WIDTHS = {"large": 400, "common": 150, "medium": 100, "small": 48, "grid": 32}
+
+
+class LatencyModel:
+    def __init__(self, spec="fixed:0"):
+        """
+        初始化LatencyModel对象
+
+        Args:
+            spec (str, optional): 延迟分布，格式为"分布:参数"，单位为秒，可选：
+                fixed:秒数、uniform:最小值:最大值、exponential:均值、lognormal:中位数:sigma.
+                Defaults to "fixed:0".
+        """
+        kind, *params = spec.split(":")
+        assert kind in ["fixed", "uniform", "exponential", "lognormal"]
+        self.kind = kind
+        self.params = [float(param) for param in params]
+
+    def sample(self, rng):
+        """
+        采样一次延迟
+
+        Args:
+            rng (random.Random): 随机数生成器
+
+        Returns:
+            float: 延迟(秒)
+        """
+        if self.kind == "fixed":
+            return self.params[0] if self.params else 0.0
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "exponential":
+            return rng.expovariate(1 / self.params[0])
+        median, sigma = self.params
+        return rng.lognormvariate(0, sigma) * median
+
+
+class MockBangumi:
+    def __init__(
+        self,
+        subjects=1000,
+        latency="fixed:0",
+        error_rate=0.0,
+        throttle_rate=0.0,
+        retry_after=1,
+        payload_size=2000,
+        placeholder_rate=0.1,
+        seed=0,
+    ):
+        """
+        初始化MockBangumi对象
+
+        模拟bgm.tv的排行榜页面、api.bgm.tv的/v0/subjects接口及其关联接口和lain.bgm.tv的封面图片，
+        返回与真实接口结构相同的数据，条目中的封面URL指向模拟服务器本身，
+        可以配置延迟分布、5xx错误和429限流的注入比例以及条目数据的大小。
+
+        Args:
+            subjects (int, optional): 每种类型的条目数量. Defaults to 1000.
+            latency (str, optional): 延迟分布，见LatencyModel. Defaults to "fixed:0".
+            error_rate (float, optional): 返回500的请求比例. Defaults to 0.0.
+            throttle_rate (float, optional): 返回429的请求比例. Defaults to 0.0.
+            retry_after (int, optional): 429响应中Retry-After的秒数. Defaults to 1.
+            payload_size (int, optional): 条目简介的字符数，用于控制响应大小. Defaults to 2000.
+            placeholder_rate (float, optional): 使用同一张默认封面的条目比例，用于测试按内容去重. Defaults to 0.1.
+            seed (int, optional): 随机数种子. Defaults to 0.
+        """
+        self.subjects = subjects
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.payload_size = payload_size
+        self.placeholder_rate = placeholder_rate
+        self.rng = random.Random(seed)
+        self.stats = collections.Counter()
+
+    def make_app(self):
+        """
+        创建aiohttp应用
+
+        Returns:
+            web.Application: 模拟服务器应用
+        """
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get("/__stats", self.get_stats)
+        app.router.add_get("/v0/subjects", self.get_listing)
+        app.router.add_get("/v0/subjects/{id}", self.get_subject)
+        app.router.add_get("/v0/subjects/{id}/{kind}", self.get_relations)
+        app.router.add_get("/{type}/browser", self.get_browser)
+        app.router.add_get("/pic/cover/{size}/{id}.jpg", self.get_cover)
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        """
+        为每个请求注入延迟、错误和限流，并统计请求数、状态码和响应字节数
+        """
+        if request.path == "/__stats":
+            return await handler(request)
+        await asyncio.sleep(self.latency.sample(self.rng))
+        roll = self.rng.random()
+        if roll < self.throttle_rate:
+            response = web.Response(
+                status=429, headers={"Retry-After": str(self.retry_after)}
+            )
+        elif roll < self.throttle_rate + self.error_rate:
+            response = web.Response(status=500)
+        else:
+            response = await handler(request)
+        self.stats["requests"] += 1
+        self.stats[f"status_{response.status}"] += 1
+        self.stats["bytes"] += len(response.body or b"")
+        return response
+
+    async def get_stats(self, request):
+        """
+        返回请求数、状态码和响应字节数的统计
+        """
+        return web.json_response(self.stats)
+
+    def make_subject(self, subject_id, type_code, host="https://lain.bgm.tv"):
+        """
+        生成与/v0/subjects/{id}结构相同的条目数据
+
+        Args:
+            subject_id (int): 条目代码
+            type_code (int): 条目类型代码
+            host (str, optional): 封面URL的主机. Defaults to "https://lain.bgm.tv".
+
+        Returns:
+            dict: 条目数据
+        """
+        rng = random.Random(subject_id)
+        ratings = {str(score): rng.randint(0, 500) for score in range(1, 11)}
+        ratings["10"] += 1
+        tags = [
+            {"name": f"tag{rng.randint(0, 300)}", "count": rng.randint(1, 2000)}
+            for _ in range(30)
+        ]
+        return {
+            "id": subject_id,
+            "type": type_code,
+            "name": f"subject {subject_id}",
+            "name_cn": f"条目{subject_id}",
+            "summary": "简介" * (self.payload_size // 2),
+            "nsfw": False,
+            "locked": False,
+            "date": f"{rng.randint(1990, 2023)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "platform": "",
+            "images": {
+                size: f"{host}/pic/cover/{size}/{subject_id}.jpg"
+                for size in COVER_WIDTHS
+            },
+            "infobox": [
+                {"key": "作曲", "value": f"composer{rng.randint(0, 50)}"},
+                {"key": "厂牌", "value": f"label{rng.randint(0, 20)}"},
+                {"key": "动画制作", "value": f"studio{rng.randint(0, 20)}"},
+                {"key": "别名", "value": [{"v": f"alias {subject_id}"}]},
+            ],
+            "volumes": 0,
+            "eps": rng.randint(0, 26),
+            "total_episodes": 0,
+            "rating": {
+                "rank": subject_id,
+                "total": sum(ratings.values()),
+                "count": ratings,
+                "score": 7.0,
+            },
+            "collection": {
+                key: rng.randint(0, 5000)
+                for key in ["wish", "collect", "doing", "on_hold", "dropped"]
+            },
+            "tags": list({tag["name"]: tag for tag in tags}.values()),
+        }
+
+    async def get_subject(self, request):
+        """
+        模拟/v0/subjects/{id}，返回单个条目
+        """
+        subject_id = int(request.match_info["id"])
+        if not 1 <= subject_id <= self.subjects:
+            raise web.HTTPNotFound()
+        subject = self.make_subject(subject_id, 2, f"http://{request.host}")
+        return web.json_response(subject, dumps=dump_json)
+
+    def make_relations(self, subject_id, kind):
+        """
+        生成与/v0/subjects/{id}/{kind}结构相同的关联条目、人物或角色，关联条目的代码在条目范围内
+
+        Args:
+            subject_id (int): 条目代码
+            kind (str): subjects、persons或characters
+
+        Returns:
+            list[dict]: 关联数据
+        """
+        rng = random.Random(f"{kind}-{subject_id}")
+        if kind == "subjects":
+            relations = rng.sample(
+                [(2, "动画"), (3, "原声集"), (3, "角色歌"), (1, "原作")],
+                rng.randint(0, 3),
+            )
+            return [
+                {
+                    "id": target_id,
+                    "type": type_code,
+                    "name": f"subject {target_id}",
+                    "name_cn": f"条目{target_id}",
+                    "relation": relation,
+                    "images": {},
+                }
+                for target_id, (type_code, relation) in zip(
+                    rng.sample(range(1, self.subjects + 1), len(relations)), relations
+                )
+            ]
+        return [
+            {
+                "id": rng.randint(1, 100000),
+                "type": 1,
+                "name": f"{kind[:-1]} {i}",
+                "relation": "作曲" if kind == "persons" else "主角",
+                "images": {},
+            }
+            for i in range(rng.randint(0, 3))
+        ]
+
+    async def get_relations(self, request):
+        """
+        模拟/v0/subjects/{id}/{kind}，返回关联条目、人物或角色
+        """
+        subject_id = int(request.match_info["id"])
+        kind = request.match_info["kind"]
+        if kind not in ["subjects", "persons", "characters"]:
+            raise web.HTTPNotFound()
+        if not 1 <= subject_id <= self.subjects:
+            raise web.HTTPNotFound()
+        return web.json_response(self.make_relations(subject_id, kind), dumps=dump_json)
+
+    async def get_listing(self, request):
+        """
+        模拟/v0/subjects分页浏览接口，按limit和offset返回一页条目
+        """
+        type_code = int(request.query.get("type", 2))
+        limit = min(int(request.query.get("limit", 30)), 50)
+        offset = int(request.query.get("offset", 0))
+        data = [
+            self.make_subject(offset + i + 1, type_code, f"http://{request.host}")
+            for i in range(max(0, min(limit, self.subjects - offset)))
+        ]
+        return web.json_response(
+            {"total": self.subjects, "limit": limit, "offset": offset, "data": data},
+            dumps=dump_json,
+        )
+
+    async def get_cover(self, request):
+        """
+        返回条目的封面图片，部分条目返回相同的默认封面
+        """
+        size = request.match_info["size"]
+        subject_id = int(request.match_info["id"])
+        if size not in COVER_WIDTHS or not 1 <= subject_id <= self.subjects:
+            raise web.HTTPNotFound()
+        if random.Random(subject_id).random() < self.placeholder_rate:
+            # bgm.tv serves the same image for every subject without a cover
+            subject_id = 0
+        return web.Response(
+            body=make_cover(size, subject_id), content_type="image/jpeg"
+        )
+
+    async def get_browser(self, request):
+        """
+        模拟/{type}/browser排行榜页面，每页PAGE_SIZE个条目
+        """
+        type = request.match_info["type"]
+        if type not in SUBJECT_TYPES:
+            raise web.HTTPNotFound()
+        page = int(request.query.get("page", 1))
+        first = (page - 1) * PAGE_SIZE
+        items = "".join(
+            f'<li class="item"><a href="/subject/{subject_id}" class="subjectCover cover ll">'
+            f'<span class="image"><img src="/pic/{subject_id}.jpg" /></span></a>'
+            f'<div class="inner"><h3><a href="/subject/{subject_id}" class="l">条目{subject_id}</a></h3></div></li>'
+            for subject_id in range(
+                first + 1, min(first + PAGE_SIZE, self.subjects) + 1
+            )
+        )
+        html = (
+            '<html><head><meta charset="utf-8" /><title>排行榜</title></head><body>'
+            f'<div id="columnSubjectBrowserA"><ul id="browserItemList" class="browserFull">{items}</ul></div>'
+            "</body></html>"
+        )
+        return web.Response(text=html, content_type="text/html")
+
+
+@functools.lru_cache(maxsize=1024)
+def make_cover(size, subject_id):
+    """
+    生成条目的封面图片，颜色由条目代码决定
+
+    Args:
+        size (str): 封面尺寸
+        subject_id (int): 条目代码，为0时生成默认封面
+
+    Returns:
+        bytes: JPEG图片
+    """
+    rng = random.Random(subject_id)
+    width = COVER_WIDTHS[size]
+    gradient = Image.linear_gradient("L").resize((width, width * 10 // 7))
+    image = ImageOps.colorize(
+        gradient,
+        tuple(rng.randint(0, 255) for _ in range(3)),
+        tuple(rng.randint(0, 255) for _ in range(3)),
+    )
+    body = io.BytesIO()
+    image.save(body, "JPEG", quality=80)
+    return body.getvalue()
+
+
+def dump_json(data):
+    """
+    将数据编码为JSON，中文不转义
+
+    Args:
+        data (object): 响应数据
+
+    Returns:
+        str: JSON字符串
+    """
+    return json.dumps(data, ensure_ascii=False)
+
+
+def serve(port, kwargs):
+    """
+    在当前进程中运行模拟服务器，直到进程被终止
+
+    Args:
+        port (int): 监听端口
+        kwargs (dict): MockBangumi的参数
+    """
+    web.run_app(
+        MockBangumi(**kwargs).make_app(),
+        host="127.0.0.1",
+        port=port,
+        print=None,
+        access_log=None,
+    )
+
+
+class MockServer:
+    def __init__(self, **kwargs):
+        """
+        初始化MockServer对象，模拟服务器运行在独立的进程中，不与被测爬虫争用CPU和内存
+
+        Args:
+            **kwargs: MockBangumi的参数
+        """
+        self.kwargs = kwargs
+        self.port = None
+        self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout=10):
+        """
+        启动服务器进程并等待端口可用
+
+        Args:
+            timeout (int, optional): 等待启动的最长时间(秒). Defaults to 10.
+
+        Returns:
+            MockServer: 服务器自身
+        """
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.process = multiprocessing.Process(
+            target=serve, args=(self.port, self.kwargs), daemon=True
+        )
+        self.process.start()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                    return self
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise RuntimeError(f"模拟服务器未能在{timeout}秒内启动")
+
+    def stop(self):
+        """
+        终止服务器进程
+        """
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def stats(self):
+        """
+        获取服务器端的统计信息
+
+        Returns:
+            dict: 请求数、各状态码数量和响应字节数
+        """
+        with urllib.request.urlopen(self.base_url + "/__stats") as response:
+            return json.loads(response.read())
@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import crawler
+from bench import MockServer
+
+
+def get_hparams():
+    """
+    获取命令行参数
+
+    Returns:
+        ArgumentParser: 命令行参数解析器
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("-n", "--subjects", type=int, default=480, help="每个阶段爬取的条目数量")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="初始全局并发请求数")
+    parser.add_argument("-r", "--rate", type=float, default=1000.0, help="每秒请求数上限")
+
+    parser.add_argument(
+        "--latency", type=str, default="lognormal:0.05:0.5", help="模拟服务器的延迟分布"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的请求比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回429的请求比例")
+    parser.add_argument("--payload-size", type=int, default=2000, help="条目简介的字符数")
+
+    parser.add_argument("-o", "--output", type=str, help="将结果保存为JSON文件")
+    parser.add_argument("-b", "--baseline", type=str, help="用于比较的基准结果JSON文件")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="相对基准允许的吞吐量下降比例"
+    )
+    return parser
+
+
+def percentile(values, q):
+    """
+    计算分位数
+
+    Args:
+        values (list): 样本
+        q (float): 分位数，0到1之间
+
+    Returns:
+        float: 分位数，没有样本时返回0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def current_rss_mb():
+    """
+    获取当前进程的常驻内存，只支持Linux
+
+    Returns:
+        float: 常驻内存(MB)，不支持的平台返回None
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def peak_rss_mb():
+    """
+    获取当前进程启动以来的峰值常驻内存
+
+    Returns:
+        float: 峰值常驻内存(MB)，不支持的平台返回None
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class RssSampler:
+    def __init__(self, interval=0.01):
+        """
+        初始化RssSampler对象
+
+        在后台线程中定期采样常驻内存，得到一个阶段内的峰值；ru_maxrss是整个进程的峰值，
+        后面的阶段只能得到累计的最大值。不支持采样的平台使用进程启动以来的峰值。
+
+        Args:
+            interval (float, optional): 采样间隔(秒). Defaults to 0.01.
+        """
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        """
+        采样直到阶段结束
+        """
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        if self.peak is not None:
+            self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.peak is None:
+            self.peak = peak_rss_mb()
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+
+def run_phase(name, args, server, run):
+    """
+    使用新的请求引擎运行一个阶段，并统计该阶段的性能指标
+
+    Args:
+        name (str): 阶段名称
+        args (Namespace): 包含命令行参数的命名空间
+        server (MockServer): 模拟服务器
+        run (callable): 接收请求引擎的函数，执行该阶段的爬取
+
+    Returns:
+        dict: 该阶段的性能指标
+    """
+    limiter = crawler.RateLimiter(
+        rate=args.rate,
+        burst=args.concurrency,
+        concurrency=args.concurrency,
+        max_concurrency=max(32, args.concurrency),
+    )
+    server_before = server.stats()
+    with crawler.FetchEngine(limiter=limiter) as engine:
+        start = time.monotonic()
+        # progress output is not part of the measurement
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            with RssSampler() as rss:
+                run(engine)
+        elapsed = time.monotonic() - start
+    server_after = server.stats()
+    latencies = list(engine.latencies)
+    return {
+        "phase": name,
+        "seconds": elapsed,
+        "requests": engine.stats["requests"],
+        "requests_per_second": engine.stats["requests"] / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "bytes": engine.stats["bytes"],
+        "server_bytes": server_after.get("bytes", 0) - server_before.get("bytes", 0),
+        "retries": engine.stats["retries"],
+        "failures": engine.stats["failures"],
+        "peak_rss_mb": rss.peak,
+    }
+
+
+def run_benchmark(args, server, data_path):
+    """
+    依次运行排行榜、音乐、动画和封面四个阶段
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        server (MockServer): 模拟服务器
+        data_path (str): 临时数据路径
+
+    Returns:
+        list[dict]: 每个阶段的性能指标
+    """
+    pages = -(-args.subjects // crawler.rank_crawler.PAGE_SIZE)
+    subject_codes = []
+
+    def rank(engine):
+        rank_crawler = crawler.RankCrawler("music", data_path, 1, pages, engine=engine)
+        rank_crawler.url = f"{server.base_url}/music/browser?sort=rank"
+        subject_codes.extend(rank_crawler.get_subject_codes())
+
+    def subjects(subject_crawler_class):
+        def run(engine):
+            subject_crawler = subject_crawler_class(data_path, engine=engine)
+            subject_crawler.api = f"{server.base_url}/v0/subjects/{{}}"
+            subject_crawler.journal.reset()
+            subject_crawler.get_info(subject_codes)
+
+        return run
+
+    def covers(engine):
+        journal = crawler.CrawlJournal(os.path.join(data_path, "music_journal"))
+        store = crawler.CoverStore(os.path.join(data_path, "covers"))
+        crawler.CoverCrawler(store, engine=engine).get_covers(journal.records())
+        store.close()
+
+    return [
+        run_phase("rank", args, server, rank),
+        run_phase("music", args, server, subjects(crawler.MusicCrawler)),
+        run_phase("anime", args, server, subjects(crawler.AnimeCrawler)),
+        run_phase("covers", args, server, covers),
+    ]
+
+
+def report(results, baseline=None, tolerance=0.1):
+    """
+    输出性能指标，并与基准结果比较
+
+    Args:
+        results (list[dict]): 每个阶段的性能指标
+        baseline (list[dict], optional): 基准结果. Defaults to None.
+        tolerance (float, optional): 允许的吞吐量下降比例. Defaults to 0.1.
+
+    Returns:
+        bool: 是否存在性能退化
+    """
+    baseline = {result["phase"]: result for result in baseline or []}
+    regressed = False
+    print(
+        f"{'phase':<8}{'req':>7}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'MB':>9}{'retries':>9}{'failed':>8}{'peak RSS':>10}"
+    )
+    for result in results:
+        rss = result["peak_rss_mb"]
+        print(
+            f"{result['phase']:<8}{result['requests']:>7}"
+            f"{result['requests_per_second']:>10.1f}"
+            f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            f"{result['bytes'] / 1024 / 1024:>9.2f}"
+            f"{result['retries']:>9}{result['failures']:>8}"
+            f"{'-' if rss is None else f'{rss:.0f}':>10}"
+        )
+        base = baseline.get(result["phase"])
+        if base is not None:
+            ratio = result["requests_per_second"] / base["requests_per_second"]
+            if ratio < 1 - tolerance:
+                regressed = True
+                print(f"  {result['phase']}阶段吞吐量下降至基准的{ratio:.0%}")
+    return regressed
+
+
+def main():
+    """
+    主函数，在本地模拟服务器上测试爬虫的吞吐量
+    """
+    parser = get_hparams()
+    args = parser.parse_args()
+
+    server = MockServer(
+        subjects=args.subjects,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        payload_size=args.payload_size,
+    )
+    with server, tempfile.TemporaryDirectory() as data_path:
+        results = run_benchmark(args, server, data_path)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    regressed = report(results, baseline, args.tolerance)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
 import argparse
+import collections
 import csv
+import logging
 import os
+import socket
+import time
 
 import yaml
 
@@ -17,12 +21,69 @@ def get_hparams():
     parser = argparse.ArgumentParser()
 
     parser.add_argument("-p", "--path", type=str, default="data", help="本地保存的信息路径")
-    parser.add_argument("-t", "--type", type=str, default="music", help="爬取的条目类型")
+    parser.add_argument(
+        "-t", "--type", type=str, default="music", help="爬取的条目类型，多个类型用逗号分隔"
+    )
 
     parser.add_argument("-cfg", "--config", type=str, help="配置文件路径")
 
     parser.add_argument("-s", "--start", type=int, default=1, help="爬取的开始页数")
     parser.add_argument("-e", "--end", type=int, default=50, help="爬取的结束页数")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="初始全局并发请求数")
+    parser.add_argument("-r", "--rate", type=float, default=10.0, help="每秒请求数上限")
+    parser.add_argument(
+        "--decode-processes",
+        type=int,
+        default=0,
+        help="解析JSON和生成封面缩略图的进程数，0表示在线程池中处理",
+    )
+
+    parser.add_argument(
+        "-m",
+        "--mode",
+        type=str,
+        default="rank",
+        choices=["rank", "listing"],
+        help="rank: 从排行榜页面获取条目代码后逐个请求; listing: 使用分页浏览接口批量获取",
+    )
+    parser.add_argument("--resume", action="store_true", help="跳过爬取日志中已处理的条目")
+    parser.add_argument("--compact", action="store_true", help="仅将爬取日志合并为信息表")
+    parser.add_argument(
+        "--refresh", action="store_true", help="按刷新价值重新爬取已有条目，不重新获取排行榜"
+    )
+    parser.add_argument("--budget", type=int, default=1000, help="每次刷新最多请求的条目数量")
+    parser.add_argument("--replay", action="store_true", help="重新请求死信存储中重试后仍失败的请求")
+    parser.add_argument(
+        "--covers", action="store_true", help="下载爬取日志中条目的封面，并生成缩略图和颜色特征"
+    )
+    parser.add_argument(
+        "--cover-sizes", type=str, default="large", help="下载的封面尺寸，多个尺寸用逗号分隔"
+    )
+    parser.add_argument(
+        "--relations", action="store_true", help="从已爬取的条目出发按广度优先爬取关联条目、人物和角色"
+    )
+    parser.add_argument("--depth", type=int, default=1, help="关联关系爬取的最大深度")
+    parser.add_argument(
+        "--relation-types", type=str, help="继续扩展的关联条目类型，多个类型用逗号分隔，默认扩展所有类型"
+    )
+
+    parser.add_argument("--enqueue", action="store_true", help="将排行榜中的条目代码分片写入共享工作队列")
+    parser.add_argument("--worker", action="store_true", help="作为工作进程从共享工作队列租用条目爬取")
+    parser.add_argument("--worker-id", type=str, help="工作进程名称，默认为主机名-进程号")
+    parser.add_argument("--lease", type=int, default=300, help="工作队列租约时长(秒)")
+    parser.add_argument("--batch", type=int, default=500, help="工作进程每次租用的条目数量")
+
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="日志级别，DEBUG时输出每个请求",
+    )
+    parser.add_argument(
+        "--metrics", type=str, help="请求指标的导出路径，.prom为Prometheus文本格式，其余为JSON快照"
+    )
+    parser.add_argument("--metrics-interval", type=float, default=10, help="导出请求指标的间隔(秒)")
 
     parser.add_argument("-ua", "--user-agent", type=str, help="User-Agent")
     parser.add_argument("-at", "--access-token", type=str, help="Access Token")
@@ -55,13 +116,27 @@ def parse_args(parser):
         Namespace: 包含命令行参数的命名空间
     """
     args = parser.parse_args()
+    args.rate_limit = {"rate": args.rate}
     if args.config and os.path.exists(args.config):
         config = get_config(args.config)
         args.type = config["crawler"]["type"]
         args.start = config["crawler"]["start"]
         args.end = config["crawler"]["end"]
+        args.mode = config["crawler"].get("mode", args.mode)
+        args.concurrency = config["crawler"].get("concurrency", args.concurrency)
+        args.rate_limit.update(config["crawler"].get("rate-limit") or {})
+        args.budget = config["crawler"].get("refresh-budget", args.budget)
+        args.decode_processes = config["crawler"].get(
+            "decode-processes", args.decode_processes
+        )
+        args.cover_sizes = config["crawler"].get("cover-sizes", args.cover_sizes)
         args.user_agent = config["crawler"]["user-agent"]
         args.path = config["data"]["path"]
+    args.types = args.type if isinstance(args.type, list) else args.type.split(",")
+    if args.relation_types is not None:
+        args.relation_types = args.relation_types.split(",")
+    if isinstance(args.cover_sizes, str):
+        args.cover_sizes = args.cover_sizes.split(",")
     if not os.path.exists(args.path):
         os.makedirs(args.path)
     return args
@@ -73,31 +148,397 @@ def main():
     """
     parser = get_hparams()
     args = parse_args(parser)
+    logging.basicConfig(
+        level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+
+    if args.compact:
+        compact(args)
+        return
+
+    # one connection pool shared by every crawler for the whole run
+    limiter = crawler.RateLimiter.from_config(args.rate_limit, args.concurrency)
+    refresh_queue = crawler.RefreshQueue(
+        os.path.join(args.path, "refresh_queue.sqlite3")
+    )
+    dead_letters = crawler.DeadLetterStore(
+        os.path.join(args.path, "dead_letters.sqlite3")
+    )
+    with crawler.FetchEngine(limiter=limiter) as engine:
+        if args.metrics:
+            engine.export_metrics(args.metrics, args.metrics_interval)
+        scheduler = crawler.CrawlScheduler(
+            engine, decode_processes=args.decode_processes, dead_letters=dead_letters
+        )
+        if args.enqueue:
+            enqueue(args, engine)
+        elif args.worker:
+            work(args, scheduler, refresh_queue)
+        elif args.covers:
+            covers(args, engine)
+        elif args.relations:
+            relations(args, engine)
+        elif args.replay:
+            replay(args, scheduler, refresh_queue)
+        elif args.refresh:
+            refresh(args, scheduler, refresh_queue)
+        else:
+            crawl(args, scheduler, refresh_queue)
+    if args.metrics:
+        engine.metrics.export(args.metrics)
+    dead_letters.report()
+    dead_letters.close()
+    refresh_queue.close()
+
+
+def compact(args):
+    """
+    将爬取日志合并为最终的信息表
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+    """
+    for type in args.types:
+        crawler.SubjectCrawler(type, args.path).compact()
+
+
+def get_subject_codes(args, type, engine):
+    """
+    从排行榜页面获取条目代码，已保存过的直接读取本地文件
 
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        type (str): 条目类型
+        engine (FetchEngine): 共享的请求引擎
+
+    Returns:
+        list[str]: 按排名排序的条目代码
+    """
     subject_codes_path = os.path.join(
-        args.path, f"{args.type}_subject_codes_{args.start}_{args.end}.csv"
+        args.path, f"{type}_subject_codes_{args.start}_{args.end}.csv"
     )
     if not os.path.exists(subject_codes_path):
-        rank_crawler = crawler.RankCrawler(args.type, args.path, args.start, args.end)
-        subject_codes = list(rank_crawler.get_subject_codes())
-    else:
-        with open(subject_codes_path, "r") as f:
-            # skip header
-            csv_reader = csv.reader(f)
-            next(csv_reader)
-            subject_codes = [row[0] for row in csv_reader]
-    # get music subject info
-    headers = {
+        rank_crawler = crawler.RankCrawler(
+            type, args.path, args.start, args.end, engine=engine
+        )
+        return list(rank_crawler.get_subject_codes())
+    with open(subject_codes_path, "r") as f:
+        # skip header
+        csv_reader = csv.reader(f)
+        next(csv_reader)
+        return [row[0] for row in csv_reader]
+
+
+def get_headers(args):
+    """
+    获取请求头
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+
+    Returns:
+        dict: 请求头
+    """
+    return {
         "User-Agent": args.user_agent,
         "Authorization": f"Bearer {args.access_token}",
     }
 
-    if args.type == "music":
-        music_crawler = crawler.MusicCrawler(args.path, headers)
-        music_crawler.get_music_info(subject_codes)
-    elif args.type == "anime":
-        anime_crawler = crawler.AnimeCrawler(args.path, headers)
-        anime_crawler.get_anime_info(subject_codes)
+
+def get_subject_crawler(args, type, engine, refresh_queue, **kwargs):
+    """
+    创建使用条件请求和刷新队列的条目爬虫
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        type (str): 条目类型
+        engine (FetchEngine): 共享的请求引擎
+        refresh_queue (RefreshQueue): 刷新队列
+        **kwargs: SubjectCrawler的其他参数
+
+    Returns:
+        SubjectCrawler: 条目爬虫
+    """
+    validators = crawler.ValidatorStore(
+        os.path.join(args.path, f"{type}_validators.sqlite3")
+    )
+    return crawler.SubjectCrawler(
+        type,
+        args.path,
+        get_headers(args),
+        engine=engine,
+        validators=validators,
+        refresh_queue=refresh_queue,
+        **kwargs,
+    )
+
+
+def finish(subject_crawlers, compact=True):
+    """
+    输出条件请求的统计信息，并将爬取日志合并为信息表
+
+    Args:
+        subject_crawlers (iterable): 已完成爬取的条目爬虫，可以重复
+        compact (bool, optional): 是否合并爬取日志. Defaults to True.
+    """
+    # several jobs may share one crawler
+    for subject_crawler in dict.fromkeys(subject_crawlers):
+        subject_crawler.validators.report(subject_crawler.label)
+        subject_crawler.validators.close()
+        if compact:
+            subject_crawler.compact()
+
+
+def crawl(args, scheduler, refresh_queue):
+    """
+    使用共享的请求引擎和同一个调度器爬取所有类型的条目信息
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        scheduler (CrawlScheduler): 使用共享请求引擎的调度器
+        refresh_queue (RefreshQueue): 记录抓取历史的刷新队列
+    """
+    engine = scheduler.engine
+    headers = get_headers(args)
+
+    jobs = []
+    for type in args.types:
+        subject_crawler = get_subject_crawler(args, type, engine, refresh_queue)
+        validators = subject_crawler.validators
+        processed_ids = set()
+        if args.resume:
+            processed_ids = subject_crawler.journal.processed_ids()
+            print(f"已跳过{len(processed_ids)}个已处理的{subject_crawler.label}条目")
+        else:
+            subject_crawler.journal.reset()
+
+        if args.mode == "listing":
+            listing_crawler = crawler.ListingCrawler(
+                type,
+                headers,
+                engine=engine,
+                validators=validators,
+                skip_ids=processed_ids,
+            )
+            offsets = listing_crawler.get_offsets(args.start, args.end)
+            job = crawler.CrawlJob(
+                subject_crawler, listing_crawler.fetch_page, offsets
+            )
+            jobs.append(job)
+        else:
+            subject_codes = get_subject_codes(args, type, engine)
+            subject_codes = [
+                code for code in subject_codes if code not in processed_ids
+            ]
+            job = crawler.CrawlJob(
+                subject_crawler, subject_crawler.fetch_code, subject_codes
+            )
+            jobs.append(job)
+
+    # one pipeline for every type so they share the pool, the rate budget and the writer
+    scheduler.run(jobs)
+    finish(job.crawler for job in jobs)
+
+
+def refresh(args, scheduler, refresh_queue):
+    """
+    在请求预算内重新爬取刷新价值最高的条目，刷新结果追加到爬取日志中并覆盖旧记录
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        scheduler (CrawlScheduler): 使用共享请求引擎的调度器
+        refresh_queue (RefreshQueue): 刷新队列
+    """
+    engine = scheduler.engine
+    subject_crawlers = {}
+    for type in args.types:
+        subject_crawler = get_subject_crawler(args, type, engine, refresh_queue)
+        if not refresh_queue.count(type):
+            # first refresh: treat everything already in the journal as just fetched
+            refresh_queue.seed(type, subject_crawler.journal.records())
+        subject_codes_path = os.path.join(
+            args.path, f"{type}_subject_codes_{args.start}_{args.end}.csv"
+        )
+        if os.path.exists(subject_codes_path):
+            refresh_queue.add(type, get_subject_codes(args, type, engine))
+        subject_crawlers[type] = subject_crawler
+
+    selected = refresh_queue.select(args.budget, args.types)
+    jobs = []
+    for type, subject_crawler in subject_crawlers.items():
+        print(f"本次刷新{len(selected[type])}个{subject_crawler.label}条目")
+        jobs.append(
+            crawler.CrawlJob(subject_crawler, subject_crawler.fetch_code, selected[type])
+        )
+
+    scheduler.run(jobs)
+    finish(job.crawler for job in jobs)
+
+
+def replay(args, scheduler, refresh_queue):
+    """
+    重新请求死信存储中的失败请求，成功的请求会从死信存储中删除，结果追加到爬取日志中
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        scheduler (CrawlScheduler): 使用共享请求引擎的调度器
+        refresh_queue (RefreshQueue): 刷新队列
+    """
+    engine = scheduler.engine
+    jobs = []
+    for type in args.types:
+        letters = scheduler.dead_letters.letters(type)
+        if not letters:
+            continue
+        subject_crawler = get_subject_crawler(args, type, engine, refresh_queue)
+        listing_crawler = crawler.ListingCrawler(
+            type,
+            get_headers(args),
+            engine=engine,
+            validators=subject_crawler.validators,
+        )
+        print(f"重新请求{len(letters)}个{subject_crawler.label}失败请求")
+        # fetch_code takes subject codes and fetch_page takes listing offsets
+        subject_codes = [
+            letter.item for letter in letters if letter.kind == "fetch_code"
+        ]
+        offsets = [
+            int(letter.item) for letter in letters if letter.kind == "fetch_page"
+        ]
+        jobs.append(
+            crawler.CrawlJob(subject_crawler, subject_crawler.fetch_code, subject_codes)
+        )
+        jobs.append(
+            crawler.CrawlJob(subject_crawler, listing_crawler.fetch_page, offsets)
+        )
+
+    scheduler.run(jobs)
+    finish(job.crawler for job in jobs)
+
+
+def covers(args, engine):
+    """
+    下载爬取日志中所有条目的封面，按内容去重后保存到数据路径下的covers目录
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        engine (FetchEngine): 共享的请求引擎
+    """
+    store = crawler.CoverStore(os.path.join(args.path, "covers"))
+    cover_crawler = crawler.CoverCrawler(
+        store,
+        {"User-Agent": args.user_agent},
+        engine=engine,
+        sizes=args.cover_sizes,
+        processes=args.decode_processes,
+    )
+    for type in args.types:
+        journal = crawler.CrawlJournal(os.path.join(args.path, f"{type}_journal"))
+        print(f"正在获取{crawler.SUBJECT_TYPES[type].label}条目的封面")
+        cover_crawler.get_covers(journal.records())
+    store.report()
+    store.close()
+
+
+def relations(args, engine):
+    """
+    以爬取日志中的条目为起点爬取关联关系，结束后导出为数据路径下的relations.parquet，
+    待访问队列保存在relations.sqlite3中，中断后再次运行会继续爬取
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        engine (FetchEngine): 共享的请求引擎
+    """
+    store = crawler.RelationStore(os.path.join(args.path, "relations.sqlite3"))
+    relation_crawler = crawler.RelationCrawler(
+        store,
+        get_headers(args),
+        engine=engine,
+        types=args.relation_types,
+        max_depth=args.depth,
+    )
+    for type in args.types:
+        journal = crawler.CrawlJournal(os.path.join(args.path, f"{type}_journal"))
+        relation_crawler.seed(journal.processed_ids())
+    relation_crawler.crawl()
+    relation_crawler.export(args.path)
+    store.close()
+
+
+def enqueue(args, engine):
+    """
+    协调进程：从排行榜获取条目代码并写入共享工作队列，已在队列中的条目不会重复加入
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        engine (FetchEngine): 共享的请求引擎
+    """
+    work_queue = crawler.WorkQueue(os.path.join(args.path, "work_queue.sqlite3"))
+    for type in args.types:
+        added = work_queue.enqueue(type, get_subject_codes(args, type, engine))
+        print(f"已将{added}个{crawler.SUBJECT_TYPES[type].label}条目加入工作队列")
+    for type, states in work_queue.progress().items():
+        print(f"{crawler.SUBJECT_TYPES[type].label}: {dict(states)}")
+    work_queue.close()
+
+
+def work(args, scheduler, refresh_queue):
+    """
+    工作进程：反复从共享工作队列租用一批条目爬取，结果写入本进程的日志分段，直到队列中没有未完成的条目。
+    所有工作进程结束后使用--compact合并各进程的日志分段。
+
+    Args:
+        args (Namespace): 包含命令行参数的命名空间
+        scheduler (CrawlScheduler): 使用共享请求引擎的调度器
+        refresh_queue (RefreshQueue): 刷新队列
+    """
+    worker = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    work_queue = crawler.WorkQueue(
+        os.path.join(args.path, "work_queue.sqlite3"),
+        worker=worker,
+        lease_seconds=args.lease,
+    )
+    subject_crawlers = {}
+    for type in args.types:
+        journal = crawler.CrawlJournal(
+            os.path.join(args.path, f"{type}_journal"), worker=worker
+        )
+        subject_crawlers[type] = get_subject_crawler(
+            args,
+            type,
+            scheduler.engine,
+            refresh_queue,
+            journal=journal,
+            work_queue=work_queue,
+        )
+
+    work_queue.start_heartbeat()
+    try:
+        while True:
+            leased = work_queue.lease(args.types, args.batch)
+            if not leased:
+                # our own leases are kept alive by the heartbeat, they would wait forever
+                if not work_queue.leased_by_others():
+                    break
+                # other workers still hold leases, wait in case one of them dies
+                time.sleep(min(30, args.lease / 3))
+                continue
+            subject_codes = collections.defaultdict(list)
+            for type, subject_code in leased:
+                subject_codes[type].append(subject_code)
+            jobs = [
+                crawler.CrawlJob(
+                    subject_crawler, subject_crawler.fetch_code, subject_codes[type]
+                )
+                for type, subject_crawler in subject_crawlers.items()
+            ]
+            print(f"工作进程{worker}租用了{len(leased)}个条目")
+            scheduler.run(jobs)
+    finally:
+        # hand back whatever an interrupted batch did not finish
+        work_queue.release()
+        work_queue.close()
+    finish(subject_crawlers.values(), compact=False)
 
 
 if __name__ == "__main__":
@@ -1,3 +1,19 @@
+from .cover_crawler import CoverCrawler
+from .cover_store import CoverStore
+from .dead_letters import DeadLetterStore
+from .fetch_engine import FetchEngine, FetchError
+from .journal import CrawlJournal
+from .listing_crawler import ListingCrawler
+from .metrics import CrawlMetrics
+from .pipeline import Pipeline
+from .rate_limiter import RateLimiter
+from .refresh_queue import RefreshQueue
+from .relation_store import IdBitmap, RelationStore
+from .scheduler import CrawlJob, CrawlScheduler
+from .subject_crawler import SUBJECT_TYPES, SubjectCrawler
+from .validator_store import ValidatorStore
+from .work_queue import WorkQueue
 from .music_crawler import MusicCrawler
 from .rank_crawler import RankCrawler
-from .anime_crawler import AnimeCrawler
\ No newline at end of file
+from .anime_crawler import AnimeCrawler
+from .relation_crawler import RelationCrawler
@@ -1,34 +1,37 @@
-import json
-import os
+from .subject_crawler import SubjectCrawler
 
-import pandas as pd
 
-from .base_crawler import BaseCrawler
-
-
-class AnimeCrawler(BaseCrawler):
-    def __init__(self, data_path, headers=None):
+class AnimeCrawler(SubjectCrawler):
+    def __init__(
+        self, data_path, headers=None, engine=None, validators=None, journal=None
+    ):
         """
         初始化AnimeCrawler对象
 
         Args:
             data_path (str): 数据保存路径
             headers (dict, optional): 请求头. Defaults to None.
+            engine (FetchEngine, optional): 共享的请求引擎. Defaults to None.
+            validators (ValidatorStore, optional): 条件请求的验证信息存储. Defaults to None.
+            journal (CrawlJournal, optional): 爬取日志，为None时使用数据路径下的anime_journal. Defaults to None.
         """
-        self.data_path = data_path
-        self.api = "https://api.bgm.tv/v0/subjects/{}"
-        super().__init__(headers=headers)
+        super().__init__(
+            "anime",
+            data_path,
+            headers=headers,
+            engine=engine,
+            validators=validators,
+            journal=journal,
+        )
 
     def save_anime_info(self, anime_infos):
         """
-        将动画信息保存到CSV文件中
+        将动画信息按固定的列式结构保存到Parquet文件中
 
         Args:
-            anime_infos (list): 包含动画信息的列表
+            anime_infos (iterable): 包含动画信息的可迭代对象
         """
-        file_name = os.path.join(self.data_path, "anime_infos.csv")
-        anime_infos_df = pd.DataFrame(anime_infos)
-        anime_infos_df.to_csv(file_name, index=False)
+        self.save_info(anime_infos)
 
     def get_anime_info(self, subject_codes):
         """
@@ -38,23 +41,22 @@ class AnimeCrawler(BaseCrawler):
             subject_codes (list): 包含动画条目代码的列表
 
         Returns:
-            list[dict]: 包含多个动画信息字典的列表，动画信息如：
-            id, type, name, name_cn, summary, nsfw, locked, platform, images[large,common,medium,small,grid](cover),
-            infobox, volumes, eps, total_episodes, rating(rank, total, count, score),
-            collection(on_hold, dropped, wish, collect, doing), tags(name:count).
+            int: 本次写入日志的动画信息数量
+        """
+        return self.get_info(subject_codes)
+
+    def get_anime_info_from_listing(self, listing_crawler, offsets):
         """
-        anime_infos = []
-        truncate = 50
-        for i in range(0, len(subject_codes), truncate):
-            api = [
-                self.api.format(subject_code)
-                for subject_code in subject_codes[i : i + truncate]
-            ]
-            json_datas = super().fetch_data(api)
-            self.process_anime_info(anime_infos, json_datas)
-            print(f"已获取{len(anime_infos)}条动画信息")
-            self.save_anime_info(anime_infos)
-        return anime_infos
+        通过分页浏览接口批量获取动画信息
+
+        Args:
+            listing_crawler (ListingCrawler): 分页浏览爬虫
+            offsets (iterable): 每页请求的偏移量
+
+        Returns:
+            int: 本次写入日志的动画信息数量
+        """
+        return self.get_info_from_listing(listing_crawler, offsets)
 
     def process_anime_info(self, anime_infos, json_datas):
         """
@@ -64,40 +66,19 @@ class AnimeCrawler(BaseCrawler):
             anime_infos (list): 包含动画信息的列表
             json_datas (list): 包含动画信息的JSON数据
         """
-        for json_data in json_datas:
-            anime_info = json.loads(json_data)
-
-            # pop unwanted keys
-            # for unwanted_key in ['nsfw', 'locked', ]:
-            #     anime_info.pop(unwanted_key)
-            # unpack images dict
-            images = {
-                f"{size}_cover": url for size, url in anime_info["images"].items()
-            }
-            anime_info.pop("images")
-            anime_info.update(images)
-            # unpack infobox dict
-            anime_info["tags"] = {
-                tag["name"]: tag["count"] for tag in anime_info["tags"]
-            }
-
-            infobox = {item["key"]: item["value"] for item in anime_info["infobox"]}
-            anime_info.pop("infobox")
-            anime_info.update(infobox)
-            # unpack rating dict
-            rank = anime_info["rating"]["rank"]
-            votes = anime_info["rating"]["total"]
-            ratings = anime_info["rating"]["count"]
-            rating_score = (
-                sum([int(rating) * count for rating, count in ratings.items()]) / votes
-            )
-            anime_info.pop("rating")
-            anime_info["rank"] = rank
-            anime_info["votes"] = votes
-            anime_info["ratings"] = ratings
-            anime_info["rating_score"] = rating_score
-
-            anime_infos.append(anime_info)
+        self.process_info(anime_infos, json_datas)
+
+    def parse_anime_info(self, json_data):
+        """
+        解析单条动画信息
+
+        Args:
+            json_data (str | dict): 动画信息的JSON数据
+
+        Returns:
+            dict: 展开后的动画信息
+        """
+        return self.parse_info(json_data)
 
 
 if __name__ == "__main__":
@@ -105,4 +86,5 @@ if __name__ == "__main__":
         "User-Agent": "murlors/bangumi-analysis-coursework (https://github.com/murlors/Bangumi-Analysis-Coursework)"
     }
     anime_crawler = AnimeCrawler("data", headers)
-    anime_info = anime_crawler.get_anime_info(["68812", "13677"])
+    anime_crawler.get_anime_info(["68812", "13677"])
+    anime_crawler.compact()
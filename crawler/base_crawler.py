@@ -1,22 +1,44 @@
-import concurrent.futures
-import random
-import time
-
-import requests
+from .fetch_engine import get_default_engine
 
 
 class BaseCrawler:
-    def __init__(self, headers=None):
+    def __init__(self, headers=None, engine=None, validators=None):
         """
         初始化BaseCrawler对象
 
         Args:
             headers (dict, optional): 请求头. Defaults to None.
+            engine (FetchEngine, optional): 共享的请求引擎，为None时使用进程内默认引擎. Defaults to None.
+            validators (ValidatorStore, optional): 条件请求的验证信息存储. Defaults to None.
         """
         self.headers = headers or {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
             "Chrome/113.0.0.0 Safari/537.36 Edg/113.0.1774.57"
         }
+        self._engine = engine
+        self.validators = validators
+
+    @property
+    def engine(self):
+        """
+        获取请求引擎，未指定时在首次请求时才创建进程内默认引擎
+
+        Returns:
+            FetchEngine: 请求引擎
+        """
+        if self._engine is None:
+            self._engine = get_default_engine()
+        return self._engine
+
+    @property
+    def metrics(self):
+        """
+        获取请求引擎汇总的请求指标
+
+        Returns:
+            CrawlMetrics: 请求指标
+        """
+        return self.engine.metrics
 
     def fetch_data(self, urls):
         """
@@ -26,59 +48,53 @@ class BaseCrawler:
             urls (list): 包含URL的列表
 
         Returns:
-            list: 包含数据的列表
+            list: 包含数据的列表，顺序与urls一致
+        """
+        return self.engine.fetch_data(urls, headers=self.headers)
+
+    def fetch_conditional(self, urls, subject_codes):
         """
-        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-            futures = [
-                executor.submit(
-                    requests_handler, "GET", url, headers=self.headers, timeout=8
-                )
-                for url in urls
-            ]
-            results = [
-                future.result() for future in concurrent.futures.as_completed(futures)
-            ]
+        使用保存的ETag/Last-Modified发送条件请求获取数据，未配置validators时等同于fetch_data
+
+        Args:
+            urls (list): 包含URL的列表
+            subject_codes (list): 与urls一一对应的条目代码
+
+        Returns:
+            list: 包含数据的列表，顺序与urls一致，未变化的条目返回本地保存的数据
+        """
+        if self.validators is None:
+            return self.fetch_data(urls)
+        headers_list = [
+            {**self.headers, **self.validators.conditional_headers(subject_code)}
+            for subject_code in subject_codes
+        ]
+        responses = self.engine.fetch_responses(urls, headers_list)
+        results = [
+            self.validators.resolve(subject_code, response) if response else None
+            for subject_code, response in zip(subject_codes, responses)
+        ]
+        self.validators.commit()
         return results
 
+    async def fetch_subject(self, url, subject_code):
+        """
+        在引擎事件循环中获取单个条目的数据，配置了validators时发送条件请求，
+        只请求一次，失败后由流水线的重试队列延迟重试
+
+        Args:
+            url (str): 条目的请求URL
+            subject_code (str): 条目代码
 
-def requests_handler(method, url, **kwargs):
-    """
-    请求处理函数
-    
-    Args:
-        method (str): 请求方法
-        url (str): 请求URL
-        **kwargs: 其他参数
-        
-    Returns:
-        str: 包含请求结果的字符串
-    """
-    for i in range(3):
-        try:
-            response = requests.request(method, url, **kwargs)
-            response.raise_for_status()
-            print(f"请求{url}成功")
+        Returns:
+            str: 条目数据，未变化的条目返回本地保存的数据
+
+        Raises:
+            FetchError: 请求失败
+        """
+        if self.validators is None:
+            response = await self.engine.attempt(url, self.headers)
             return response.text
-        except requests.exceptions.RequestException as e:
-            if (
-                isinstance(e, requests.exceptions.HTTPError)
-                and e.response.status_code == 404
-            ):
-                raise e
-            print(f"请求{url}失败，正在重试第{i + 1}次: {e}")
-            time.sleep(2 + random.uniform(0, 2))
-    else:
-        print(f"请求{url}失败，已重试3次，放弃请求")
-        save_failed_urls(url)
-        return None
-
-
-def save_failed_urls(url):
-    """
-    将请求失败的URL保存到文件中
-    
-    Args:
-        url (str): 请求失败的URL
-    """
-    with open("failed_urls.txt", "a", encoding="utf-8") as f:
-        f.write(url + "\n")
+        headers = {**self.headers, **self.validators.conditional_headers(subject_code)}
+        response = await self.engine.attempt(url, headers)
+        return self.validators.resolve(subject_code, response)
@@ -0,0 +1,244 @@
+import concurrent.futures
+import hashlib
+import io
+import logging
+import os
+import threading
+import urllib.parse
+
+from PIL import Image, ImageStat
+
+from .base_crawler import BaseCrawler
+from .pipeline import Pipeline
+from .storage import COVER_SIZES
+
+logger = logging.getLogger(__name__)
+
+# colour features are computed on a copy this small, which is plenty for averages
+FEATURE_SIZE = (64, 64)
+# colours the image is quantized to when looking for the dominant one
+PALETTE_SIZE = 8
+
+
+def cover_features(image, size):
+    """
+    计算图片的平均颜色、亮度、饱和度和主色调
+
+    Args:
+        image (Image.Image): RGB图片，可以是缩小解码后的图片
+        size (tuple): 原图的宽高
+
+    Returns:
+        dict: CoverStore.FEATURE_COLUMNS中的颜色特征
+    """
+    width, height = size
+    small = image.resize(FEATURE_SIZE, Image.Resampling.BILINEAR)
+    mean_r, mean_g, mean_b = ImageStat.Stat(small).mean
+    saturation = ImageStat.Stat(small.convert("HSV")).mean[1] / 255
+    palette = small.quantize(PALETTE_SIZE)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3 : index * 3 + 3]
+    return {
+        "width": width,
+        "height": height,
+        "mean_r": mean_r,
+        "mean_g": mean_g,
+        "mean_b": mean_b,
+        # perceived brightness, ITU-R BT.601
+        "brightness": (0.299 * mean_r + 0.587 * mean_g + 0.114 * mean_b) / 255,
+        "saturation": saturation,
+        "dominant": f"#{red:02x}{green:02x}{blue:02x}",
+    }
+
+
+def derive_cover(data, thumbnail_size=(150, 150)):
+    """
+    生成缩略图并计算颜色特征，可以在进程池中运行
+
+    Args:
+        data (tuple): 获取阶段返回的(封面, 摘要, 原图)，内容已保存或正在处理时原图为None
+        thumbnail_size (tuple, optional): 缩略图的最大宽高. Defaults to (150, 150).
+
+    Returns:
+        tuple: (封面, 摘要, 原图, 缩略图, 颜色特征)，原图为None时后三项均为None
+    """
+    cover, digest, body = data
+    if body is None:
+        return cover, digest, None, None, None
+    with Image.open(io.BytesIO(body)) as image:
+        size = image.size
+        # JPEGs can be decoded straight at a fraction of their size, far cheaper than a full decode
+        image.draft("RGB", thumbnail_size)
+        image = image.convert("RGB")
+    features = cover_features(image, size)
+    image.thumbnail(thumbnail_size)
+    thumbnail = io.BytesIO()
+    image.save(thumbnail, "JPEG", quality=85)
+    return cover, digest, body, thumbnail.getvalue(), features
+
+
+class CoverCrawler(BaseCrawler):
+    def __init__(self, store, headers=None, engine=None, sizes=("large",), processes=0):
+        """
+        初始化CoverCrawler对象
+
+        并发下载条目封面，按内容的SHA-256去重后保存到CoverStore，已保存的URL不再请求，
+        内容已保存的图片不再生成缩略图；缩略图和颜色特征在进程池中计算，不阻塞下载。
+
+        Args:
+            store (CoverStore): 内容寻址的封面存储
+            headers (dict, optional): 请求头. Defaults to None.
+            engine (FetchEngine, optional): 共享的请求引擎. Defaults to None.
+            sizes (tuple, optional): 下载的封面尺寸，见storage.COVER_SIZES. Defaults to ("large",).
+            processes (int, optional): 生成缩略图的进程数，为0时在线程池中生成. Defaults to 0.
+        """
+        assert all(size in COVER_SIZES for size in sizes)
+        self.store = store
+        self.sizes = sizes
+        self.processes = processes
+        # digests being derived right now -> duplicate covers waiting for the image row,
+        # so duplicates within one run are derived once and linked only once it is saved
+        self.pending = {}
+        # cover -> digest for covers whose image is being derived
+        self.deriving = {}
+        # fetch_cover and fail_cover run on the event loop, save_cover on the persist thread
+        self.lock = threading.Lock()
+        super().__init__(headers=headers, engine=engine)
+
+    def get_cover_urls(self, subject_infos):
+        """
+        从条目信息中获取尚未保存的封面URL
+
+        Args:
+            subject_infos (iterable): 包含{size}_cover字段的条目信息
+
+        Returns:
+            list[tuple[int, str, str]]: (条目代码, 封面尺寸, 封面URL)
+        """
+        covers = []
+        for subject_info in subject_infos:
+            for size in self.sizes:
+                url = subject_info.get(f"{size}_cover")
+                if not url:
+                    continue
+                if url in self.store.urls:
+                    self.store.stats["skipped"] += 1
+                    continue
+                covers.append((subject_info["id"], size, url))
+        return covers
+
+    def get_covers(self, subject_infos):
+        """
+        下载条目封面，下载、生成缩略图和写入存储以流水线方式并发进行
+
+        Args:
+            subject_infos (iterable): 包含{size}_cover字段的条目信息
+
+        Returns:
+            int: 本次记录的封面数量
+        """
+        covers = list(dict.fromkeys(self.get_cover_urls(subject_infos)))
+        executor = None
+        if self.processes > 0:
+            executor = concurrent.futures.ProcessPoolExecutor(self.processes)
+        pipeline = Pipeline(
+            self.engine,
+            fetch=self.fetch_cover,
+            decode=derive_cover,
+            persist=self.save_cover,
+            decode_workers=max(2, self.processes),
+            executor=executor,
+            on_failure=self.fail_cover,
+        )
+        linked = self.store.stats["linked"]
+        try:
+            pipeline.run(covers)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            self.store.commit()
+        count = self.store.stats["linked"] - linked
+        print(f"共获取{count}张封面")
+        return count
+
+    async def fetch_cover(self, cover):
+        """
+        下载单个封面并计算内容摘要
+
+        Args:
+            cover (tuple): (条目代码, 封面尺寸, 封面URL)
+
+        Returns:
+            tuple: (封面, 摘要, 原图)，内容已保存或正在处理时原图为None
+
+        Raises:
+            FetchError: 请求失败
+        """
+        response = await self.engine.attempt(cover[2], self.headers, binary=True)
+        self.store.stats["downloaded"] += 1
+        digest = hashlib.sha256(response.text).hexdigest()
+        with self.lock:
+            if digest in self.store.digests or digest in self.pending:
+                self.store.stats["duplicates"] += 1
+                return cover, digest, None
+            self.pending[digest] = []
+            self.deriving[cover] = digest
+        return cover, digest, response.text
+
+    def save_cover(self, data):
+        """
+        保存新图片，并记录封面URL对应的图片
+
+        内容重复的封面只在图片已保存后记录；图片还在处理时等待图片保存后一起记录，
+        图片处理失败时不记录，下次运行时重新下载。
+
+        Args:
+            data (tuple): derive_cover返回的(封面, 摘要, 原图, 缩略图, 颜色特征)
+        """
+        cover, digest, body, thumbnail, features = data
+        if body is not None:
+            url = cover[2]
+            extension = os.path.splitext(urllib.parse.urlparse(url).path)[1] or ".jpg"
+            self.store.put_image(digest, extension.lower(), body, thumbnail, features)
+            with self.lock:
+                del self.deriving[cover]
+                covers = [cover, *self.pending.pop(digest)]
+        else:
+            with self.lock:
+                if digest in self.store.digests:
+                    covers = [cover]
+                else:
+                    covers = []
+                    if digest in self.pending:
+                        self.pending[digest].append(cover)
+        for linked in covers:
+            self.link_cover(linked, digest)
+
+    def link_cover(self, cover, digest):
+        """
+        记录封面URL对应的图片，图片必须已经保存
+
+        Args:
+            cover (tuple): (条目代码, 封面尺寸, 封面URL)
+            digest (str): 图片内容的SHA-256
+        """
+        subject_id, size, url = cover
+        self.store.link(url, subject_id, size, digest)
+
+    def fail_cover(self, cover, error, attempts):
+        """
+        封面下载或处理最终失败时调用，放弃正在处理的图片，等待它的重复封面也不再记录
+
+        Args:
+            cover (tuple): (条目代码, 封面尺寸, 封面URL)
+            error (Exception): 最后一次失败的异常
+            attempts (int): 已尝试的次数
+        """
+        self.store.stats["failed"] += 1
+        logger.warning("获取封面%s失败，已尝试%d次: %s", cover[2], attempts, error)
+        with self.lock:
+            digest = self.deriving.pop(cover, None)
+            duplicates = [] if digest is None else self.pending.pop(digest)
+        # the same bytes are downloaded and derived again on the next run
+        for duplicate in duplicates:
+            logger.warning("封面%s与处理失败的图片内容相同，已跳过", duplicate[2])
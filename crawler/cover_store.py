@@ -0,0 +1,190 @@
+import collections
+import os
+import sqlite3
+import time
+
+# columns of the colour features derived from each stored image
+FEATURE_COLUMNS = [
+    "width",
+    "height",
+    "mean_r",
+    "mean_g",
+    "mean_b",
+    "brightness",
+    "saturation",
+    "dominant",
+]
+
+
+class CoverStore:
+    def __init__(self, dir_path):
+        """
+        初始化CoverStore对象
+
+        按内容寻址保存封面图片：原图和缩略图以内容的SHA-256命名，保存在objects和thumbnails目录下，
+        内容相同的图片(如不同条目共用的默认封面)只保存一份。covers.sqlite3记录每个封面URL对应的图片，
+        以及每张图片的尺寸和颜色特征，已保存的URL不会重复下载。
+
+        Args:
+            dir_path (str): 封面保存目录
+        """
+        self.dir_path = dir_path
+        os.makedirs(dir_path, exist_ok=True)
+        # persisted from the pipeline's writer thread
+        self.conn = sqlite3.connect(
+            os.path.join(dir_path, "covers.sqlite3"),
+            timeout=60,
+            check_same_thread=False,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS covers (
+                url TEXT PRIMARY KEY,
+                subject_id INTEGER,
+                size TEXT,
+                digest TEXT,
+                fetched_at REAL
+            )
+            """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                digest TEXT PRIMARY KEY,
+                extension TEXT,
+                bytes INTEGER,
+                width INTEGER,
+                height INTEGER,
+                mean_r REAL,
+                mean_g REAL,
+                mean_b REAL,
+                brightness REAL,
+                saturation REAL,
+                dominant TEXT
+            )
+            """)
+        # looked up for every url and download, so kept in memory
+        self.urls = {url for (url,) in self.conn.execute("SELECT url FROM covers")}
+        self.digests = {
+            digest for (digest,) in self.conn.execute("SELECT digest FROM images")
+        }
+        self.stats = collections.Counter()
+        self._pending = 0
+
+    def close(self):
+        """
+        关闭数据库连接
+        """
+        self.conn.commit()
+        self.conn.close()
+
+    def commit(self):
+        """
+        提交尚未写入的记录
+        """
+        self.conn.commit()
+        self._pending = 0
+
+    def object_path(self, digest, extension):
+        """
+        获取原图的保存路径，按摘要的前两位分目录，避免单个目录下文件过多
+
+        Args:
+            digest (str): 图片内容的SHA-256
+            extension (str): 文件扩展名，如.jpg
+
+        Returns:
+            str: 原图路径
+        """
+        return os.path.join(self.dir_path, "objects", digest[:2], digest + extension)
+
+    def thumbnail_path(self, digest):
+        """
+        获取缩略图的保存路径
+
+        Args:
+            digest (str): 原图内容的SHA-256
+
+        Returns:
+            str: JPEG缩略图路径
+        """
+        return os.path.join(self.dir_path, "thumbnails", digest[:2], digest + ".jpg")
+
+    def put_image(self, digest, extension, body, thumbnail, features):
+        """
+        保存一张新图片的原图、缩略图和颜色特征，已保存的图片不做修改
+
+        Args:
+            digest (str): 图片内容的SHA-256
+            extension (str): 文件扩展名
+            body (bytes): 原图
+            thumbnail (bytes): JPEG缩略图
+            features (dict): FEATURE_COLUMNS中的颜色特征
+        """
+        if digest in self.digests:
+            return
+        for path, data in [
+            (self.object_path(digest, extension), body),
+            (self.thumbnail_path(digest), thumbnail),
+        ]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write then rename so an interrupted run never leaves a truncated object
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        self.conn.execute(
+            "INSERT OR IGNORE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (digest, extension, len(body), *(features[key] for key in FEATURE_COLUMNS)),
+        )
+        self.digests.add(digest)
+        self.stats["stored"] += 1
+        self._written()
+
+    def link(self, url, subject_id, size, digest):
+        """
+        记录封面URL对应的图片
+
+        Args:
+            url (str): 封面URL
+            subject_id (int): 条目代码
+            size (str): 封面尺寸，如large
+            digest (str): 图片内容的SHA-256
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO covers VALUES (?, ?, ?, ?, ?)",
+            (url, subject_id, size, digest, time.time()),
+        )
+        self.urls.add(url)
+        self.stats["linked"] += 1
+        self._written()
+
+    def _written(self):
+        """
+        每写入50条提交一次
+        """
+        self._pending += 1
+        if self._pending >= 50:
+            self.commit()
+
+    def features(self):
+        """
+        获取所有封面的条目代码、尺寸和对应图片的颜色特征
+
+        Returns:
+            list[dict]: 每个封面URL一条记录
+        """
+        columns = ["subject_id", "size", "url", "digest", "bytes", *FEATURE_COLUMNS]
+        rows = self.conn.execute(f"""
+            SELECT subject_id, size, url, images.digest, bytes, {", ".join(FEATURE_COLUMNS)}
+            FROM covers JOIN images ON covers.digest = images.digest
+            ORDER BY subject_id, size
+            """)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def report(self):
+        """
+        输出本次下载、去重、跳过和失败的封面数量
+        """
+        print(
+            f"封面: 下载{self.stats['downloaded']}张，新保存{self.stats['stored']}张，"
+            f"内容重复{self.stats['duplicates']}张，已保存跳过{self.stats['skipped']}张，"
+            f"失败{self.stats['failed']}张"
+        )
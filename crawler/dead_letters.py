@@ -0,0 +1,143 @@
+import collections
+import sqlite3
+import time
+
+DeadLetter = collections.namedtuple(
+    "DeadLetter",
+    ["type", "kind", "item", "url", "status", "error", "attempts", "failed_at"],
+)
+
+
+class DeadLetterStore:
+    def __init__(self, file_path):
+        """
+        初始化DeadLetterStore对象
+
+        保存重试后仍然失败的请求，记录所属的条目类型、获取函数、请求元素、URL、状态码、错误信息、
+        累计尝试次数和最后失败的时间，之后可以使用crawler.py --replay重新请求。
+
+        Args:
+            file_path (str): SQLite数据库文件路径
+        """
+        self.file_path = file_path
+        # failures are recorded from the pipeline's fetch workers on the engine thread
+        self.conn = sqlite3.connect(file_path, timeout=60, check_same_thread=False)
+        # WAL lets worker processes sharing the data path read while another one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                type TEXT,
+                kind TEXT,
+                item TEXT,
+                url TEXT,
+                status INTEGER,
+                error TEXT,
+                attempts INTEGER,
+                failed_at REAL,
+                PRIMARY KEY (type, kind, item)
+            )
+            """)
+        # keys of the stored letters, so successful fetches only hit the database when they clear one
+        self.keys = {
+            (type, kind, item)
+            for type, kind, item in self.conn.execute(
+                "SELECT type, kind, item FROM dead_letters"
+            )
+        }
+        self.stats = collections.Counter()
+
+    def close(self):
+        """
+        关闭数据库连接
+        """
+        self.conn.commit()
+        self.conn.close()
+
+    def commit(self):
+        """
+        提交尚未写入的记录
+        """
+        self.conn.commit()
+
+    def add(self, type, kind, item, error, attempts):
+        """
+        记录一次最终失败，同一请求再次失败时累加尝试次数
+
+        Args:
+            type (str): 条目类型
+            kind (str): 获取函数的名称，如fetch_code、fetch_page
+            item (object): 传给获取函数的元素
+            error (Exception): 最后一次失败的异常，FetchError会记录URL和状态码
+            attempts (int): 本次的尝试次数
+        """
+        key = (type, kind, str(item))
+        self.conn.execute(
+            """
+            INSERT INTO dead_letters VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (type, kind, item) DO UPDATE SET
+                url = excluded.url,
+                status = excluded.status,
+                error = excluded.error,
+                attempts = attempts + excluded.attempts,
+                failed_at = excluded.failed_at
+            """,
+            (
+                *key,
+                getattr(error, "url", None),
+                getattr(error, "status", None),
+                str(error) or error.__class__.__name__,
+                attempts,
+                time.time(),
+            ),
+        )
+        self.conn.commit()
+        self.keys.add(key)
+        self.stats["failed"] += 1
+
+    def discard(self, type, kind, item):
+        """
+        请求成功后删除对应的记录
+
+        Args:
+            type (str): 条目类型
+            kind (str): 获取函数的名称
+            item (object): 传给获取函数的元素
+        """
+        key = (type, kind, str(item))
+        if key not in self.keys:
+            return
+        self.conn.execute(
+            "DELETE FROM dead_letters WHERE type = ? AND kind = ? AND item = ?", key
+        )
+        self.conn.commit()
+        self.keys.discard(key)
+        self.stats["recovered"] += 1
+
+    def letters(self, type=None):
+        """
+        获取保存的失败请求
+
+        Args:
+            type (str, optional): 只返回该类型的记录，为None时返回全部. Defaults to None.
+
+        Returns:
+            list[DeadLetter]: 按失败时间排列的记录
+        """
+        query = "SELECT * FROM dead_letters"
+        params = ()
+        if type is not None:
+            query += " WHERE type = ?"
+            params = (type,)
+        return [
+            DeadLetter(*row)
+            for row in self.conn.execute(query + " ORDER BY failed_at", params)
+        ]
+
+    def report(self):
+        """
+        输出本次失败和恢复的请求数量，以及仍未恢复的数量
+        """
+        print(
+            f"失败请求: 本次失败{self.stats['failed']}个，恢复{self.stats['recovered']}个，"
+            f"剩余{len(self.keys)}个"
+        )
@@ -0,0 +1,136 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library
+    orjson = None
+
+# (key, weight) pairs of the rating histogram, used to compute rating_score
+RATING_WEIGHTS = [(str(score), score) for score in range(1, 11)]
+
+
+def loads(json_data):
+    """
+    解码JSON数据，安装了orjson时使用orjson
+
+    Args:
+        json_data (str | bytes): JSON数据
+
+    Returns:
+        object: 解码后的对象
+    """
+    if orjson is not None:
+        return orjson.loads(json_data)
+    return json.loads(json_data)
+
+
+def normalize_images(subject_info, images):
+    """
+    将各尺寸的封面展开为{size}_cover字段
+
+    Args:
+        subject_info (dict): 展开中的条目信息
+        images (dict): 封面尺寸到URL，可能为None
+    """
+    for size, url in (images or {}).items():
+        subject_info.setdefault(f"{size}_cover", url)
+
+
+def normalize_tags(subject_info, tags):
+    """
+    将tag列表转换为tag名称到选择量的字典
+
+    Args:
+        subject_info (dict): 展开中的条目信息
+        tags (list[dict]): 包含name和count的tag列表
+    """
+    subject_info.setdefault("tags", {tag["name"]: tag["count"] for tag in tags})
+
+
+def normalize_infobox(subject_info, infobox):
+    """
+    将infobox的字段展开到顶层
+
+    Args:
+        subject_info (dict): 展开中的条目信息
+        infobox (list[dict]): 包含key和value的infobox字段列表
+    """
+    # infobox entries win over every other field except the rating ones
+    for item in infobox:
+        subject_info[item["key"]] = item["value"]
+
+
+# fields of /v0/subjects/{id} that need flattening, every other field is copied as is
+FIELD_NORMALIZERS = {
+    "images": normalize_images,
+    "tags": normalize_tags,
+    "infobox": normalize_infobox,
+}
+
+
+def normalize_subject(subject):
+    """
+    按FIELD_NORMALIZERS一次遍历展开单个条目的images、tags、infobox和rating
+
+    结果与逐步pop/update的展开方式一致：infobox字段覆盖同名的顶层字段，
+    rank、votes、ratings和rating_score总是最后写入，没有人评分的条目rating_score为None。
+
+    Args:
+        subject (dict): /v0/subjects/{id}返回的条目
+
+    Returns:
+        dict: 展开后的条目信息
+    """
+    subject_info = {}
+    rating = None
+    for key, value in subject.items():
+        normalizer = FIELD_NORMALIZERS.get(key)
+        if normalizer is not None:
+            normalizer(subject_info, value)
+        elif key == "rating":
+            rating = value
+        else:
+            subject_info.setdefault(key, value)
+
+    votes = rating["total"]
+    ratings = rating["count"]
+    subject_info["rank"] = rating["rank"]
+    subject_info["votes"] = votes
+    subject_info["ratings"] = ratings
+    # subjects nobody has rated yet have no score
+    subject_info["rating_score"] = (
+        sum(weight * ratings.get(key, 0) for key, weight in RATING_WEIGHTS) / votes
+        if votes
+        else None
+    )
+    return subject_info
+
+
+def decode_subject(json_data):
+    """
+    解码并展开单个条目
+
+    Args:
+        json_data (str | bytes | dict): 条目的JSON数据，或分页浏览接口中已解码的条目
+
+    Returns:
+        dict: 展开后的条目信息
+    """
+    if isinstance(json_data, (str, bytes)):
+        json_data = loads(json_data)
+    return normalize_subject(json_data)
+
+
+def decode_subjects(data):
+    """
+    解码获取阶段返回的数据，可以在进程池中运行
+
+    Args:
+        data (str | bytes | list[dict]): 单个条目的JSON数据，或分页浏览接口返回的一页条目
+
+    Returns:
+        list[dict]: 展开后的条目信息
+    """
+    if isinstance(data, (str, bytes)):
+        return [decode_subject(data)]
+    return [normalize_subject(subject) for subject in data]
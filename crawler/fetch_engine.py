@@ -0,0 +1,321 @@
+import asyncio
+import atexit
+import collections
+import logging
+import random
+import threading
+import time
+
+import aiohttp
+
+from .metrics import CrawlMetrics
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+Response = collections.namedtuple("Response", ["url", "status", "text", "headers"])
+
+
+class FetchError(Exception):
+    def __init__(self, url, status, error):
+        """
+        初始化FetchError对象
+
+        Args:
+            url (str): 请求URL
+            status (int): 响应状态码，连接失败或超时时为None
+            error (Exception): 原始异常
+        """
+        super().__init__(str(error) or type(error).__name__)
+        self.url = url
+        self.status = status
+
+    @property
+    def retryable(self):
+        """
+        连接失败、超时、429和5xx可以重试，404等其余错误重试也不会成功
+
+        Returns:
+            bool: 是否可以重试
+        """
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+def backoff(attempt, base=1.0, cap=30.0):
+    """
+    计算第attempt次失败后的等待时间，指数退避并加入随机抖动，避免重试集中在同一时刻
+
+    Args:
+        attempt (int): 已失败的次数减一
+        base (float, optional): 首次重试的平均等待时间(秒). Defaults to 1.0.
+        cap (float, optional): 平均等待时间的上限(秒). Defaults to 30.0.
+
+    Returns:
+        float: 等待时间(秒)
+    """
+    return min(cap, base * 2**attempt) * random.uniform(0.5, 1.5)
+
+
+class FetchEngine:
+    def __init__(self, concurrency=8, timeout=8, retries=3, limiter=None):
+        """
+        初始化FetchEngine对象
+
+        引擎在后台线程中运行一个常驻的事件循环，并持有一个长连接复用的连接池，
+        整个爬取过程中所有爬虫共享同一个引擎，避免每个请求都重新进行TCP/TLS握手。
+
+        Args:
+            concurrency (int, optional): 初始全局并发请求数. Defaults to 8.
+            timeout (int, optional): 单个请求的超时时间(秒). Defaults to 8.
+            retries (int, optional): 请求失败时的重试次数. Defaults to 3.
+            limiter (RateLimiter, optional): 自适应限流器，为None时按concurrency创建. Defaults to None.
+        """
+        self.limiter = limiter or RateLimiter(concurrency=concurrency)
+        self.concurrency = self.limiter.max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.metrics = CrawlMetrics()
+        self.metrics.gauges["in_flight"] = lambda: self.limiter.in_flight
+        self.metrics.gauges["concurrency_limit"] = lambda: self.limiter.limit
+        # requests, retries, failures and bytes received over the engine's lifetime
+        self.stats = self.metrics.counters
+        self.latencies = collections.deque(maxlen=100000)
+        self._exporter = None
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """
+        启动事件循环线程并创建连接池
+
+        Returns:
+            FetchEngine: 引擎自身
+        """
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="fetch-engine", daemon=True
+                )
+                self._thread.start()
+                self.run(self._open())
+        return self
+
+    def close(self):
+        """
+        关闭连接池并停止事件循环线程
+        """
+        with self._lock:
+            if self._loop is None:
+                return
+            if self._exporter is not None:
+                self._exporter.cancel()
+                self._exporter = None
+            self.run(self._session.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+            self._session = None
+
+    async def _open(self):
+        """
+        在事件循环中创建连接池
+        """
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, keepalive_timeout=60, ttl_dns_cache=300
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[self.metrics.trace_config()],
+        )
+
+    def export_metrics(self, file_path, interval=10):
+        """
+        在引擎的事件循环中定期导出请求指标，引擎关闭时停止
+
+        Args:
+            file_path (str): 导出文件路径，.prom为Prometheus文本格式，其余为JSON快照
+            interval (float, optional): 导出间隔(秒). Defaults to 10.
+        """
+        self.start()
+        self._exporter = asyncio.run_coroutine_threadsafe(
+            self.metrics.export_every(file_path, interval), self._loop
+        )
+
+    def run(self, coro):
+        """
+        在引擎的事件循环中运行协程，并阻塞等待结果
+
+        Args:
+            coro (coroutine): 要运行的协程
+
+        Returns:
+            object: 协程的返回值
+        """
+        if self._loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def fetch(self, url, headers=None):
+        """
+        请求单个URL，失败时按指数退避重试
+
+        Args:
+            url (str): 请求URL
+            headers (dict, optional): 请求头. Defaults to None.
+
+        Returns:
+            str: 包含请求结果的字符串，重试后仍失败时返回None
+        """
+        response = await self.request(url, headers)
+        return response.text if response else None
+
+    async def request(self, url, headers=None):
+        """
+        请求单个URL并保留状态码和响应头，失败时按指数退避重试
+
+        Args:
+            url (str): 请求URL
+            headers (dict, optional): 请求头. Defaults to None.
+
+        Returns:
+            Response: 请求结果，状态码为304时text为None，重试后仍失败时返回None
+
+        Raises:
+            FetchError: 404等不可重试的错误
+        """
+        for i in range(self.retries):
+            if i > 0:
+                self.stats["retries"] += 1
+            try:
+                return await self.attempt(url, headers)
+            except FetchError as e:
+                if not e.retryable:
+                    raise e
+                logger.info("请求%s失败，正在重试第%d次: %s", url, i + 1, e)
+            # Retry-After pauses are enforced by the limiter, this only spreads retries out
+            await asyncio.sleep(backoff(i))
+        logger.warning("请求%s失败，已重试%d次，放弃请求", url, self.retries)
+        self.stats["failures"] += 1
+        return None
+
+    async def attempt(self, url, headers=None, binary=False):
+        """
+        请求单个URL一次，不重试，由调用方决定何时重试
+
+        Args:
+            url (str): 请求URL
+            headers (dict, optional): 请求头. Defaults to None.
+            binary (bool, optional): 是否保留原始字节，用于图片等非文本响应. Defaults to False.
+
+        Returns:
+            Response: 请求结果，binary时text为bytes，状态码为304时text为None
+
+        Raises:
+            FetchError: 请求失败
+        """
+        headers = {k: v for k, v in (headers or {}).items() if v is not None}
+        await self.limiter.acquire()
+        self.stats["requests"] += 1
+        start = time.monotonic()
+        status, retry_after = None, None
+        try:
+            async with self._session.get(url, headers=headers) as response:
+                status = response.status
+                retry_after = response.headers.get("Retry-After")
+                response.raise_for_status()
+                body = await response.read()
+                self.stats["bytes"] += len(body)
+                if status == 304:
+                    text = None
+                elif binary:
+                    text = body
+                else:
+                    text = body.decode(response.get_encoding())
+                result = Response(url, status, text, response.headers.copy())
+            logger.debug("请求%s成功", url)
+            return result
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise FetchError(url, status, e) from e
+        finally:
+            latency = time.monotonic() - start
+            self.latencies.append(latency)
+            self.metrics.observe("total", latency)
+            self.metrics.count_status(status)
+            await self.limiter.release(status, latency, retry_after)
+
+    async def fetch_all(self, urls, headers=None):
+        """
+        并发请求多个URL
+
+        Args:
+            urls (list): 包含URL的列表
+            headers (dict, optional): 请求头. Defaults to None.
+
+        Returns:
+            list: 与urls顺序一致的请求结果列表
+        """
+        return await asyncio.gather(*(self.fetch(url, headers) for url in urls))
+
+    def fetch_responses(self, urls, headers_list):
+        """
+        并发请求多个URL，每个URL使用各自的请求头，并阻塞等待全部结果
+
+        Args:
+            urls (list): 包含URL的列表
+            headers_list (list): 与urls一一对应的请求头列表
+
+        Returns:
+            list[Response]: 与urls顺序一致的请求结果列表
+        """
+
+        async def request_all():
+            return await asyncio.gather(
+                *(
+                    self.request(url, headers)
+                    for url, headers in zip(urls, headers_list)
+                )
+            )
+
+        return self.run(request_all())
+
+    def fetch_data(self, urls, headers=None):
+        """
+        并发请求多个URL，并阻塞等待全部结果
+
+        Args:
+            urls (list): 包含URL的列表
+            headers (dict, optional): 请求头. Defaults to None.
+
+        Returns:
+            list: 与urls顺序一致的请求结果列表
+        """
+        return self.run(self.fetch_all(urls, headers))
+
+
+_default_engine = None
+
+
+def get_default_engine():
+    """
+    获取进程内共享的默认引擎，首次调用时创建
+
+    Returns:
+        FetchEngine: 默认引擎
+    """
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = FetchEngine().start()
+        atexit.register(_default_engine.close)
+    return _default_engine
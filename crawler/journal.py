@@ -0,0 +1,138 @@
+import glob
+import json
+import os
+
+
+class CrawlJournal:
+    def __init__(self, dir_path, segment_size=10000, checkpoint_every=50, worker=None):
+        """
+        初始化CrawlJournal对象
+
+        爬取结果以JSONL分段文件的形式只追加写入，每处理完一批条目fsync一次，
+        进程崩溃后最多丢失最后一批未落盘的记录，已写入的条目可以在--resume时跳过。
+
+        Args:
+            dir_path (str): 日志分段文件所在目录
+            segment_size (int, optional): 每个分段文件最多保存的记录数. Defaults to 10000.
+            checkpoint_every (int, optional): 每追加多少条记录自动fsync一次. Defaults to 50.
+            worker (str, optional): 工作进程名称，多个进程写入同一目录时各自写入segment-{worker}-*.jsonl，
+                读取时合并所有进程的分段. Defaults to None.
+        """
+        self.dir_path = dir_path
+        self.segment_size = segment_size
+        self.checkpoint_every = checkpoint_every
+        self.prefix = "segment" if worker is None else f"segment-{worker}"
+        self.appended = 0
+        self._file = None
+        self._segment_records = 0
+        self._pending = 0
+        os.makedirs(dir_path, exist_ok=True)
+
+    def segments(self):
+        """
+        获取所有分段文件路径，包括其他工作进程写入的分段
+
+        Returns:
+            list[str]: 按最后写入时间排列的分段文件路径，刷新写入的新分段排在旧记录之后
+        """
+        file_names = glob.glob(os.path.join(self.dir_path, "segment-*.jsonl"))
+        return sorted(file_names, key=lambda name: (os.path.getmtime(name), name))
+
+    def _open_segment(self):
+        """
+        打开一个新的分段文件，崩溃时可能写了一半的旧分段不再追加
+        """
+        self.close()
+        own_segments = glob.glob(
+            os.path.join(self.dir_path, f"{self.prefix}-[0-9]*.jsonl")
+        )
+        index = len(own_segments)
+        file_name = os.path.join(self.dir_path, f"{self.prefix}-{index:05d}.jsonl")
+        self._file = open(file_name, "a", encoding="utf-8")
+        self._segment_records = 0
+
+    def append(self, record):
+        """
+        追加一条记录
+
+        Args:
+            record (dict): 条目信息，必须包含id
+        """
+        if self._file is None or self._segment_records >= self.segment_size:
+            self._open_segment()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._segment_records += 1
+        self._pending += 1
+        self.appended += 1
+        if self._pending >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        将已追加的记录刷新并fsync到磁盘
+        """
+        if self._file is None or self._pending == 0:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        """
+        落盘并关闭当前分段文件
+        """
+        if self._file is not None:
+            self.checkpoint()
+            self._file.close()
+            self._file = None
+
+    def reset(self):
+        """
+        删除所有分段文件，重新开始记录
+        """
+        self.close()
+        for file_name in self.segments():
+            os.remove(file_name)
+
+    def _read(self, file_names):
+        """
+        按顺序逐行读取分段文件，跳过崩溃时写了一半的行
+
+        Args:
+            file_names (list[str]): 分段文件路径
+
+        Yields:
+            tuple[tuple[str, int], dict]: 记录所在的(分段文件, 行号)和条目信息
+        """
+        self.checkpoint()
+        for file_name in file_names:
+            with open(file_name, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f):
+                    try:
+                        yield (file_name, line_no), json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+    def records(self):
+        """
+        逐条读取日志中的记录，同一条目被刷新过多次时只返回最后一次写入的记录
+
+        先扫描一遍只记下每个条目最新记录的位置，再扫描一遍按位置输出，内存占用只与条目数量有关
+
+        Yields:
+            dict: 条目信息
+        """
+        file_names = self.segments()
+        latest = {record["id"]: position for position, record in self._read(file_names)}
+        for position, record in self._read(file_names):
+            if latest.get(record["id"]) == position:
+                yield record
+
+    def processed_ids(self):
+        """
+        获取日志中已处理的条目代码
+
+        Returns:
+            set[str]: 已处理的条目代码
+        """
+        return {str(record["id"]) for _, record in self._read(self.segments())}
@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+from .base_crawler import BaseCrawler
+from .rank_crawler import PAGE_SIZE
+from .subject_crawler import SUBJECT_TYPES
+
+# fields process_*_info needs, subjects missing any of them are fetched one by one
+REQUIRED_FIELDS = ["images", "infobox", "tags", "rating", "collection"]
+
+
+class ListingCrawler(BaseCrawler):
+    def __init__(
+        self,
+        type,
+        headers=None,
+        engine=None,
+        validators=None,
+        limit=50,
+        skip_ids=None,
+    ):
+        """
+        初始化ListingCrawler对象
+
+        通过/v0/subjects分页浏览接口按排名批量获取条目，一次请求返回最多limit个条目，
+        只有列表中缺少字段的条目才会再单独请求/v0/subjects/{id}。
+
+        Args:
+            type (str): 数据类型，必须是SUBJECT_TYPES中的类型之一
+            headers (dict, optional): 请求头. Defaults to None.
+            engine (FetchEngine, optional): 共享的请求引擎. Defaults to None.
+            validators (ValidatorStore, optional): 补充详情时条件请求的验证信息存储. Defaults to None.
+            limit (int, optional): 每页条目数量，接口上限为50. Defaults to 50.
+            skip_ids (set, optional): 需要跳过的条目代码. Defaults to None.
+        """
+        assert type in SUBJECT_TYPES
+        self.type = type
+        self.limit = limit
+        self.skip_ids = skip_ids or set()
+        self.stop = None
+        self.api = "https://api.bgm.tv/v0/subjects?type={}&sort=rank&limit={}&offset={}"
+        self.detail_api = "https://api.bgm.tv/v0/subjects/{}"
+        super().__init__(headers=headers, engine=engine, validators=validators)
+
+    def get_offsets(self, start_page, end_page):
+        """
+        将排行榜页码范围换算为浏览接口的偏移量，与RankCrawler覆盖相同排名区间的条目
+
+        Args:
+            start_page (int): 开始的排行榜页码
+            end_page (int): 结束的排行榜页码
+
+        Returns:
+            range: 每页请求的偏移量
+        """
+        self.stop = end_page * PAGE_SIZE
+        return range((start_page - 1) * PAGE_SIZE, self.stop, self.limit)
+
+    async def fetch_page(self, offset):
+        """
+        获取一页条目，并为缺少字段的条目补充详情，任意一个请求失败时整页由流水线延迟重试
+
+        Args:
+            offset (int): 偏移量
+
+        Returns:
+            list[dict]: 该页中未被跳过的条目
+
+        Raises:
+            FetchError: 请求失败
+        """
+        limit = self.limit if self.stop is None else min(self.limit, self.stop - offset)
+        url = self.api.format(SUBJECT_TYPES[self.type].code, limit, offset)
+        text = (await self.engine.attempt(url, self.headers)).text
+        if not text:
+            return []
+        subjects = [
+            subject
+            for subject in json.loads(text)["data"]
+            if str(subject["id"]) not in self.skip_ids
+        ]
+        incomplete = [
+            i
+            for i, subject in enumerate(subjects)
+            if any(field not in subject for field in REQUIRED_FIELDS)
+        ]
+        details = await asyncio.gather(
+            *(
+                self.fetch_subject(
+                    self.detail_api.format(subjects[i]["id"]), str(subjects[i]["id"])
+                )
+                for i in incomplete
+            )
+        )
+        for i, detail in zip(incomplete, details):
+            subjects[i] = json.loads(detail)
+        return subjects
@@ -0,0 +1,240 @@
+import asyncio
+import bisect
+import collections
+import json
+import os
+import time
+import types
+
+import aiohttp
+
+# upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+# request phases timed by the trace hooks and the engine
+PHASES = ["dns", "connect", "ttfb", "total"]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        初始化Histogram对象，按固定的桶统计延迟分布，内存占用与请求数量无关
+
+        Args:
+            buckets (list, optional): 各个桶的上界(秒). Defaults to LATENCY_BUCKETS.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        记录一个样本
+
+        Args:
+            value (float): 样本值(秒)
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        按桶估算分位数，返回样本所在桶的上界
+
+        Args:
+            q (float): 分位数，0到1之间
+
+        Returns:
+            float: 分位数的估计值，没有样本时返回0，落在最后一个桶时返回inf
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        """
+        获取样本数、总和和p50/p99，落在最后一个桶的分位数记为None
+
+        Returns:
+            dict: 可以序列化为JSON的统计信息
+        """
+        p50, p99 = self.quantile(0.5), self.quantile(0.99)
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": None if p50 == float("inf") else p50,
+            "p99": None if p99 == float("inf") else p99,
+        }
+
+
+class CrawlMetrics:
+    def __init__(self):
+        """
+        初始化CrawlMetrics对象
+
+        汇总整个爬取过程的请求指标：DNS解析、建立连接、首字节和总耗时的分布，接收字节数，
+        状态码分布，请求/重试/失败次数，以及流水线各队列的长度和当前并发数，
+        可以导出为Prometheus文本文件或定期追加的JSON快照。
+        """
+        # requests, retries, failures, bytes and connection reuse
+        self.counters = collections.Counter()
+        self.statuses = collections.Counter()
+        self.timings = {phase: Histogram() for phase in PHASES}
+        # callables sampled at export time, e.g. queue depths and in-flight requests
+        self.gauges = {}
+        self.started_at = time.time()
+
+    def observe(self, phase, seconds):
+        """
+        记录一次请求某个阶段的耗时
+
+        Args:
+            phase (str): PHASES中的阶段
+            seconds (float): 耗时(秒)
+        """
+        self.timings[phase].observe(seconds)
+
+    def count_status(self, status):
+        """
+        记录一次响应的状态码
+
+        Args:
+            status (int): 状态码，连接失败或超时时为None
+        """
+        self.statuses["error" if status is None else str(status)] += 1
+
+    def trace_config(self):
+        """
+        创建记录DNS解析、建立连接和首字节耗时的aiohttp TraceConfig
+
+        Returns:
+            aiohttp.TraceConfig: 传给ClientSession的trace配置
+        """
+
+        async def on_request_start(session, ctx, params):
+            ctx.start = time.monotonic()
+
+        async def on_dns_resolvehost_start(session, ctx, params):
+            ctx.dns_start = time.monotonic()
+
+        async def on_dns_resolvehost_end(session, ctx, params):
+            self.observe("dns", time.monotonic() - ctx.dns_start)
+
+        async def on_dns_cache_hit(session, ctx, params):
+            self.counters["dns_cache_hits"] += 1
+
+        async def on_connection_create_start(session, ctx, params):
+            ctx.connect_start = time.monotonic()
+
+        async def on_connection_create_end(session, ctx, params):
+            self.observe("connect", time.monotonic() - ctx.connect_start)
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.counters["connections_reused"] += 1
+
+        async def on_request_end(session, ctx, params):
+            # fired once the response headers arrive, before the body is read
+            self.observe("ttfb", time.monotonic() - ctx.start)
+
+        trace_config = aiohttp.TraceConfig(
+            trace_config_ctx_factory=types.SimpleNamespace
+        )
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def snapshot(self):
+        """
+        获取当前所有指标的快照
+
+        Returns:
+            dict: 可以序列化为JSON的指标
+        """
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started_at,
+            "counters": dict(self.counters),
+            "statuses": dict(self.statuses),
+            "timings": {
+                phase: histogram.snapshot() for phase, histogram in self.timings.items()
+            },
+            "gauges": {name: gauge() for name, gauge in self.gauges.items()},
+        }
+
+    def to_prometheus(self):
+        """
+        按Prometheus文本格式导出指标
+
+        Returns:
+            str: Prometheus文本格式的指标
+        """
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE bangumi_crawler_{name}_total counter")
+            lines.append(f"bangumi_crawler_{name}_total {value}")
+        lines.append("# TYPE bangumi_crawler_responses_total counter")
+        for status, value in sorted(self.statuses.items()):
+            lines.append(
+                f'bangumi_crawler_responses_total{{status="{status}"}} {value}'
+            )
+        lines.append("# TYPE bangumi_crawler_request_seconds histogram")
+        for phase, histogram in self.timings.items():
+            cumulative = 0
+            for bound, count in zip([*histogram.buckets, "+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'bangumi_crawler_request_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'bangumi_crawler_request_seconds_sum{{phase="{phase}"}} {histogram.sum}'
+            )
+            lines.append(
+                f'bangumi_crawler_request_seconds_count{{phase="{phase}"}} {histogram.count}'
+            )
+        for name, gauge in sorted(self.gauges.items()):
+            lines.append(f"# TYPE bangumi_crawler_{name} gauge")
+            lines.append(f"bangumi_crawler_{name} {gauge()}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, file_path):
+        """
+        导出指标，.prom文件以Prometheus文本格式整体替换，其余文件追加一行JSON快照
+
+        Args:
+            file_path (str): 导出文件路径
+        """
+        if file_path.endswith(".prom"):
+            # write then rename so a scraper never reads a half written file
+            temp_path = file_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            os.replace(temp_path, file_path)
+        else:
+            with open(file_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.snapshot()) + "\n")
+
+    async def export_every(self, file_path, interval):
+        """
+        每隔interval秒导出一次指标，直到被取消
+
+        Args:
+            file_path (str): 导出文件路径
+            interval (float): 导出间隔(秒)
+        """
+        while True:
+            await asyncio.sleep(interval)
+            # runs on the engine loop so the counters are not mutated while being read
+            self.export(file_path)
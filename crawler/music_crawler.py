@@ -1,23 +1,28 @@
-import json
-import os
+from .subject_crawler import SubjectCrawler
 
-import pandas as pd
 
-from .base_crawler import BaseCrawler
-
-
-class MusicCrawler(BaseCrawler):
-    def __init__(self, data_path, headers=None):
+class MusicCrawler(SubjectCrawler):
+    def __init__(
+        self, data_path, headers=None, engine=None, validators=None, journal=None
+    ):
         """
         初始化MusicCrawler对象
 
         Args:
             data_path (str): 数据保存路径
             headers (dict, optional): 请求头. Defaults to None.
+            engine (FetchEngine, optional): 共享的请求引擎. Defaults to None.
+            validators (ValidatorStore, optional): 条件请求的验证信息存储. Defaults to None.
+            journal (CrawlJournal, optional): 爬取日志，为None时使用数据路径下的music_journal. Defaults to None.
         """
-        self.data_path = data_path
-        self.api = "https://api.bgm.tv/v0/subjects/{}"
-        super().__init__(headers=headers)
+        super().__init__(
+            "music",
+            data_path,
+            headers=headers,
+            engine=engine,
+            validators=validators,
+            journal=journal,
+        )
 
     # def get_music_info(self):
     #     url = f'https://bgm.tv/subject/{subject_code}/'
@@ -36,14 +41,12 @@ class MusicCrawler(BaseCrawler):
 
     def save_music_info(self, music_infos):
         """
-        将音乐信息保存到CSV文件中
+        将音乐信息按固定的列式结构保存到Parquet文件中
 
         Args:
-            music_infos (list): 包含音乐信息的列表
+            music_infos (iterable): 包含音乐信息的可迭代对象
         """
-        file_name = os.path.join(self.data_path, "music_infos.csv")
-        music_infos_df = pd.DataFrame(music_infos)
-        music_infos_df.to_csv(file_name, index=False)
+        self.save_info(music_infos)
 
     def get_music_info(self, subject_codes):
         """
@@ -53,23 +56,22 @@ class MusicCrawler(BaseCrawler):
             subject_codes (list): 包含音乐条目代码的列表
 
         Returns:
-            list[dict]: 包含多个音乐信息字典的列表，音乐信息如：
-            id, type, name, name_cn, summary, nsfw, locked, platform, images[large,common,medium,small,grid](cover),
-            infobox, volumes, eps, total_episodes, rating(rank, total, count, score),
-            collection(on_hold, dropped, wish, collect, doing), tags(name:count).
+            int: 本次写入日志的音乐信息数量
+        """
+        return self.get_info(subject_codes)
+
+    def get_music_info_from_listing(self, listing_crawler, offsets):
         """
-        music_infos = []
-        truncate = 50
-        for i in range(0, len(subject_codes), truncate):
-            api = [
-                self.api.format(subject_code)
-                for subject_code in subject_codes[i : i + truncate]
-            ]
-            json_datas = super().fetch_data(api)
-            self.process_music_info(music_infos, json_datas)
-            print(f"已获取{len(music_infos)}条音乐信息")
-            self.save_music_info(music_infos)
-        return music_infos
+        通过分页浏览接口批量获取音乐信息
+
+        Args:
+            listing_crawler (ListingCrawler): 分页浏览爬虫
+            offsets (iterable): 每页请求的偏移量
+
+        Returns:
+            int: 本次写入日志的音乐信息数量
+        """
+        return self.get_info_from_listing(listing_crawler, offsets)
 
     def process_music_info(self, music_infos, json_datas):
         """
@@ -79,40 +81,19 @@ class MusicCrawler(BaseCrawler):
             music_infos (list): 包含音乐信息的列表
             json_datas (list): 包含音乐信息的JSON数据
         """
-        for json_data in json_datas:
-            music_info = json.loads(json_data)
-
-            # pop unwanted keys
-            # for unwanted_key in ['nsfw', 'locked', ]:
-            #     music_info.pop(unwanted_key)
-            # unpack images dict
-            images = {
-                f"{size}_cover": url for size, url in music_info["images"].items()
-            }
-            music_info.pop("images")
-            music_info.update(images)
-            # unpack infobox dict
-            music_info["tags"] = {
-                tag["name"]: tag["count"] for tag in music_info["tags"]
-            }
-
-            infobox = {item["key"]: item["value"] for item in music_info["infobox"]}
-            music_info.pop("infobox")
-            music_info.update(infobox)
-            # unpack rating dict
-            rank = music_info["rating"]["rank"]
-            votes = music_info["rating"]["total"]
-            ratings = music_info["rating"]["count"]
-            rating_score = (
-                sum([int(rating) * count for rating, count in ratings.items()]) / votes
-            )
-            music_info.pop("rating")
-            music_info["rank"] = rank
-            music_info["votes"] = votes
-            music_info["ratings"] = ratings
-            music_info["rating_score"] = rating_score
-
-            music_infos.append(music_info)
+        self.process_info(music_infos, json_datas)
+
+    def parse_music_info(self, json_data):
+        """
+        解析单条音乐信息
+
+        Args:
+            json_data (str | dict): 音乐信息的JSON数据
+
+        Returns:
+            dict: 展开后的音乐信息
+        """
+        return self.parse_info(json_data)
 
 
 if __name__ == "__main__":
@@ -120,4 +101,5 @@ if __name__ == "__main__":
         "User-Agent": "murlors/bangumi-analysis-coursework (https://github.com/murlors/Bangumi-Analysis-Coursework)"
     }
     music_crawler = MusicCrawler("data", headers)
-    music_info = music_crawler.get_music_info(["163164", "238923"])
+    music_crawler.get_music_info(["163164", "238923"])
+    music_crawler.compact()
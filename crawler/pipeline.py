@@ -0,0 +1,218 @@
+import asyncio
+import logging
+
+from .fetch_engine import FetchError, backoff
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    def __init__(
+        self,
+        engine,
+        fetch,
+        decode,
+        persist,
+        fetch_workers=None,
+        decode_workers=2,
+        queue_size=100,
+        executor=None,
+        attempts=None,
+        on_failure=None,
+    ):
+        """
+        初始化Pipeline对象
+
+        获取、解析、写入三个阶段各自并发运行，阶段之间使用有界队列连接，
+        下游处理不过来时上游会被阻塞(背压)，吞吐量只受最慢的阶段限制，
+        单个慢请求只占用一个获取协程，不会拖住整批数据。可以重试的失败会按指数退避加抖动
+        延迟后重新放入获取队列，等待期间不占用获取协程和并发名额。
+
+        Args:
+            engine (FetchEngine): 运行流水线的请求引擎
+            fetch (callable): 获取阶段的协程函数，接收一个条目，返回响应体，没有数据时返回None，
+                请求失败时抛出FetchError
+            decode (callable): 解析阶段的函数，接收响应体，返回要写入的记录
+            persist (callable): 写入阶段的函数，接收一条记录
+            fetch_workers (int, optional): 获取协程数量，为None时使用引擎的最大并发数. Defaults to None.
+            decode_workers (int, optional): 解析线程数量. Defaults to 2.
+            queue_size (int, optional): 每个阶段之间队列的容量. Defaults to 100.
+            executor (Executor, optional): 解析阶段使用的执行器，使用进程池时decode和响应体必须可以pickle，
+                为None时使用事件循环默认的线程池. Defaults to None.
+            attempts (int, optional): 每个条目最多尝试获取的次数，为None时使用引擎的重试次数. Defaults to None.
+            on_failure (callable, optional): 条目最终获取失败或解析失败时调用，接收条目、异常和尝试次数，
+                为None时只输出错误. Defaults to None.
+        """
+        self.engine = engine
+        self.fetch = fetch
+        self.decode = decode
+        self.persist = persist
+        self.fetch_workers = fetch_workers or engine.concurrency
+        self.decode_workers = decode_workers
+        self.queue_size = queue_size
+        self.executor = executor
+        self.attempts = attempts or engine.retries
+        self.on_failure = on_failure
+
+    def run(self, items):
+        """
+        运行流水线直到所有条目处理完毕
+
+        Args:
+            items (iterable): 要处理的条目
+
+        Returns:
+            int: 成功写入的记录数量
+        """
+        return self.engine.run(self._run(items))
+
+    async def _run(self, items):
+        """
+        在引擎的事件循环中启动各阶段，并按顺序等待各阶段的队列排空
+
+        Args:
+            items (iterable): 要处理的条目
+
+        Returns:
+            int: 成功写入的记录数量
+        """
+        fetch_queue = asyncio.Queue(self.queue_size)
+        decode_queue = asyncio.Queue(self.queue_size)
+        persist_queue = asyncio.Queue(self.queue_size)
+        self.persisted = 0
+        self.delayed = set()
+        gauges = self.engine.metrics.gauges
+        gauges["fetch_queue"] = fetch_queue.qsize
+        gauges["decode_queue"] = decode_queue.qsize
+        gauges["persist_queue"] = persist_queue.qsize
+        gauges["delayed_retries"] = self.delayed.__len__
+
+        stages = [
+            (fetch_queue, self.fetch_workers, self._fetch_worker, decode_queue),
+            (decode_queue, self.decode_workers, self._decode_worker, persist_queue),
+            (persist_queue, 1, self._persist_worker, None),
+        ]
+        workers = [
+            asyncio.create_task(worker(queue, next_queue))
+            for queue, worker_count, worker, next_queue in stages
+            for _ in range(worker_count)
+        ]
+        try:
+            await self._watch(self._produce(items, fetch_queue), workers)
+            # a retry may still be waiting out its backoff when the fetch queue drains
+            await self._watch(fetch_queue.join(), workers)
+            while self.delayed:
+                await self._watch(asyncio.wait(self.delayed), workers)
+                await self._watch(fetch_queue.join(), workers)
+            for queue, *_ in stages[1:]:
+                await self._watch(queue.join(), workers)
+        finally:
+            for task in [*workers, *self.delayed]:
+                task.cancel()
+            await asyncio.gather(*workers, *self.delayed, return_exceptions=True)
+        return self.persisted
+
+    async def _produce(self, items, queue):
+        """
+        将条目依次放入获取队列，队列满时等待
+        """
+        for item in items:
+            await queue.put((item, 1))
+
+    async def _retry(self, item, attempt, queue):
+        """
+        等待退避时间后将条目重新放入获取队列
+
+        Args:
+            item (object): 要重试的条目
+            attempt (int): 下一次是第几次尝试
+            queue (asyncio.Queue): 获取队列
+        """
+        await asyncio.sleep(backoff(attempt - 2))
+        await queue.put((item, attempt))
+
+    async def _watch(self, coro, workers):
+        """
+        等待coro完成，期间若有阶段协程异常退出则抛出该异常，避免流水线卡死
+
+        Args:
+            coro (coroutine): 要等待的协程
+            workers (list[Task]): 所有阶段的协程
+        """
+        waiter = asyncio.ensure_future(coro)
+        done, _ = await asyncio.wait(
+            [waiter, *workers], return_when=asyncio.FIRST_COMPLETED
+        )
+        if waiter not in done:
+            waiter.cancel()
+            for task in done:
+                task.result()
+        waiter.result()
+
+    async def _fetch_worker(self, queue, next_queue):
+        """
+        获取阶段：请求条目数据并交给解析阶段
+        """
+        while True:
+            item, attempt = await queue.get()
+            try:
+                data = await self.fetch(item)
+            except Exception as e:
+                data = None
+                if (
+                    isinstance(e, FetchError)
+                    and e.retryable
+                    and attempt < self.attempts
+                ):
+                    self.engine.stats["retries"] += 1
+                    task = asyncio.create_task(self._retry(item, attempt + 1, queue))
+                    self.delayed.add(task)
+                    task.add_done_callback(self.delayed.discard)
+                else:
+                    self._fail(item, e, attempt)
+            if data is not None:
+                # the item travels with its data so decode failures reach on_failure too
+                await next_queue.put((item, attempt, data))
+            queue.task_done()
+
+    def _fail(self, item, error, attempt):
+        """
+        处理最终获取失败或解析失败的条目
+
+        Args:
+            item (object): 条目
+            error (Exception): 最后一次失败的异常
+            attempt (int): 已尝试的次数
+        """
+        self.engine.stats["failures"] += 1
+        if self.on_failure is None:
+            logger.warning("处理%s失败，已尝试%d次，已跳过: %s", item, attempt, error)
+        else:
+            self.on_failure(item, error, attempt)
+
+    async def _decode_worker(self, queue, next_queue):
+        """
+        解析阶段：在线程池或进程池中解析响应体，不阻塞事件循环
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            item, attempt, data = await queue.get()
+            try:
+                record = await loop.run_in_executor(self.executor, self.decode, data)
+            except Exception as e:
+                record = None
+                self._fail(item, e, attempt)
+            if record is not None:
+                await next_queue.put(record)
+            queue.task_done()
+
+    async def _persist_worker(self, queue, next_queue):
+        """
+        写入阶段：单个协程按到达顺序写入记录，写入函数无需考虑线程安全
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            record = await queue.get()
+            await loop.run_in_executor(None, self.persist, record)
+            self.persisted += 1
+            queue.task_done()
@@ -1,37 +1,44 @@
 import csv
 import os
 
-from bs4 import BeautifulSoup
+from lxml import etree
 
 from .base_crawler import BaseCrawler
+from .subject_crawler import SUBJECT_TYPES
+
+# number of subjects listed on one browser page
+PAGE_SIZE = 24
 
 
 class RankCrawler(BaseCrawler):
-    def __init__(self, type, data_path, start_page, end_page, headers=None):
+    def __init__(
+        self, type, data_path, start_page, end_page, headers=None, engine=None
+    ):
         """
         初始化RankCrawler对象
 
         Args:
-            type (str): 数据类型，必须是["anime", "book", "music", "game", "real"]之一
+            type (str): 数据类型，必须是SUBJECT_TYPES中的类型之一
             data_path (str): 数据保存路径
             start_page (int): 开始爬取的页面
             end_page (int): 结束爬取的页面
             headers (dict, optional): 请求头. Defaults to None.
+            engine (FetchEngine, optional): 共享的请求引擎. Defaults to None.
         """
-        assert type in ["anime", "book", "music", "game", "real"]
+        assert type in SUBJECT_TYPES
         self.type = type
         self.data_path = data_path
         self.start_page = start_page
         self.end_page = end_page
         self.url = f"https://bgm.tv/{self.type}/browser?sort=rank"
-        super().__init__(headers=headers)
+        super().__init__(headers=headers, engine=engine)
 
     def save_subject_codes(self, subject_codes):
         """
-        将subject_codes保存到csv文件中
+        将subject_codes及其排名保存到csv文件中
 
         Args:
-            subject_codes (set): 要保存的subject_codes
+            subject_codes (dict): 要保存的subject_codes，值为排名
         """
         file_name = os.path.join(
             self.data_path,
@@ -39,31 +46,72 @@ class RankCrawler(BaseCrawler):
         )
         with open(file_name, "w", newline="") as f:
             writer = csv.writer(f)
-            writer.writerow(["subject_code"])
-            writer.writerows([code] for code in subject_codes)
+            writer.writerow(["subject_code", "rank"])
+            writer.writerows(subject_codes.items())
 
     def get_subject_codes(self):
         """
-        获取subject_codes
+        获取subject_codes，每次并发请求一组页面，按页码顺序处理，遇到空页面时认为已到最后一页
 
         Returns:
-            set: 获取到的subject_codes
+            dict: 获取到的subject_codes，按排名排序，值为排名
         """
-        subject_codes = set()
-        for page in range(self.start_page, self.end_page + 1):
-            url = self.url + f"&page={page}"
-            html = super().fetch_data([url])[0]
-            if not html:
+        subject_codes = {}
+        window = self.engine.concurrency
+        for first_page in range(self.start_page, self.end_page + 1, window):
+            pages = range(first_page, min(first_page + window, self.end_page + 1))
+            htmls = super().fetch_data([self.url + f"&page={page}" for page in pages])
+            last_page = False
+            for page, html in zip(pages, htmls):
+                codes = extract_subject_codes(html) if html else []
+                if not codes:
+                    last_page = True
+                    break
+                for i, code in enumerate(codes):
+                    subject_codes.setdefault(code, (page - 1) * PAGE_SIZE + i + 1)
+            if last_page:
                 break
-            soup = BeautifulSoup(html, "lxml")
-            subjects = soup.select(".subjectCover")
-            subject_codes.update(
-                (subject["href"].split("/")[-1] for subject in subjects)
-            )
         self.save_subject_codes(subject_codes)
         return subject_codes
 
 
+class SubjectCoverTarget:
+    """
+    lxml解析器的target，只在解析事件中收集.subjectCover链接，不构建文档树
+    """
+
+    def __init__(self):
+        self.subject_codes = []
+
+    def start(self, tag, attrib):
+        if tag == "a" and "subjectCover" in attrib.get("class", "").split():
+            self.subject_codes.append(attrib["href"].rstrip("/").split("/")[-1])
+
+    def end(self, tag):
+        pass
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return self.subject_codes
+
+
+def extract_subject_codes(html):
+    """
+    从排行榜页面中提取subject_codes
+
+    Args:
+        html (str): 排行榜页面
+
+    Returns:
+        list[str]: 按页面顺序排列的subject_codes
+    """
+    parser = etree.HTMLParser(target=SubjectCoverTarget())
+    parser.feed(html)
+    return parser.close()
+
+
 if __name__ == "__main__":
     rank_crawler = RankCrawler("music", "data", 1, 2)
     subject_codes = rank_crawler.get_subject_codes()
@@ -0,0 +1,188 @@
+import asyncio
+import collections
+import email.utils
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate=10.0,
+        burst=10,
+        concurrency=8,
+        min_concurrency=1,
+        max_concurrency=32,
+        increase=1.0,
+        decrease=0.5,
+        latency_threshold=2.0,
+        window=50,
+        cooldown=1.0,
+    ):
+        """
+        初始化RateLimiter对象
+
+        令牌桶限制请求速率，AIMD(加性增、乘性减)控制并发数：
+        延迟正常时并发数每轮加性增长，遇到429/5xx、网络错误或p95延迟超过阈值时乘性下降。
+
+        Args:
+            rate (float, optional): 令牌桶每秒补充的令牌数，即平均每秒请求数. Defaults to 10.0.
+            burst (int, optional): 令牌桶容量，即允许的突发请求数. Defaults to 10.
+            concurrency (int, optional): 初始并发数. Defaults to 8.
+            min_concurrency (int, optional): 并发数下限. Defaults to 1.
+            max_concurrency (int, optional): 并发数上限. Defaults to 32.
+            increase (float, optional): 每轮成功后并发数的加性增量. Defaults to 1.0.
+            decrease (float, optional): 被限流时并发数的乘性因子. Defaults to 0.5.
+            latency_threshold (float, optional): p95延迟阈值(秒). Defaults to 2.0.
+            window (int, optional): 计算p95延迟的滑动窗口大小. Defaults to 50.
+            cooldown (float, optional): 两次乘性下降之间的最短间隔(秒). Defaults to 1.0.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+        self.limit = float(min(max(concurrency, min_concurrency), max_concurrency))
+        self.in_flight = 0
+        self.latencies = collections.deque(maxlen=window)
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._condition = None
+
+    @classmethod
+    def from_config(cls, config, concurrency=8):
+        """
+        根据配置文件中crawler.rate-limit部分创建RateLimiter
+
+        Args:
+            config (dict): 配置字典，键名可使用连字符，如max-concurrency
+            concurrency (int, optional): 初始并发数. Defaults to 8.
+
+        Returns:
+            RateLimiter: 限流器
+        """
+        kwargs = {key.replace("-", "_"): value for key, value in (config or {}).items()}
+        kwargs.setdefault("concurrency", concurrency)
+        return cls(**kwargs)
+
+    def _refill(self, now):
+        """
+        按经过的时间补充令牌
+
+        Args:
+            now (float): 当前单调时钟时间
+        """
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+
+    async def acquire(self):
+        """
+        等待直到并发数未满、未处于Retry-After暂停期且令牌桶中有令牌
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self.in_flight >= int(self.limit):
+                    delay = None
+                elif self._tokens < 1:
+                    delay = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    return
+                try:
+                    await asyncio.wait_for(self._condition.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, status, latency, retry_after=None):
+        """
+        归还并发名额，并根据响应结果调整并发数
+
+        Args:
+            status (int): 响应状态码，网络错误或超时时为None
+            latency (float): 请求耗时(秒)
+            retry_after (str, optional): 响应头Retry-After的值. Defaults to None.
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status is None or status == 429 or status >= 500:
+                self._backoff(now)
+                pause = parse_retry_after(retry_after)
+                if pause:
+                    self._paused_until = max(self._paused_until, now + pause)
+                    logger.info("服务端要求%.1f秒后重试，暂停发送请求", pause)
+            else:
+                self.latencies.append(latency)
+                if self.p95() > self.latency_threshold:
+                    self._backoff(now)
+                    self.latencies.clear()
+                else:
+                    # additive increase: about +increase per round of `limit` requests
+                    self.limit = min(
+                        self.max_concurrency, self.limit + self.increase / self.limit
+                    )
+            self._condition.notify_all()
+
+    def _backoff(self, now):
+        """
+        乘性降低并发数，冷却期内只降低一次
+
+        Args:
+            now (float): 当前单调时钟时间
+        """
+        if now - self._decreased_at < self.cooldown:
+            return
+        self._decreased_at = now
+        self.limit = max(self.min_concurrency, self.limit * self.decrease)
+        logger.info("检测到限流或延迟过高，并发数降低至%d", int(self.limit))
+
+    def p95(self):
+        """
+        计算滑动窗口内的p95延迟
+
+        Returns:
+            float: p95延迟(秒)，样本不足时返回0
+        """
+        if len(self.latencies) < self.latencies.maxlen // 2:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+def parse_retry_after(value):
+    """
+    解析Retry-After响应头
+
+    Args:
+        value (str): 秒数或HTTP日期格式的Retry-After值
+
+    Returns:
+        float: 需要等待的秒数，无法解析时返回None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
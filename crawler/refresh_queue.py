@@ -0,0 +1,194 @@
+import heapq
+import json
+import math
+import sqlite3
+import time
+
+
+class RefreshQueue:
+    def __init__(self, file_path):
+        """
+        初始化RefreshQueue对象
+
+        持久化保存每个条目的抓取历史，定期刷新时按价值分数从高到低选出固定预算的条目：
+        距上次抓取越久、排名/评分人数/收藏数变化越频繁、越热门的条目分数越高，
+        从未抓取过的条目优先级最高。
+
+        Args:
+            file_path (str): SQLite数据库文件路径
+        """
+        self.file_path = file_path
+        # records are written from the pipeline's persist thread
+        self.conn = sqlite3.connect(file_path, timeout=60, check_same_thread=False)
+        # WAL lets worker processes sharing the data path read while another one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS subjects (
+                type TEXT,
+                subject_code TEXT,
+                rank INTEGER DEFAULT 0,
+                votes INTEGER DEFAULT 0,
+                collect INTEGER DEFAULT 0,
+                fingerprint TEXT,
+                fetch_count INTEGER DEFAULT 0,
+                change_count INTEGER DEFAULT 0,
+                last_fetched REAL,
+                last_changed REAL,
+                PRIMARY KEY (type, subject_code)
+            )
+            """)
+        self._pending = 0
+
+    def commit(self):
+        """
+        提交尚未写入的抓取记录
+        """
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        """
+        关闭数据库连接
+        """
+        self.commit()
+        self.conn.close()
+
+    def count(self, type):
+        """
+        获取队列中某类型的条目数量
+
+        Args:
+            type (str): 条目类型
+
+        Returns:
+            int: 条目数量
+        """
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM subjects WHERE type = ?", (type,)
+        ).fetchone()[0]
+
+    def add(self, type, subject_codes):
+        """
+        加入新发现的条目，已存在的条目保持不变
+
+        Args:
+            type (str): 条目类型
+            subject_codes (iterable): 条目代码
+        """
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO subjects (type, subject_code) VALUES (?, ?)",
+            ((type, str(code)) for code in subject_codes),
+        )
+        self.commit()
+
+    def seed(self, type, subject_infos):
+        """
+        用已有的爬取结果初始化队列，视为刚刚抓取过
+
+        Args:
+            type (str): 条目类型
+            subject_infos (iterable): 展开后的条目信息
+        """
+        for subject_info in subject_infos:
+            self.record(type, subject_info)
+        self.commit()
+
+    def record(self, type, subject_info):
+        """
+        记录一次成功的抓取，排名、评分人数或收藏数变化时累计变化次数
+
+        Args:
+            type (str): 条目类型
+            subject_info (dict): 展开后的条目信息
+        """
+        now = time.time()
+        collection = subject_info.get("collection") or {}
+        fingerprint = json.dumps(
+            [subject_info.get("rank"), subject_info.get("votes"), collection],
+            sort_keys=True,
+        )
+        values = {
+            "type": type,
+            "subject_code": str(subject_info["id"]),
+            "rank": subject_info.get("rank") or 0,
+            "votes": subject_info.get("votes") or 0,
+            "collect": sum(collection.values()),
+            "fingerprint": fingerprint,
+            "now": now,
+        }
+        self.conn.execute(
+            """
+            INSERT INTO subjects (type, subject_code, rank, votes, collect, fingerprint,
+                                  fetch_count, change_count, last_fetched, last_changed)
+            VALUES (:type, :subject_code, :rank, :votes, :collect, :fingerprint, 1, 0, :now, :now)
+            ON CONFLICT (type, subject_code) DO UPDATE SET
+                change_count = change_count + (fingerprint IS NOT NULL AND fingerprint != :fingerprint),
+                last_changed = CASE WHEN fingerprint IS NULL OR fingerprint != :fingerprint
+                                    THEN :now ELSE last_changed END,
+                fetch_count = fetch_count + 1,
+                last_fetched = :now,
+                rank = :rank,
+                votes = :votes,
+                collect = :collect,
+                fingerprint = :fingerprint
+            """,
+            values,
+        )
+        self._pending += 1
+        if self._pending >= 50:
+            self.commit()
+
+    def select(self, budget, types):
+        """
+        按价值分数选出本次刷新的条目
+
+        Args:
+            budget (int): 本次刷新的请求预算
+            types (list): 参与刷新的条目类型
+
+        Returns:
+            dict: 条目类型到条目代码列表的映射，列表按分数从高到低排列
+        """
+        self.commit()
+        now = time.time()
+        rows = self.conn.execute(
+            f"""
+            SELECT type, subject_code, rank, votes, collect,
+                   fetch_count, change_count, last_fetched
+            FROM subjects WHERE type IN ({",".join("?" * len(types))})
+            """,
+            list(types),
+        )
+        selected = heapq.nlargest(budget, rows, key=lambda row: score(*row[2:], now))
+        subject_codes = {type: [] for type in types}
+        for type, subject_code, *_ in selected:
+            subject_codes[type].append(subject_code)
+        return subject_codes
+
+
+def score(rank, votes, collect, fetch_count, change_count, last_fetched, now):
+    """
+    计算条目的刷新价值分数
+
+    分数 = 距上次抓取的天数 × 平滑后的变化频率 × (1 + log(1 + 评分人数 + 收藏数)) × (1 + 1 / log2(1 + 排名))，
+    从未抓取过的条目分数为无穷大。
+
+    Args:
+        rank (int): 排名，0表示未上榜
+        votes (int): 评分人数
+        collect (int): 收藏总数
+        fetch_count (int): 抓取次数
+        change_count (int): 抓取时发现变化的次数
+        last_fetched (float): 上次抓取的时间戳
+        now (float): 当前时间戳
+
+    Returns:
+        float: 刷新价值分数
+    """
+    if last_fetched is None:
+        return math.inf
+    age_days = (now - last_fetched) / 86400
+    change_rate = (change_count + 1) / (fetch_count + 2)
+    popularity = 1 + math.log1p(votes + collect)
+    rank_boost = 1 + (1 / math.log2(1 + rank) if rank > 0 else 0)
+    return age_days * change_rate * popularity * rank_boost
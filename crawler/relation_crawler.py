@@ -0,0 +1,184 @@
+import asyncio
+import os
+
+from .base_crawler import BaseCrawler
+from .decoder import loads
+from .pipeline import Pipeline
+from .relation_store import RELATION_KINDS, IdBitmap
+from .storage import write_relations
+from .subject_crawler import SUBJECT_TYPES
+
+
+def decode_relations(data):
+    """
+    将一个条目的关联条目、人物和角色解码为边
+
+    Args:
+        data (tuple): 获取阶段返回的(条目代码, 深度, {kind: JSON数据})
+
+    Returns:
+        tuple: (条目代码, 深度, 边的列表)，边为(source_id, kind, target_id, target_type, name, name_cn, relation)
+    """
+    subject_id, depth, bodies = data
+    edges = []
+    for kind, body in bodies.items():
+        for target in loads(body):
+            edges.append(
+                (
+                    subject_id,
+                    kind,
+                    target["id"],
+                    target.get("type"),
+                    target.get("name"),
+                    target.get("name_cn"),
+                    target.get("relation"),
+                )
+            )
+    return subject_id, depth, edges
+
+
+class RelationCrawler(BaseCrawler):
+    def __init__(
+        self,
+        store,
+        headers=None,
+        engine=None,
+        kinds=RELATION_KINDS,
+        types=None,
+        max_depth=1,
+        batch_size=500,
+    ):
+        """
+        初始化RelationCrawler对象
+
+        从已爬取的条目出发，按广度优先沿关联条目扩展(如原声音乐到动画)，同时记录关联的人物和角色。
+        待访问队列和边保存在RelationStore中，已访问的条目记录在位图中，中断后可以继续爬取。
+
+        Args:
+            store (RelationStore): 待访问队列和边的存储
+            headers (dict, optional): 请求头. Defaults to None.
+            engine (FetchEngine, optional): 共享的请求引擎. Defaults to None.
+            kinds (list, optional): 请求的关联类型，见RELATION_KINDS. Defaults to RELATION_KINDS.
+            types (list, optional): 继续扩展的关联条目类型，见SUBJECT_TYPES，为None时扩展所有类型. Defaults to None.
+            max_depth (int, optional): 距离起点的最大深度，起点的深度为0. Defaults to 1.
+            batch_size (int, optional): 每批访问的条目数量，每批结束时提交一次. Defaults to 500.
+        """
+        assert all(kind in RELATION_KINDS for kind in kinds)
+        self.store = store
+        self.kinds = kinds
+        self.type_codes = (
+            None if types is None else {SUBJECT_TYPES[type].code for type in types}
+        )
+        self.max_depth = max_depth
+        self.batch_size = batch_size
+        self.api = "https://api.bgm.tv/v0/subjects/{}/{}"
+        super().__init__(headers=headers, engine=engine)
+
+    def seed(self, subject_ids):
+        """
+        将起点条目加入待访问队列。已访问的条目沿保存的边继续向外查找，
+        之前以较小深度爬取过时，再次运行会从未访问的关联条目继续扩展
+
+        Args:
+            subject_ids (iterable): 起点条目代码
+        """
+        layer = {int(subject_id) for subject_id in subject_ids}
+        seen = IdBitmap()
+        for depth in range(self.max_depth + 1):
+            next_layer = set()
+            unvisited = []
+            for subject_id in layer:
+                if subject_id in seen:
+                    continue
+                seen.add(subject_id)
+                if subject_id not in self.store.visited:
+                    unvisited.append(subject_id)
+                elif depth < self.max_depth:
+                    next_layer.update(
+                        self.store.neighbours(subject_id, self.type_codes)
+                    )
+            self.store.push(unvisited, depth)
+            layer = next_layer
+        self.store.commit()
+
+    def crawl(self):
+        """
+        按批访问待访问队列中的条目，直到队列为空
+
+        Returns:
+            int: 本次访问的条目数量
+        """
+        visited = 0
+        while True:
+            nodes = self.store.peek(self.batch_size)
+            if not nodes:
+                break
+            pipeline = Pipeline(
+                self.engine,
+                fetch=self.fetch_relations,
+                decode=decode_relations,
+                persist=self.save_relations,
+            )
+            visited += pipeline.run(nodes)
+            # failed subjects leave the frontier too, rediscovering them later retries them
+            self.store.done(subject_id for subject_id, _ in nodes)
+            print(
+                f"已访问{visited}个条目，已记录{len(self.store.visited)}个条目，"
+                f"待访问{self.store.pending()}个"
+            )
+        return visited
+
+    async def fetch_relations(self, node):
+        """
+        并发请求一个条目的所有关联类型
+
+        Args:
+            node (tuple): (条目代码, 深度)
+
+        Returns:
+            tuple: (条目代码, 深度, {kind: JSON数据})
+
+        Raises:
+            FetchError: 任意一种关联请求失败，整个条目由流水线重试
+        """
+        subject_id, depth = node
+        responses = await asyncio.gather(
+            *(
+                self.engine.attempt(self.api.format(subject_id, kind), self.headers)
+                for kind in self.kinds
+            )
+        )
+        bodies = {kind: response.text for kind, response in zip(self.kinds, responses)}
+        return subject_id, depth, bodies
+
+    def save_relations(self, record):
+        """
+        保存一个条目的边，并将未访问的关联条目加入下一层
+
+        Args:
+            record (tuple): decode_relations返回的(条目代码, 深度, 边的列表)
+        """
+        subject_id, depth, edges = record
+        self.store.add(subject_id, edges)
+        if depth >= self.max_depth:
+            return
+        self.store.push(
+            (
+                target_id
+                for _, kind, target_id, target_type, *_ in edges
+                if kind == "subjects"
+                and (self.type_codes is None or target_type in self.type_codes)
+            ),
+            depth + 1,
+        )
+
+    def export(self, data_path):
+        """
+        将所有边导出为数据路径下的relations.parquet，供分析时连接不同类型的条目
+
+        Args:
+            data_path (str): 数据保存路径
+        """
+        file_name = os.path.join(data_path, "relations.parquet")
+        count = write_relations(self.store.relations(), file_name)
+        print(f"已将{count}条关联关系保存到{file_name}")
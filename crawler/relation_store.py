@@ -0,0 +1,226 @@
+import os
+import sqlite3
+
+# endpoints of /v0/subjects/{id}/{kind}, only related subjects are expanded further
+RELATION_KINDS = ["subjects", "persons", "characters"]
+
+
+class IdBitmap:
+    def __init__(self, file_path=None):
+        """
+        初始化IdBitmap对象
+
+        用一位记录一个条目代码是否已访问，条目代码是连续分配的整数，
+        数百万个条目只占用几百KB内存，且不会像Bloom过滤器那样误判。
+
+        Args:
+            file_path (str, optional): 保存位图的文件路径，为None时只保存在内存中. Defaults to None.
+        """
+        self.file_path = file_path
+        self.bits = bytearray()
+        if file_path is not None and os.path.exists(file_path):
+            with open(file_path, "rb") as f:
+                self.bits = bytearray(f.read())
+
+    def __contains__(self, id):
+        byte, bit = divmod(id, 8)
+        return byte < len(self.bits) and bool(self.bits[byte] >> bit & 1)
+
+    def __len__(self):
+        return int.from_bytes(self.bits, "little").bit_count()
+
+    def add(self, id):
+        """
+        标记条目代码已访问
+
+        Args:
+            id (int): 非负的条目代码
+        """
+        byte, bit = divmod(id, 8)
+        if byte >= len(self.bits):
+            # grow geometrically so a rising id sequence does not reallocate every time
+            self.bits.extend(bytes(max(byte + 1 - len(self.bits), len(self.bits))))
+        self.bits[byte] |= 1 << bit
+
+    def save(self):
+        """
+        将位图写入文件
+        """
+        if self.file_path is None:
+            return
+        # write then rename so a crash never leaves a truncated bitmap
+        with open(self.file_path + ".tmp", "wb") as f:
+            f.write(self.bits)
+        os.replace(self.file_path + ".tmp", self.file_path)
+
+
+class RelationStore:
+    def __init__(self, file_path):
+        """
+        初始化RelationStore对象
+
+        保存关联关系爬取的待访问队列和已获取的边。待访问队列保存在SQLite中，
+        内存占用不随图的规模增长；已访问的条目记录在同名的.visited位图文件中。
+
+        Args:
+            file_path (str): SQLite数据库文件路径
+        """
+        self.file_path = file_path
+        # edges are written from the pipeline's writer thread
+        self.conn = sqlite3.connect(file_path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                subject_id INTEGER PRIMARY KEY,
+                depth INTEGER
+            )
+            """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS relations (
+                source_id INTEGER,
+                kind TEXT,
+                target_id INTEGER,
+                target_type INTEGER,
+                name TEXT,
+                name_cn TEXT,
+                relation TEXT,
+                PRIMARY KEY (source_id, kind, target_id, relation)
+            )
+            """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS frontier_depth ON frontier (depth, subject_id)"
+        )
+        self.visited = IdBitmap(os.path.splitext(file_path)[0] + ".visited")
+
+    def close(self):
+        """
+        保存已访问位图并关闭数据库连接
+        """
+        self.commit()
+        self.conn.close()
+
+    def commit(self):
+        """
+        提交尚未写入的记录，并保存已访问位图
+        """
+        self.conn.commit()
+        # saved after the commit, a crash in between only means revisiting a few subjects
+        self.visited.save()
+
+    def push(self, subject_ids, depth):
+        """
+        将尚未访问的条目加入待访问队列，已在队列中的条目保持原来的深度
+
+        Args:
+            subject_ids (iterable): 条目代码
+            depth (int): 条目距离起点的深度
+        """
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO frontier VALUES (?, ?)",
+            (
+                (subject_id, depth)
+                for subject_id in subject_ids
+                if subject_id not in self.visited
+            ),
+        )
+
+    def peek(self, count):
+        """
+        按深度从浅到深获取一批待访问的条目，条目在done之前保留在队列中
+
+        Args:
+            count (int): 最多获取的条目数量
+
+        Returns:
+            list[tuple[int, int]]: (条目代码, 深度)
+        """
+        return self.conn.execute(
+            "SELECT subject_id, depth FROM frontier ORDER BY depth, subject_id LIMIT ?",
+            (count,),
+        ).fetchall()
+
+    def done(self, subject_ids):
+        """
+        将一批条目移出待访问队列并提交
+
+        Args:
+            subject_ids (iterable): 条目代码
+        """
+        self.conn.executemany(
+            "DELETE FROM frontier WHERE subject_id = ?",
+            ((subject_id,) for subject_id in subject_ids),
+        )
+        self.commit()
+
+    def pending(self):
+        """
+        获取待访问的条目数量
+
+        Returns:
+            int: 待访问的条目数量
+        """
+        return self.conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+
+    def add(self, subject_id, edges):
+        """
+        记录一个条目的所有边，并标记该条目已访问
+
+        Args:
+            subject_id (int): 条目代码
+            edges (list[tuple]): (source_id, kind, target_id, target_type, name, name_cn, relation)
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO relations VALUES (?, ?, ?, ?, ?, ?, ?)", edges
+        )
+        self.visited.add(subject_id)
+
+    def neighbours(self, subject_id, type_codes=None):
+        """
+        获取已访问条目的关联条目
+
+        Args:
+            subject_id (int): 条目代码
+            type_codes (set, optional): 只返回这些类型代码的条目，为None时返回全部. Defaults to None.
+
+        Returns:
+            list[int]: 关联条目的代码
+        """
+        rows = self.conn.execute(
+            """
+            SELECT target_id, target_type FROM relations
+            WHERE source_id = ? AND kind = 'subjects'
+            """,
+            (subject_id,),
+        )
+        return [
+            target_id
+            for target_id, target_type in rows
+            if type_codes is None or target_type in type_codes
+        ]
+
+    def relations(self, kind=None):
+        """
+        遍历保存的边
+
+        Args:
+            kind (str, optional): 只返回该类型的边，见RELATION_KINDS，为None时返回全部. Defaults to None.
+
+        Returns:
+            iterator[dict]: 每条边一条记录
+        """
+        query = "SELECT * FROM relations"
+        params = ()
+        if kind is not None:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        columns = [
+            "source_id",
+            "kind",
+            "target_id",
+            "target_type",
+            "name",
+            "name_cn",
+            "relation",
+        ]
+        for row in self.conn.execute(query, params):
+            yield dict(zip(columns, row))
@@ -0,0 +1,178 @@
+import collections
+import concurrent.futures
+import itertools
+import logging
+
+from .decoder import decode_subjects
+from .pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+CrawlJob = collections.namedtuple("CrawlJob", ["crawler", "fetch", "items"])
+
+
+class CrawlScheduler:
+    def __init__(self, engine, queue_size=100, decode_processes=0, dead_letters=None):
+        """
+        初始化CrawlScheduler对象
+
+        在同一个进程中同时爬取多种类型的条目，所有类型共享一个请求引擎(连接池和限流预算)
+        和一条获取/解析/写入流水线，各类型的请求轮流进入获取队列，避免某一类型独占预算。
+
+        Args:
+            engine (FetchEngine): 共享的请求引擎
+            queue_size (int, optional): 流水线各阶段之间队列的容量. Defaults to 100.
+            decode_processes (int, optional): 解析阶段的进程数，大批量回填时解析会成为CPU瓶颈，
+                为0时在线程池中解析. Defaults to 0.
+            dead_letters (DeadLetterStore, optional): 保存重试后仍然失败的请求，为None时只输出错误. Defaults to None.
+        """
+        self.engine = engine
+        self.queue_size = queue_size
+        self.decode_processes = decode_processes
+        self.dead_letters = dead_letters
+
+    def run(self, jobs):
+        """
+        运行所有爬取任务直到完成
+
+        Args:
+            jobs (list[CrawlJob]): 爬取任务，fetch为接收items中单个元素的协程函数，
+                返回单个条目的JSON数据或一页已解码的条目
+
+        Returns:
+            list[int]: 与jobs顺序一致的、每个任务写入日志的条目数量
+        """
+        appended = [job.crawler.journal.appended for job in jobs]
+        self.crawlers = [job.crawler for job in jobs]
+        executor = None
+        if self.decode_processes > 0:
+            executor = concurrent.futures.ProcessPoolExecutor(self.decode_processes)
+        pipeline = Pipeline(
+            self.engine,
+            fetch=self._fetch,
+            decode=decode_result,
+            persist=self._persist,
+            decode_workers=max(2, self.decode_processes),
+            queue_size=self.queue_size,
+            executor=executor,
+            on_failure=self._fail,
+        )
+        try:
+            pipeline.run(interleave(jobs))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if self.dead_letters is not None:
+                self.dead_letters.commit()
+        counts = []
+        for job, before in zip(jobs, appended):
+            job.crawler.journal.close()
+            if job.crawler.validators is not None:
+                job.crawler.validators.commit()
+            if job.crawler.refresh_queue is not None:
+                job.crawler.refresh_queue.commit()
+            count = job.crawler.journal.appended - before
+            print(f"共获取{count}条{job.crawler.label}信息")
+            counts.append(count)
+        return counts
+
+    async def _fetch(self, task):
+        """
+        获取阶段：请求任务中的单个元素，并记录结果所属的爬虫
+
+        Args:
+            task (tuple): (任务序号, 获取函数, 元素)
+
+        Returns:
+            tuple: (任务序号, 数据)，没有数据时返回None
+
+        Raises:
+            FetchError: 请求失败，由流水线决定重试或放弃
+        """
+        index, fetch, item = task
+        data = await fetch(item)
+        crawler = self.crawlers[index]
+        if self.dead_letters is not None:
+            self.dead_letters.discard(crawler.type, fetch.__name__, item)
+        if not data and crawler.work_queue is not None:
+            # nothing to persist (e.g. 304 or a missing subject), the item is done all the same
+            crawler.work_queue.complete(crawler.type, item)
+        return (index, data) if data else None
+
+    def _fail(self, task, error, attempts):
+        """
+        获取阶段最终失败或解析失败时，将请求记录到死信存储中，之后可以使用--replay重新请求
+
+        Args:
+            task (tuple): (任务序号, 获取函数, 元素)
+            error (Exception): 最后一次失败的异常
+            attempts (int): 已尝试的次数
+        """
+        index, fetch, item = task
+        crawler = self.crawlers[index]
+        logger.warning(
+            "处理%s%s失败，已尝试%d次: %s", crawler.label, item, attempts, error
+        )
+        if self.dead_letters is not None:
+            self.dead_letters.add(crawler.type, fetch.__name__, item, error, attempts)
+        if crawler.work_queue is not None:
+            # dead letters are replayed with --replay rather than re-leased by other workers
+            crawler.work_queue.complete(crawler.type, item)
+
+    def _persist(self, result):
+        """
+        写入阶段：所有类型共用一个写入协程，按类型写入各自的爬取日志
+
+        Args:
+            result (tuple): (任务序号, 展开后的条目信息列表)
+        """
+        index, subject_infos = result
+        crawler = self.crawlers[index]
+        for subject_info in subject_infos:
+            crawler.save_record(subject_info)
+
+
+def decode_result(result):
+    """
+    解析阶段：解析获取阶段的数据，结果只包含任务序号，可以在进程池中运行
+
+    Args:
+        result (tuple): (任务序号, 数据)
+
+    Returns:
+        tuple: (任务序号, 展开后的条目信息列表)
+    """
+    index, data = result
+    return index, decode_subjects(data)
+
+
+def interleave(jobs):
+    """
+    轮流从每个任务中取出一个元素，保证各类型公平地进入获取队列
+
+    Args:
+        jobs (list[CrawlJob]): 爬取任务
+
+    Yields:
+        tuple: (任务序号, 获取函数, 元素)
+    """
+    iterators = [zip_job(index, job) for index, job in enumerate(jobs)]
+    for tasks in itertools.zip_longest(*iterators):
+        for task in tasks:
+            if task is not None:
+                yield task
+
+
+def zip_job(index, job):
+    """
+    将任务展开为(任务序号, 获取函数, 元素)
+
+    Args:
+        index (int): 任务序号
+        job (CrawlJob): 爬取任务
+
+    Yields:
+        tuple: (任务序号, 获取函数, 元素)
+    """
+    for item in job.items:
+        yield index, job.fetch, item
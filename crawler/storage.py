@@ -0,0 +1,174 @@
+import datetime
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+COVER_SIZES = ["large", "common", "medium", "small", "grid"]
+RATING_KEYS = [str(score) for score in range(1, 11)]
+COLLECTION_KEYS = ["wish", "collect", "doing", "on_hold", "dropped"]
+# infobox fields the analysis reads often enough to deserve their own column,
+# every other infobox field stays in the infobox map column
+PROMOTED_INFOBOX_KEYS = ["作曲", "厂牌", "动画制作"]
+
+SUBJECT_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("type", pa.int8()),
+        ("name", pa.string()),
+        ("name_cn", pa.string()),
+        ("summary", pa.string()),
+        ("date", pa.date32()),
+        ("platform", pa.string()),
+        ("nsfw", pa.bool_()),
+        ("locked", pa.bool_()),
+        ("volumes", pa.int32()),
+        ("eps", pa.int32()),
+        ("total_episodes", pa.int32()),
+        *((f"{size}_cover", pa.string()) for size in COVER_SIZES),
+        ("rank", pa.int32()),
+        ("votes", pa.int32()),
+        ("ratings", pa.struct([(key, pa.int32()) for key in RATING_KEYS])),
+        # null for subjects nobody has rated yet
+        pa.field("rating_score", pa.float64(), nullable=True),
+        ("collection", pa.struct([(key, pa.int32()) for key in COLLECTION_KEYS])),
+        (
+            "tags",
+            pa.list_(pa.struct([("name", pa.string()), ("count", pa.int32())])),
+        ),
+        *((key, pa.string()) for key in PROMOTED_INFOBOX_KEYS),
+        ("infobox", pa.map_(pa.string(), pa.string())),
+    ]
+)
+
+RELATION_SCHEMA = pa.schema(
+    [
+        ("source_id", pa.int64()),
+        ("kind", pa.string()),
+        ("target_id", pa.int64()),
+        ("target_type", pa.int8()),
+        ("name", pa.string()),
+        ("name_cn", pa.string()),
+        ("relation", pa.string()),
+    ]
+)
+
+
+def parse_date(value):
+    """
+    解析条目日期
+
+    Args:
+        value (str): YYYY-MM-DD格式的日期
+
+    Returns:
+        datetime.date: 日期，无法解析时返回None
+    """
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def infobox_value(value):
+    """
+    将infobox字段的值转换为字符串，列表等结构化的值保存为JSON
+
+    Args:
+        value (object): infobox字段的值
+
+    Returns:
+        str: 字符串形式的值
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def to_row(subject_info):
+    """
+    将process_*_info处理后的条目信息转换为符合SUBJECT_SCHEMA的行
+
+    Args:
+        subject_info (dict): 条目信息，infobox字段已展开到顶层
+
+    Returns:
+        dict: 符合SUBJECT_SCHEMA的行
+    """
+    row = {}
+    infobox = []
+    for key, value in subject_info.items():
+        if key == "date":
+            row[key] = parse_date(value)
+        elif key == "tags":
+            row[key] = [{"name": name, "count": count} for name, count in value.items()]
+        elif key in PROMOTED_INFOBOX_KEYS:
+            row[key] = infobox_value(value)
+        elif key in SUBJECT_SCHEMA.names:
+            row[key] = value
+        else:
+            infobox.append((key, infobox_value(value)))
+    row["infobox"] = infobox
+    return row
+
+
+def write_subjects(subject_infos, file_path, batch_size=10000):
+    """
+    将条目信息按SUBJECT_SCHEMA流式写入Parquet文件
+
+    Args:
+        subject_infos (iterable): 条目信息的可迭代对象
+        file_path (str): Parquet文件路径
+        batch_size (int, optional): 每个行组的行数. Defaults to 10000.
+
+    Returns:
+        int: 写入的条目数量
+    """
+    count = 0
+    # write then rename so readers such as the query server never see a truncated file
+    with pq.ParquetWriter(
+        file_path + ".tmp", SUBJECT_SCHEMA, compression="zstd"
+    ) as writer:
+        rows = []
+        for subject_info in subject_infos:
+            rows.append(to_row(subject_info))
+            if len(rows) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(rows, schema=SUBJECT_SCHEMA))
+                count += len(rows)
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=SUBJECT_SCHEMA))
+            count += len(rows)
+    os.replace(file_path + ".tmp", file_path)
+    return count
+
+
+def write_relations(relations, file_path, batch_size=100000):
+    """
+    将关联关系按RELATION_SCHEMA流式写入Parquet文件
+
+    Args:
+        relations (iterable): RelationStore.relations返回的边
+        file_path (str): Parquet文件路径
+        batch_size (int, optional): 每个行组的行数. Defaults to 100000.
+
+    Returns:
+        int: 写入的边数量
+    """
+    count = 0
+    with pq.ParquetWriter(
+        file_path + ".tmp", RELATION_SCHEMA, compression="zstd"
+    ) as writer:
+        rows = []
+        for relation in relations:
+            rows.append(relation)
+            if len(rows) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(rows, schema=RELATION_SCHEMA))
+                count += len(rows)
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=RELATION_SCHEMA))
+            count += len(rows)
+    os.replace(file_path + ".tmp", file_path)
+    return count
@@ -0,0 +1,167 @@
+import collections
+import os
+
+from .base_crawler import BaseCrawler
+from .decoder import decode_subject, decode_subjects
+from .journal import CrawlJournal
+from .scheduler import CrawlJob, CrawlScheduler
+from .storage import write_subjects
+
+SubjectType = collections.namedtuple("SubjectType", ["name", "code", "label"])
+
+# every subject type of the Bangumi API, keyed by the name used in urls and config
+SUBJECT_TYPES = {
+    "book": SubjectType("book", 1, "书籍"),
+    "anime": SubjectType("anime", 2, "动画"),
+    "music": SubjectType("music", 3, "音乐"),
+    "game": SubjectType("game", 4, "游戏"),
+    "real": SubjectType("real", 6, "三次元"),
+}
+
+
+class SubjectCrawler(BaseCrawler):
+    def __init__(
+        self,
+        type,
+        data_path,
+        headers=None,
+        engine=None,
+        validators=None,
+        journal=None,
+        refresh_queue=None,
+        work_queue=None,
+    ):
+        """
+        初始化SubjectCrawler对象
+
+        Args:
+            type (str): 数据类型，必须是SUBJECT_TYPES中的类型之一
+            data_path (str): 数据保存路径
+            headers (dict, optional): 请求头. Defaults to None.
+            engine (FetchEngine, optional): 共享的请求引擎. Defaults to None.
+            validators (ValidatorStore, optional): 条件请求的验证信息存储. Defaults to None.
+            journal (CrawlJournal, optional): 爬取日志，为None时使用数据路径下的{type}_journal. Defaults to None.
+            refresh_queue (RefreshQueue, optional): 记录抓取历史的刷新队列. Defaults to None.
+            work_queue (WorkQueue, optional): 多进程爬取时共享的工作队列，写入日志后标记条目完成. Defaults to None.
+        """
+        assert type in SUBJECT_TYPES
+        self.type = type
+        self.label = SUBJECT_TYPES[type].label
+        self.data_path = data_path
+        self.journal = journal or CrawlJournal(
+            os.path.join(data_path, f"{type}_journal")
+        )
+        self.refresh_queue = refresh_queue
+        self.work_queue = work_queue
+        self.api = "https://api.bgm.tv/v0/subjects/{}"
+        super().__init__(headers=headers, engine=engine, validators=validators)
+
+    def save_info(self, subject_infos):
+        """
+        将条目信息按固定的列式结构保存到Parquet文件中
+
+        Args:
+            subject_infos (iterable): 包含条目信息的可迭代对象
+        """
+        file_name = os.path.join(self.data_path, f"{self.type}_infos.parquet")
+        count = write_subjects(subject_infos, file_name)
+        print(f"已将{count}条{self.label}信息保存到{file_name}")
+
+    async def fetch_code(self, subject_code):
+        """
+        获取单个条目的JSON数据
+
+        Args:
+            subject_code (str): 条目代码
+
+        Returns:
+            str: 条目的JSON数据，请求失败时返回None
+        """
+        return await self.fetch_subject(self.api.format(subject_code), subject_code)
+
+    def get_info(self, subject_codes):
+        """
+        获取条目信息，获取、解析和写入爬取日志以流水线方式并发进行，内存占用不随已爬取数量增长
+
+        Args:
+            subject_codes (list): 包含条目代码的列表
+
+        Returns:
+            int: 本次写入日志的条目信息数量，条目信息如：
+            id, type, name, name_cn, summary, nsfw, locked, platform, images[large,common,medium,small,grid](cover),
+            infobox, volumes, eps, total_episodes, rating(rank, total, count, score),
+            collection(on_hold, dropped, wish, collect, doing), tags(name:count).
+        """
+        # failed requests are left out of the journal so --resume retries them
+        scheduler = CrawlScheduler(self.engine)
+        return scheduler.run([CrawlJob(self, self.fetch_code, subject_codes)])[0]
+
+    def get_info_from_listing(self, listing_crawler, offsets):
+        """
+        通过分页浏览接口批量获取条目信息，每次请求返回一页条目
+
+        Args:
+            listing_crawler (ListingCrawler): 分页浏览爬虫
+            offsets (iterable): 每页请求的偏移量
+
+        Returns:
+            int: 本次写入日志的条目信息数量
+        """
+        scheduler = CrawlScheduler(self.engine)
+        job = CrawlJob(self, listing_crawler.fetch_page, offsets)
+        return scheduler.run([job])[0]
+
+    def save_record(self, subject_info):
+        """
+        将一条条目信息追加写入爬取日志，并更新刷新队列中的抓取历史和工作队列中的条目状态
+
+        Args:
+            subject_info (dict): 条目信息
+        """
+        self.journal.append(subject_info)
+        if self.refresh_queue is not None:
+            self.refresh_queue.record(self.type, subject_info)
+        if self.work_queue is not None:
+            self.work_queue.complete(self.type, subject_info["id"])
+        if self.journal.appended % 50 == 0:
+            print(f"已获取{self.journal.appended}条{self.label}信息")
+
+    def compact(self):
+        """
+        将爬取日志合并为最终的条目信息表
+        """
+        self.save_info(self.journal.records())
+
+    def decode(self, data):
+        """
+        解析获取阶段返回的数据
+
+        Args:
+            data (str | list[dict]): 单个条目的JSON数据，或分页浏览接口返回的一页条目
+
+        Returns:
+            list[dict]: 展开后的条目信息
+        """
+        return decode_subjects(data)
+
+    def process_info(self, subject_infos, json_datas):
+        """
+        处理条目信息
+
+        Args:
+            subject_infos (list): 包含条目信息的列表
+            json_datas (list): 包含条目信息的JSON数据
+        """
+        subject_infos.extend(map(decode_subject, json_datas))
+
+    def parse_info(self, json_data):
+        """
+        解析单条条目信息，按声明的字段结构一次遍历展开images、tags、infobox和rating
+
+        Args:
+            json_data (str | dict): 条目信息的JSON数据，或分页浏览接口中已解码的条目
+
+        Returns:
+            dict: 展开后的条目信息
+        """
+        return decode_subject(json_data)
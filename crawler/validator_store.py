@@ -0,0 +1,140 @@
+import collections
+import hashlib
+import sqlite3
+import time
+import zlib
+
+
+class ValidatorStore:
+    def __init__(self, file_path):
+        """
+        初始化ValidatorStore对象
+
+        按条目代码保存上次请求得到的ETag、Last-Modified、内容哈希和响应体，
+        再次爬取时发送条件请求，服务端返回304时直接复用本地保存的响应体。
+
+        Args:
+            file_path (str): SQLite数据库文件路径
+        """
+        self.file_path = file_path
+        # the streaming pipeline resolves responses on the engine thread
+        self.conn = sqlite3.connect(file_path, timeout=60, check_same_thread=False)
+        # WAL lets worker processes sharing the data path read while another one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS validators (
+                subject_code TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                body BLOB,
+                fetched_at REAL
+            )
+            """)
+        self.stats = collections.Counter()
+        self._pending = 0
+
+    def close(self):
+        """
+        关闭数据库连接
+        """
+        self.conn.commit()
+        self.conn.close()
+
+    def conditional_headers(self, subject_code):
+        """
+        生成条件请求头
+
+        Args:
+            subject_code (str): 条目代码
+
+        Returns:
+            dict: 包含If-None-Match和If-Modified-Since的请求头，没有记录时为空字典
+        """
+        row = self.conn.execute(
+            "SELECT etag, last_modified FROM validators WHERE subject_code = ?",
+            (str(subject_code),),
+        ).fetchone()
+        if row is None:
+            return {}
+        etag, last_modified = row
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def resolve(self, subject_code, response):
+        """
+        根据响应更新验证信息，并返回条目的最新响应体
+
+        Args:
+            subject_code (str): 条目代码
+            response (Response): 条件请求的结果
+
+        Returns:
+            str: 条目的响应体，304时为本地保存的响应体
+        """
+        subject_code = str(subject_code)
+        row = self.conn.execute(
+            "SELECT content_hash, body FROM validators WHERE subject_code = ?",
+            (subject_code,),
+        ).fetchone()
+        if response.status == 304 and row is not None:
+            self.stats["unchanged"] += 1
+            self.conn.execute(
+                "UPDATE validators SET fetched_at = ? WHERE subject_code = ?",
+                (time.time(), subject_code),
+            )
+            self._written()
+            return zlib.decompress(row[1]).decode("utf-8")
+
+        content_hash = hashlib.sha256(response.text.encode("utf-8")).hexdigest()
+        if row is None:
+            self.stats["new"] += 1
+        elif row[0] == content_hash:
+            self.stats["unchanged"] += 1
+        else:
+            self.stats["changed"] += 1
+        self.conn.execute(
+            "INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                subject_code,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                content_hash,
+                zlib.compress(response.text.encode("utf-8")),
+                time.time(),
+            ),
+        )
+        self._written()
+        return response.text
+
+    def _written(self):
+        """
+        每写入50条提交一次，缩短持有写锁的时间，避免阻塞共享数据路径的其他进程
+        """
+        self._pending += 1
+        if self._pending >= 50:
+            self.commit()
+
+    def commit(self):
+        """
+        提交本批次的更新
+        """
+        self.conn.commit()
+        self._pending = 0
+
+    def report(self, label="条目"):
+        """
+        输出本次爬取中未变化、已变化和新增的条目数量
+
+        Args:
+            label (str, optional): 条目类型名称. Defaults to "条目".
+        """
+        print(
+            f"{label}未变化{self.stats['unchanged']}条，"
+            f"已变化{self.stats['changed']}条，"
+            f"新增{self.stats['new']}条"
+        )
@@ -0,0 +1,212 @@
+import collections
+import sqlite3
+import threading
+import time
+
+
+class WorkQueue:
+    def __init__(self, file_path, worker=None, lease_seconds=300):
+        """
+        初始化WorkQueue对象
+
+        多个爬虫进程共享的工作队列，协调进程将条目代码分片写入队列，工作进程每次租用一批条目，
+        租约到期前通过心跳续租，写入日志后标记完成；进程崩溃后租约过期，条目会被其他进程重新租用。
+        队列保存在SQLite文件中，多台主机需要通过支持文件锁的共享存储访问同一文件。
+
+        Args:
+            file_path (str): SQLite数据库文件路径
+            worker (str, optional): 工作进程名称，租用、续租和完成条目时使用，协调进程不需要. Defaults to None.
+            lease_seconds (int, optional): 租约时长(秒). Defaults to 300.
+        """
+        self.file_path = file_path
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        # the persist thread, the engine thread and the heartbeat thread share the connection
+        self.conn = sqlite3.connect(
+            file_path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS work_items (
+                type TEXT,
+                item TEXT,
+                state TEXT DEFAULT 'pending',
+                worker TEXT,
+                lease_until REAL,
+                leases INTEGER DEFAULT 0,
+                PRIMARY KEY (type, item)
+            )
+            """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS work_items_state ON work_items (state, lease_until)"
+        )
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+    def close(self):
+        """
+        停止心跳并关闭数据库连接
+        """
+        self.stop_heartbeat()
+        self.conn.close()
+
+    def enqueue(self, type, items):
+        """
+        将条目分片写入队列，已在队列中的条目保持不变
+
+        Args:
+            type (str): 条目类型
+            items (iterable): 条目代码
+
+        Returns:
+            int: 新加入的条目数量
+        """
+        with self._lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO work_items (type, item) VALUES (?, ?)",
+                ((type, str(item)) for item in items),
+            )
+            return self.conn.total_changes - before
+
+    def lease(self, types, count):
+        """
+        租用一批未完成的条目，包括租约已过期的条目
+
+        Args:
+            types (list): 可以租用的条目类型
+            count (int): 最多租用的条目数量
+
+        Returns:
+            list[tuple[str, str]]: 租到的(条目类型, 条目代码)
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            # IMMEDIATE takes the write lock up front so two workers never lease the same rows
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute(
+                f"""
+                SELECT type, item FROM work_items
+                WHERE type IN ({",".join("?" * len(types))})
+                  AND (state = 'pending' OR (state = 'leased' AND lease_until < ?))
+                LIMIT ?
+                """,
+                [*types, now, count],
+            ).fetchall()
+            self.conn.executemany(
+                """
+                UPDATE work_items
+                SET state = 'leased', worker = ?, lease_until = ?, leases = leases + 1
+                WHERE type = ? AND item = ?
+                """,
+                [
+                    (self.worker, now + self.lease_seconds, type, item)
+                    for type, item in rows
+                ],
+            )
+        return rows
+
+    def heartbeat(self):
+        """
+        为工作进程持有的所有租约续租
+        """
+        with self._lock:
+            self.conn.execute(
+                "UPDATE work_items SET lease_until = ? WHERE state = 'leased' AND worker = ?",
+                (time.time() + self.lease_seconds, self.worker),
+            )
+
+    def start_heartbeat(self):
+        """
+        在后台线程中每隔三分之一租约时长续租一次
+        """
+        self._stopped.clear()
+
+        def beat():
+            while not self._stopped.wait(self.lease_seconds / 3):
+                self.heartbeat()
+
+        self._heartbeat = threading.Thread(target=beat, name="heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        """
+        停止心跳线程
+        """
+        if self._heartbeat is not None:
+            self._stopped.set()
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def complete(self, type, item):
+        """
+        将工作进程租用的条目标记为完成，租约已被其他进程接手时不做修改
+
+        Args:
+            type (str): 条目类型
+            item (str): 条目代码
+        """
+        with self._lock:
+            self.conn.execute(
+                """
+                UPDATE work_items SET state = 'done', lease_until = NULL
+                WHERE type = ? AND item = ? AND worker = ? AND state = 'leased'
+                """,
+                (type, str(item), self.worker),
+            )
+
+    def release(self):
+        """
+        将工作进程尚未完成的条目放回队列，供其他进程立即租用
+        """
+        with self._lock:
+            self.conn.execute(
+                """
+                UPDATE work_items SET state = 'pending', worker = NULL, lease_until = NULL
+                WHERE state = 'leased' AND worker = ?
+                """,
+                (self.worker,),
+            )
+
+    def leased_by_others(self):
+        """
+        统计其他工作进程持有的未过期租约，本进程的租约由心跳续租，不计入
+
+        Returns:
+            int: 其他工作进程租用中的条目数量
+        """
+        with self._lock:
+            (count,) = self.conn.execute(
+                """
+                SELECT COUNT(*) FROM work_items
+                WHERE state = 'leased' AND lease_until >= ? AND worker IS NOT ?
+                """,
+                (time.time(), self.worker),
+            ).fetchone()
+        return count
+
+    def progress(self):
+        """
+        统计各类型条目的状态，租约已过期的条目计为pending
+
+        Returns:
+            dict: 条目类型到{状态: 数量}的映射
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                """
+                SELECT type,
+                       CASE WHEN state = 'leased' AND lease_until < ? THEN 'pending'
+                            ELSE state END,
+                       COUNT(*)
+                FROM work_items GROUP BY 1, 2
+                """,
+                (time.time(),),
+            ).fetchall()
+        progress = collections.defaultdict(collections.Counter)
+        for type, state, count in rows:
+            progress[type][state] += count
+        return progress